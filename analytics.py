@@ -0,0 +1,214 @@
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from telegram.ext import Application
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# One answered question in the event log: unix time, tuning (ASCII, NUL-padded),
+# string, fret, attempts, correct (0/1), response time in milliseconds
+EVENT = struct.Struct('<I8sBBBBI')
+MIN_POSITION_QUESTIONS = 5  # Questions a position needs before it can rank among the hardest
+HARDEST_POSITIONS = 3
+
+# Aggregates: per tuning [questions, correct, correct on the first attempt, total response ms]
+# and per (tuning, string, fret) [questions, missed on the first attempt]
+TuningTotals = List[int]
+PositionKey = Tuple[str, int, int]
+
+class Analytics:
+    """Aggregates answered questions across all users as they happen.
+
+    Every event updates a few counters in place, so the /stats summary is a lookup
+    rather than a scan of the history. Events are buffered and appended to a binary
+    log (EVENT.size bytes each) every flush_interval seconds; a JSON snapshot of the
+    aggregates, written next to it, is what is loaded at startup.
+
+    Sharded workers each aggregate the chats they own. Given the paths of the other
+    workers' files as peers, every flush also reads their snapshots, so /stats covers
+    all players, with other workers' answers up to flush_interval seconds late.
+    """
+
+    def __init__(self, path: str, flush_interval: float, peers: Sequence[str] = ()) -> None:
+        """Load the aggregates snapshot at path + '.json', if there is one."""
+        self.log_path = path + '.log'
+        self.snapshot_path = path + '.json'
+        self.flush_interval = flush_interval
+        self.peer_snapshot_paths = [peer + '.json' for peer in peers]
+        self.tunings: Dict[str, TuningTotals] = {}
+        self.positions: Dict[PositionKey, List[int]] = {}
+        # Sums of the peers' aggregates as of their last snapshots
+        self._peer_tunings: Dict[str, TuningTotals] = {}
+        self._peer_positions: Dict[PositionKey, List[int]] = {}
+        self._buffer = bytearray()
+        self._hardest: Dict[str, List[Tuple[int, int, float]]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        snapshot = self._read_snapshot(self.snapshot_path)
+        if snapshot is not None:
+            self.tunings, self.positions = snapshot
+        self._peer_tunings, self._peer_positions = self._read_peers()
+        self._rank_positions()
+
+    @staticmethod
+    def _read_snapshot(path: str) -> Optional[Tuple[Dict[str, TuningTotals], Dict[PositionKey, List[int]]]]:
+        """Return the aggregates stored in a snapshot, or None if there is none (blocking)."""
+        try:
+            with open(path) as snapshot:
+                data = json.load(snapshot)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            logger.exception("Ignoring unreadable analytics snapshot %s", path)
+            return None
+        positions = {
+            (tuning, string_num, fret_num): counts for tuning, string_num, fret_num, *counts in data['positions']
+        }
+        return data['tunings'], positions
+
+    def _read_peers(self) -> Tuple[Dict[str, TuningTotals], Dict[PositionKey, List[int]]]:
+        """Return the sums of the peers' snapshots (blocking)."""
+        tunings: Dict[str, TuningTotals] = {}
+        positions: Dict[PositionKey, List[int]] = {}
+        for path in self.peer_snapshot_paths:
+            snapshot = self._read_snapshot(path)
+            if snapshot is None:
+                continue
+            _add_counts(tunings, snapshot[0])
+            _add_counts(positions, snapshot[1])
+        return tunings, positions
+
+    def record(self, tuning: str, string_num: int, fret_num: int, correct: bool, attempts: int, seconds: float) -> None:
+        """Add one answered question to the aggregates and the event buffer."""
+        milliseconds = int(seconds * 1000)
+        totals = self.tunings.get(tuning)
+        if totals is None:
+            totals = self.tunings[tuning] = [0, 0, 0, 0]
+        totals[0] += 1
+        totals[1] += correct
+        totals[2] += correct and attempts == 1
+        totals[3] += milliseconds
+
+        key = (tuning, string_num, fret_num)
+        counts = self.positions.get(key)
+        if counts is None:
+            counts = self.positions[key] = [0, 0]
+        counts[0] += 1
+        counts[1] += not (correct and attempts == 1)
+
+        self._buffer += EVENT.pack(
+            int(time.time()), tuning.encode('ascii')[:8], string_num, fret_num,
+            min(attempts, 255), correct, min(milliseconds, 0xFFFFFFFF)
+        )
+
+    def _rank_positions(self) -> None:
+        """Recompute the hardest positions of every tuning (done at flush time, not per /stats)."""
+        ranked: Dict[str, List[Tuple[float, int, int]]] = {}
+        positions = self.positions
+        if self._peer_positions:
+            positions = _add_counts({key: list(counts) for key, counts in self._peer_positions.items()}, positions)
+        for (tuning, string_num, fret_num), (questions, missed) in positions.items():
+            if questions >= MIN_POSITION_QUESTIONS:
+                ranked.setdefault(tuning, []).append((missed / questions, string_num, fret_num))
+        self._hardest = {
+            tuning: [(string_num, fret_num, rate) for rate, string_num, fret_num in sorted(rates, reverse=True)[:HARDEST_POSITIONS]]
+            for tuning, rates in ranked.items()
+        }
+
+    def summary(self, tuning: str) -> str:
+        """Return the /stats text: totals across all tunings, then the given tuning in detail."""
+        tunings = self.tunings
+        if self._peer_tunings:
+            tunings = _add_counts({tuning: list(totals) for tuning, totals in self._peer_tunings.items()}, tunings)
+        questions = sum(totals[0] for totals in tunings.values())
+        if not questions:
+            return "No questions have been answered yet."
+        correct = sum(totals[1] for totals in tunings.values())
+        first_try = sum(totals[2] for totals in tunings.values())
+        lines = [
+            "📈 All Players:\n",
+            f"Questions Answered: {questions}",
+            f"Solved: {correct / questions * 100:.1f}% ({first_try / questions * 100:.1f}% on the first try)",
+        ]
+        totals = tunings.get(tuning)
+        if totals is not None:
+            lines += [
+                f"\n{config.TUNING_NAMES.get(tuning, tuning)}:",
+                f"Questions: {totals[0]}, first try: {totals[2] / totals[0] * 100:.1f}%, "
+                f"average time: {totals[3] / totals[0] / 1000:.1f}s",
+            ]
+        hardest = self._hardest.get(tuning)
+        if hardest:
+            lines.append("Hardest spots: " + ", ".join(
+                f"string {string_num} fret {fret_num} ({rate * 100:.0f}% missed)" for string_num, fret_num, rate in hardest
+            ))
+        return "\n".join(lines)
+
+    def _write(self, events: bytes, snapshot: str) -> None:
+        """Append events to the log and replace the snapshot (blocking; runs in a worker thread)."""
+        with open(self.log_path, 'ab') as log:
+            log.write(events)
+        temporary = self.snapshot_path + '.tmp'
+        with open(temporary, 'w') as output:
+            output.write(snapshot)
+        os.replace(temporary, self.snapshot_path)
+
+    async def flush(self) -> None:
+        """Write buffered events and the current aggregates to disk, and reread the peers' snapshots."""
+        if self.peer_snapshot_paths:
+            self._peer_tunings, self._peer_positions = await asyncio.to_thread(self._read_peers)
+        self._rank_positions()
+        if not self._buffer:
+            return
+        events, self._buffer = bytes(self._buffer), bytearray()
+        # Serialized here, so events recorded during the write can't change it halfway
+        snapshot = json.dumps({
+            'tunings': self.tunings,
+            'positions': [[*key, *counts] for key, counts in self.positions.items()],
+        }, separators=(',', ':'))
+        try:
+            await asyncio.to_thread(self._write, events, snapshot)
+        except OSError:
+            logger.exception("Failed to write analytics, will retry with the next flush")
+            self._buffer[:0] = events
+
+    async def start(self, application: Application) -> None:
+        """Flush in the background (usable as a post_init hook)."""
+        self._stopping = asyncio.Event()
+        self._task = asyncio.create_task(self._run(self._stopping))
+
+    async def stop(self, application: Application) -> None:
+        """Stop the background flushes and write what is left (usable as a post_stop hook)."""
+        if self._task is not None:
+            # Not cancelled: a write already running in a worker thread would go on
+            # regardless and race the final one
+            self._stopping.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    async def _run(self, stopping: asyncio.Event) -> None:
+        """Flush every flush_interval seconds until stopping is set."""
+        while not stopping.is_set():
+            try:
+                await asyncio.wait_for(stopping.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                await self.flush()
+
+def _add_counts(totals: Dict[Any, List[int]], counts: Dict[Any, List[int]]) -> Dict[Any, List[int]]:
+    """Add lists of counts to those in totals with the same key, in place; return totals."""
+    for key, values in counts.items():
+        current = totals.get(key)
+        if current is None:
+            totals[key] = list(values)
+        else:
+            for index, value in enumerate(values):
+                current[index] += value
+    return totals
@@ -0,0 +1,177 @@
+"""Measure the timer wheel behind timed drills against per-user timers.
+
+One scheduled callback per user (loop.call_later, which JobQueue jobs end up in)
+puts a handle per deadline on the event loop's heap. The simulation compares the
+wheel with HeapTimers, a heapq with lazy cancellation behind the same interface,
+and with a bare heapq loop without that interface, a lower bound no reusable
+timer class reaches: every simulated drill restarts its deadline on each answer,
+so most timers are cancelled before they expire. The cost of restarting one
+deadline is also measured with loop.call_later itself.
+
+Restarting alone favours the heap: it pushes and never pops. The simulation adds
+the pops of expired and cancelled entries, which is where the wheel is ahead of
+the heap behind the same interface (about 1.8x per tick with 50000 drills, 1.5x
+with 200000).
+
+Run from the repository root:
+
+    python -m benchmarks.bench_drill_timers [--drills 50000]
+"""
+import argparse
+import asyncio
+import heapq
+import itertools
+import random
+import time
+import timeit
+from typing import Any, List, Tuple, Union
+
+from drill import TimerWheel
+
+TICK = 0.25  # Seconds, as config.DRILL_TICK
+DEADLINE_TICKS = 40  # A 10 second deadline
+SIMULATED_TICKS = 2400  # Ten minutes of drilling
+
+def answer_ticks(drills: int, seed: int = 1) -> List[List[int]]:
+    """Return, per tick, the drills answering then: each answers 2 to 12 seconds after its last answer."""
+    rng = random.Random(seed)
+    schedule: List[List[int]] = [[] for _ in range(SIMULATED_TICKS)]
+    for drill in range(drills):
+        tick = rng.randrange(DEADLINE_TICKS)
+        while tick < SIMULATED_TICKS:
+            schedule[tick].append(drill)
+            tick += rng.randint(8, 48)
+    return schedule
+
+CANCELLED = object()  # Payload of a cancelled or fired HeapTimers entry
+
+class HeapTimers:
+    """TimerWheel's interface on a heapq with lazy cancellation: a timer is a [expires, sequence, payload] entry."""
+
+    def __init__(self) -> None:
+        """Create an empty heap."""
+        self.ticks = 0
+        self._heap: List[List[Any]] = []
+        self._sequence = itertools.count()
+
+    def schedule(self, expires: int, payload: Any) -> List[Any]:
+        """Add a timer firing at tick expires."""
+        entry = [max(expires, self.ticks + 1), next(self._sequence), payload]
+        heapq.heappush(self._heap, entry)
+        return entry
+
+    def cancel(self, entry: List[Any]) -> None:
+        """Mark a timer as cancelled; it is dropped when it reaches the top."""
+        entry[2] = CANCELLED
+
+    def advance(self, to: int) -> List[Any]:
+        """Pop every timer expiring up to tick to; return the payloads of those not cancelled."""
+        fired = []
+        heap = self._heap
+        while heap and heap[0][0] <= to:
+            entry = heapq.heappop(heap)
+            if entry[2] is not CANCELLED:
+                fired.append(entry[2])
+                entry[2] = CANCELLED
+        self.ticks = to
+        return fired
+
+def run_timers(drills: int, schedule: List[List[int]], wheel: Union[TimerWheel, HeapTimers]) -> Tuple[float, int]:
+    """Drive the drills with timers behind the TimerWheel interface; return the seconds taken and the timeouts fired."""
+    timers = [wheel.schedule(DEADLINE_TICKS, drill) for drill in range(drills)]
+    fired = 0
+    start = time.perf_counter()
+    for tick, answering in enumerate(schedule, 1):
+        for drill in answering:
+            wheel.cancel(timers[drill])
+            timers[drill] = wheel.schedule(tick + DEADLINE_TICKS, drill)
+        for drill in wheel.advance(tick):
+            fired += 1
+            timers[drill] = wheel.schedule(tick + DEADLINE_TICKS, drill)
+    return time.perf_counter() - start, fired
+
+def run_heap(drills: int, schedule: List[List[int]]) -> Tuple[float, int]:
+    """Drive the drills with a heap and lazy cancellation, like per-user scheduled callbacks."""
+    heap = [(DEADLINE_TICKS, drill, 0) for drill in range(drills)]
+    heapq.heapify(heap)
+    generation = [0] * drills
+    fired = 0
+    start = time.perf_counter()
+    for tick, answering in enumerate(schedule, 1):
+        for drill in answering:
+            generation[drill] += 1
+            heapq.heappush(heap, (tick + DEADLINE_TICKS, drill, generation[drill]))
+        while heap and heap[0][0] <= tick:
+            _, drill, timer_generation = heapq.heappop(heap)
+            if timer_generation == generation[drill]:
+                fired += 1
+                generation[drill] += 1
+                heapq.heappush(heap, (tick + DEADLINE_TICKS, drill, generation[drill]))
+    return time.perf_counter() - start, fired
+
+def restart_costs(pending: int, number: int = 200000) -> List[Tuple[str, float]]:
+    """Return the µs to cancel a deadline and schedule the next one, with pending other timers."""
+    timers = {'timer wheel': TimerWheel(), 'heapq timers': HeapTimers()}
+    for timer_set in timers.values():
+        for drill in range(pending):
+            timer_set.schedule(drill % DEADLINE_TICKS + 1, drill)
+
+    def restart_cost(timer_set: Union[TimerWheel, HeapTimers]) -> float:
+        """Return the µs to restart a deadline in the given timers."""
+        timer = timer_set.schedule(DEADLINE_TICKS, None)
+
+        def restart() -> None:
+            """Restart the deadline."""
+            nonlocal timer
+            timer_set.cancel(timer)
+            timer = timer_set.schedule(DEADLINE_TICKS, None)
+
+        return timeit.timeit(restart, number=number) / number * 1e6
+
+    async def call_later_cost() -> float:
+        """Return the µs to restart a deadline with loop.call_later."""
+        loop = asyncio.get_running_loop()
+        handles = [loop.call_later(drill % DEADLINE_TICKS * TICK + 1, print) for drill in range(pending)]
+        handle = loop.call_later(DEADLINE_TICKS * TICK, print)
+
+        def restart() -> None:
+            """Restart a deadline on the event loop."""
+            nonlocal handle
+            handle.cancel()
+            handle = loop.call_later(DEADLINE_TICKS * TICK, print)
+
+        seconds = timeit.timeit(restart, number=number)
+        handle.cancel()
+        for other in handles:
+            other.cancel()
+        return seconds / number * 1e6
+
+    return [(name, restart_cost(timer_set)) for name, timer_set in timers.items()] + [
+        ('call_later', asyncio.run(call_later_cost())),
+    ]
+
+def main() -> None:
+    """Print the restart cost per deadline and the time per simulated tick."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--drills', type=int, default=50000)
+    args = parser.parse_args()
+
+    print(f"Restarting one deadline with {args.drills} pending:")
+    for name, microseconds in restart_costs(args.drills):
+        print(f"{name:<13} {microseconds:>5.2f} µs")
+
+    schedule = answer_ticks(args.drills)
+    answers = sum(len(answering) for answering in schedule)
+    print(f"\n{args.drills} concurrent drills, {answers} answers over {SIMULATED_TICKS * TICK:.0f}s:")
+    runs = [
+        ('timer wheel', lambda: run_timers(args.drills, schedule, TimerWheel())),
+        ('heapq timers', lambda: run_timers(args.drills, schedule, HeapTimers())),
+        ('bare heap', lambda: run_heap(args.drills, schedule)),
+    ]
+    for name, run in runs:
+        seconds, fired = run()
+        print(f"{name:<13} {seconds / SIMULATED_TICKS * 1e3:>7.3f} ms/tick, "
+              f"{seconds / (answers + fired) * 1e6:>5.2f} µs/timer, {fired} timeouts")
+
+if __name__ == '__main__':
+    main()
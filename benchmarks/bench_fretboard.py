@@ -0,0 +1,187 @@
+"""Micro-benchmarks for the fretboard functions that run on every message.
+
+Covers each function across all FRET_OPTIONS, both orientations and both modes (and
+question creation across all tunings, and PNG questions if Pillow is installed), and
+records calls per second and the memory allocated per call. Save a run as JSON and
+compare a later run against it to catch regressions:
+
+    python -m benchmarks.bench_fretboard --json before.json
+    python -m benchmarks.bench_fretboard --compare before.json
+
+With --compare the exit status is 1 if any case got slower than --threshold.
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+import config
+import fretboard
+import fretboard_image
+
+ORIENTATIONS = ('vertical', 'horizontal')
+MODES = ('show', 'hide')
+# Typical user answers, including ones format_note_name has to rewrite
+NOTE_INPUTS = ('C', 'c#', ' Db ', 'bb', 'E#', 'g')
+
+def build_cases() -> List[Tuple[str, Callable[[], Any]]]:
+    """Return (case name, zero-argument call) for every benchmarked configuration."""
+    cases: List[Tuple[str, Callable[[], Any]]] = []
+    for max_fret in config.FRET_OPTIONS:
+        board = fretboard.create_fretboard(max_fret)
+        # A target in the middle of the board, so both marked and unmarked cells are rendered
+        target_string, target_fret = 3, max_fret // 2
+        notes = board[target_string][:max_fret + 1]
+        cases.append((
+            f"visualize_string_horizontal/{max_fret}",
+            lambda notes=notes, target_fret=target_fret: fretboard.visualize_string_horizontal(target_string, notes, target_fret),
+        ))
+        for mode in MODES:
+            cases.append((
+                f"create_vertical_fretboard/{max_fret}/{mode}",
+                lambda board=board, max_fret=max_fret, mode=mode, target_fret=target_fret: fretboard.create_vertical_fretboard(
+                    board, max_fret, target_string, target_fret, mode),
+            ))
+            cases.append((
+                f"create_horizontal_fretboard/{max_fret}/{mode}",
+                lambda board=board, max_fret=max_fret, mode=mode, target_fret=target_fret: fretboard.create_horizontal_fretboard(
+                    board, max_fret, target_string, target_fret, mode),
+            ))
+            for orientation in ORIENTATIONS:
+                cases.append((
+                    f"create_question/{max_fret}/{orientation}/{mode}",
+                    lambda max_fret=max_fret, orientation=orientation, mode=mode: fretboard.create_question(
+                        max_fret, orientation, mode),
+                ))
+    # Rendering cost should not depend on the tuning
+    for tuning in config.TUNINGS:
+        max_fret = max(config.FRET_OPTIONS)
+        cases.append((
+            f"create_question/{max_fret}/vertical/show/{tuning}",
+            lambda max_fret=max_fret, tuning=tuning: fretboard.create_question(max_fret, tuning=tuning),
+        ))
+    if fretboard_image.AVAILABLE:
+        # Image questions: marker on a copy of the cached base image, then PNG encoding
+        for max_fret in config.FRET_OPTIONS:
+            cases.append((
+                f"question_png/{max_fret}",
+                lambda max_fret=max_fret: fretboard_image.question_png(max_fret, 3, max_fret // 2),
+            ))
+    for note in NOTE_INPUTS:
+        cases.append((f"format_note_name/{note.strip()}", lambda note=note: fretboard.format_note_name(note)))
+    return cases
+
+def ops_per_second(func: Callable[[], Any], repeat: int, min_time: float) -> float:
+    """Return the calls per second of the fastest of several timing runs.
+
+    Slower runs are slowed down by other processes, not by the code, so the best run
+    is the most reproducible figure (as timeit recommends).
+    """
+    timer = timeit.Timer(func)
+    # Pick a call count that takes at least min_time, like timeit's autorange
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return number / min(timer.repeat(repeat, number))
+
+def allocations(func: Callable[[], Any], calls: int = 100) -> Dict[str, float]:
+    """Return the memory blocks and peak bytes allocated per call."""
+    func()  # Warm caches so one-time work is not counted
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        results = [func() for _ in range(calls)]  # Keep results alive so their blocks are counted
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, 'lineno') if stat.count_diff > 0)
+    del results
+    return {'blocks_per_call': blocks / calls, 'peak_bytes_per_call': peak / calls}
+
+def git_commit() -> str:
+    """Return the current commit hash, or 'unknown' outside a git checkout."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def run(pattern: str, repeat: int, min_time: float) -> Dict[str, Any]:
+    """Benchmark every case whose name contains pattern."""
+    fretboard.warm_render_cache()
+    results = {}
+    for name, func in build_cases():
+        if pattern not in name:
+            continue
+        # Same question sequence on every run
+        random.seed(0)
+        results[name] = {'ops_per_sec': ops_per_second(func, repeat, min_time), **allocations(func)}
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+            'min_time': min_time,
+        },
+        'results': results,
+    }
+
+def print_results(report: Dict[str, Any]) -> None:
+    """Print one line per case."""
+    print(f"{'case':<46}{'ops/sec':>14}{'blocks':>9}{'peak B':>10}")
+    for name, result in report['results'].items():
+        print(f"{name:<46}{result['ops_per_sec']:>14,.0f}"
+              f"{result['blocks_per_call']:>9.1f}{result['peak_bytes_per_call']:>10.0f}")
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> bool:
+    """Print the change of every case against a baseline; return whether any case regressed."""
+    print(f"comparing {report['meta']['commit']} against {baseline['meta']['commit']}")
+    print(f"{'case':<46}{'before':>14}{'after':>14}{'change':>9}")
+    regressed = False
+    for name, result in report['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f"{name:<46}{'-':>14}{result['ops_per_sec']:>14,.0f}{'new':>9}")
+            continue
+        change = result['ops_per_sec'] / before['ops_per_sec'] - 1
+        flag = ''
+        if change < -threshold:
+            flag = '  REGRESSION'
+            regressed = True
+        print(f"{name:<46}{before['ops_per_sec']:>14,.0f}{result['ops_per_sec']:>14,.0f}{change:>+9.1%}{flag}")
+    return regressed
+
+def main() -> None:
+    """Run the benchmarks, then print, save and/or compare the results."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filter', default='', help='only run cases whose name contains this')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs per case (the fastest is reported)')
+    parser.add_argument('--min-time', type=float, default=0.05, help='minimum seconds per timing run')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='compare against results saved with --json')
+    parser.add_argument('--threshold', type=float, default=0.15, help='slowdown reported as a regression')
+    args = parser.parse_args()
+
+    report = run(args.filter, args.repeat, args.min_time)
+    if args.json:
+        with open(args.json, 'w') as output:
+            json.dump(report, output, indent=2)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if compare(report, baseline, args.threshold):
+            sys.exit(1)
+    else:
+        print_results(report)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Compare the table-driven answer parser against the previous format_note_name.
+
+Reports how many answers of a corpus each version recognizes (answers it can't
+resolve make users retry, which costs an extra message) and calls per second.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_note_parser
+"""
+import timeit
+from typing import Callable, List
+
+import fretboard
+
+ITERATIONS = 200
+
+# Answers as users type them, with the note they mean
+CORPUS = [
+    ('C', 'C'), ('c', 'C'), ('C#', 'C#'), ('c#', 'C#'), ('Db', 'C#'), ('db', 'C#'), (' D ', 'D'),
+    ('d#', 'D#'), ('Eb', 'D#'), ('eb', 'D#'), ('E', 'E'), ('e', 'E'), ('Fb', 'E'), ('E#', 'F'),
+    ('f', 'F'), ('F#', 'F#'), ('f#', 'F#'), ('Gb', 'F#'), ('G', 'G'), ('g#', 'G#'), ('Ab', 'G#'),
+    ('a', 'A'), ('A#', 'A#'), ('Bb', 'A#'), ('bb', 'A#'), ('B', 'B'), ('b', 'B'), ('Cb', 'B'),
+    ('B#', 'C'), ('C♯', 'C#'), ('D♭', 'C#'), ('f♯', 'F#'), ('B♭', 'A#'), ('e♭', 'D#'),
+    ('A.', 'A'), ('g!', 'G'), ('F#?', 'F#'), ('"E"', 'E'), ('C4', 'C'), ('eb3', 'D#'), ('A#2', 'A#'),
+    ('Do', 'C'), ('re', 'D'), ('Mi', 'E'), ('fa', 'F'), ('Sol', 'G'), ('la', 'A'), ('Si', 'B'),
+    ('ti', 'B'), ('sib', 'A#'), ('Fa#', 'F#'), ('A sharp', 'A#'), ('B flat', 'A#'), ('E-flat', 'D#'),
+    ('c sharp', 'C#'), ('hello', None), ('I think G', None), ('🎸', None),
+]
+
+def legacy_format_note_name(note: str) -> str:
+    """format_note_name as it was before the lookup table."""
+    note = note.upper().strip()
+    replacements = {
+        'BB': 'A#',
+        'DB': 'C#',
+        'EB': 'D#',
+        'GB': 'F#',
+        'AB': 'G#',
+        'B#': 'C',
+        'E#': 'F'
+    }
+    return replacements.get(note, note)
+
+def recognized(parse: Callable[[str], str]) -> List[str]:
+    """Return the corpus answers that parse resolves to the intended note."""
+    return [answer for answer, expected in CORPUS if expected is not None and parse(answer) == expected]
+
+def measure(parse: Callable[[str], str]) -> float:
+    """Return calls per second over the whole corpus."""
+    answers = [answer for answer, _ in CORPUS]
+    seconds = timeit.timeit(lambda: [parse(answer) for answer in answers], number=ITERATIONS)
+    return ITERATIONS * len(answers) / seconds
+
+def main() -> None:
+    """Print recognition rate and speed of both parsers."""
+    notes = sum(expected is not None for _, expected in CORPUS)
+    old = recognized(legacy_format_note_name)
+    new = recognized(fretboard.format_note_name)
+    print(f"{'parser':<10}{'recognized':>14}{'calls/sec':>14}")
+    print(f"{'previous':<10}{len(old):>8}/{notes:<5}{measure(legacy_format_note_name):>14,.0f}")
+    print(f"{'table':<10}{len(new):>8}/{notes:<5}{measure(fretboard.format_note_name):>14,.0f}")
+    missed = [answer for answer, expected in CORPUS if expected is not None and answer not in new]
+    if missed:
+        print("not recognized by the table:", ", ".join(repr(answer) for answer in missed))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Measure restart-to-ready time and per-answer write cost of the SQLite persistence.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_persistence [--users 100000]
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from persistence import SQLiteBackend, WriteBehindPersistence
+from session import Session
+
+def sample_user_data(user_id: int) -> Dict[str, Any]:
+    """Return user_data shaped like a session in the middle of a game."""
+    return {
+        'max_fret': 12,
+        'correct_note': 'C#',
+        'attempts': 0,
+        'string_num': user_id % 6 + 1,
+        'fret_num': user_id % 13,
+        'stats': {'correct_answers': 10, 'wrong_answers': 2, 'total_questions': 12, 'questions_with_hints': 2},
+    }
+
+def sample_session(user_id: int) -> Session:
+    """Return a Session holding sample_user_data, as the bot keeps it in memory."""
+    session = Session()
+    session.restore(sample_user_data(user_id))
+    return session
+
+async def run(users: int, path: str) -> None:
+    """Populate a database, then time a restart and a round of writes."""
+    backend = SQLiteBackend(path)
+    backend.write_batch(
+        {user_id: sample_user_data(user_id) for user_id in range(users)},
+        {('fretbuddy', (user_id, user_id)): 2 for user_id in range(users)},
+    )
+    backend.close()
+
+    # Restart: what Application.initialize does, plus the first user's lazy load
+    start = time.perf_counter()
+    persistence = WriteBehindPersistence(SQLiteBackend(path))
+    await persistence.get_user_data()
+    conversations = await persistence.get_conversations('fretbuddy')
+    ready = time.perf_counter() - start
+    await persistence.refresh_user_data(1, Session())
+    first_user = time.perf_counter() - start
+    print(f"restart-to-ready with {users} stored users: {ready * 1000:.1f} ms "
+          f"({len(conversations)} conversations), first user loaded after {first_user * 1000:.1f} ms")
+
+    # One write-behind round in which every user answered once
+    sessions: List[Session] = [sample_session(user_id) for user_id in range(users)]
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        persistence.update_user_data(user_id, session) for user_id, session in enumerate(sessions)
+    ))
+    await persistence._commit_task
+    batched = (time.perf_counter() - start) / users
+    print(f"write-behind cost per answer: {batched * 1e6:.1f} µs")
+
+    # The alternative: one transaction per answer
+    sample = min(users, 2000)
+    start = time.perf_counter()
+    for user_id in range(sample):
+        persistence.backend.write_batch({user_id: sessions[user_id].to_dict()}, {})
+    immediate = (time.perf_counter() - start) / sample
+    print(f"write-per-answer cost per answer: {immediate * 1e6:.1f} µs ({immediate / batched:.1f}x)")
+
+    await persistence.flush()
+
+def main() -> None:
+    """Parse arguments and run the benchmark against a temporary database."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=100000)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(run(args.users, os.path.join(directory, 'bench.sqlite3')))
+
+if __name__ == '__main__':
+    main()
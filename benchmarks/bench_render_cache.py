@@ -0,0 +1,62 @@
+"""Compare cached question rendering against rendering the grid from scratch.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_render_cache
+"""
+import random
+import timeit
+from typing import Callable, List, Tuple
+
+import config
+import fretboard
+
+ITERATIONS = 20000
+
+def uncached_question(max_fret: int, orientation: str, mode: str) -> Tuple[str, int, int, str]:
+    """Create a question the way it was done before the template cache."""
+    board = fretboard.create_fretboard(max_fret)
+    string_num = random.randint(1, 6)
+    fret_num = random.randint(0, max_fret)
+    visual = fretboard.render_question(board, max_fret, string_num, fret_num, orientation, mode)
+    return (visual, string_num, fret_num, board[string_num][fret_num])
+
+def check_equivalence() -> None:
+    """Make sure both paths produce identical diagrams for every cell."""
+    for max_fret in config.FRET_OPTIONS:
+        board = fretboard.create_fretboard(max_fret)
+        for orientation in ('vertical', 'horizontal'):
+            for mode in ('show', 'hide'):
+                template = fretboard.get_question_template(max_fret, orientation, mode)
+                for (string_num, fret_num), (start, end, note) in template.cells.items():
+                    spliced = template.text[:start] + template.marker + template.text[end:]
+                    expected = fretboard.render_question(board, max_fret, string_num, fret_num, orientation, mode)
+                    assert spliced == expected, (max_fret, orientation, mode, string_num, fret_num)
+                    assert note == board[string_num][fret_num]
+
+def measure(func: Callable[[int, str, str], object], max_fret: int, orientation: str, mode: str) -> float:
+    """Return the mean time per call in microseconds."""
+    seconds = timeit.timeit(lambda: func(max_fret, orientation, mode), number=ITERATIONS)
+    return seconds / ITERATIONS * 1e6
+
+def main() -> None:
+    """Print a per-configuration comparison table."""
+    check_equivalence()
+    fretboard.warm_render_cache()
+
+    rows: List[str] = []
+    for max_fret in config.FRET_OPTIONS:
+        for orientation in ('vertical', 'horizontal'):
+            for mode in ('show', 'hide'):
+                before = measure(uncached_question, max_fret, orientation, mode)
+                after = measure(fretboard.create_question, max_fret, orientation, mode)
+                rows.append(
+                    f"{max_fret:>5} {orientation:<11} {mode:<4} "
+                    f"{before:>9.2f} {after:>9.2f} {before / after:>7.1f}x"
+                )
+
+    print("frets orientation mode  uncached    cached speedup  (µs/question)")
+    print("\n".join(rows))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Report the memory cost per in-memory user session.
+
+With adaptive questions a Session also holds its PositionScheduler, one array of about
+240 bytes at 12 frets, which makes it about 45 bytes larger than the old dict-of-dicts
+layout (that had no weights at all).
+
+Run from the repository root:
+
+    python -m benchmarks.bench_session_memory [--users 100000]
+"""
+import argparse
+import time
+import tracemalloc
+from typing import Any, Callable, Dict
+
+from scheduler import PositionScheduler
+from session import Session
+
+def session_record(user_id: int) -> Session:
+    """Return a Session in the middle of a game."""
+    session = Session()
+    session.max_fret = 12
+    session.correct_note = 'C#'
+    session.string_num = user_id % 6 + 1
+    session.fret_num = user_id % 13
+    session.correct_answers = user_id % 50
+    session.total_questions = user_id % 60
+    session.last_seen = int(time.monotonic()) + user_id % 1000
+    return session
+
+def adaptive_session_record(user_id: int) -> Session:
+    """Return a Session in the middle of a game, with adaptive question weights."""
+    session = session_record(user_id)
+    session.scheduler = PositionScheduler(6, session.max_fret)
+    session.scheduler.record(session.string_num, session.fret_num, False)
+    return session
+
+def legacy_record(user_id: int) -> Dict[str, Any]:
+    """Return the same state in the old dict-of-dicts user_data layout."""
+    return {
+        'max_fret': 12,
+        'orientation': 'vertical',
+        'mode': 'show',
+        'correct_note': 'C#',
+        'attempts': 0,
+        'string_num': user_id % 6 + 1,
+        'fret_num': user_id % 13,
+        'stats': {
+            'correct_answers': user_id % 50,
+            'wrong_answers': 0,
+            'total_questions': user_id % 60,
+            'questions_with_hints': 0,
+        },
+    }
+
+def measure(factory: Callable[[int], object], users: int) -> float:
+    """Return the bytes allocated per user for a user_id -> record mapping."""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    sessions = {user_id: factory(user_id) for user_id in range(users)}
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del sessions
+    return allocated / users
+
+def main() -> None:
+    """Print bytes per session for each layout."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=100000)
+    args = parser.parse_args()
+
+    layouts = (
+        ('Session (__slots__)', session_record),
+        ('Session + scheduler', adaptive_session_record),
+        ('dict of dicts', legacy_record),
+    )
+    for name, factory in layouts:
+        per_user = measure(factory, args.users)
+        print(f"{name:<20} {per_user:>7.0f} bytes/session, "
+              f"{per_user * args.users / 2**20:>6.1f} MiB for {args.users} users")
+
+if __name__ == '__main__':
+    main()
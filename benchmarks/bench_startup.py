@@ -0,0 +1,123 @@
+"""Measure cold start: import time and time to first reply, by startup mode.
+
+Import time is that of bot and webserver in a fresh interpreter. For the time to
+first reply, the bot is started in webhook mode as a subprocess; a /start update is
+posted to its webhook until it is accepted, and the clock stops when the reply
+reaches the fake Bot API, which answers every call after --api-latency seconds
+like a round trip to Telegram. Modes:
+
+- default: templates rendered at startup, HTTP server started once the bot is running
+- fast: FAST_START=1 with the template artifact the Docker image builds
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup [--runs 5] [--api-latency 0.1]
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+
+import render_artifact
+from loadtest.fake_bot_api import FakeBotAPI
+from loadtest.run import message_update
+
+IMPORT_SNIPPET = "import time; start = time.perf_counter(); import bot, webserver; print(time.perf_counter() - start)"
+CHAT_ID = 4242
+SECRET = "bench"
+REPLY_TIMEOUT = 60.0
+
+def bot_environment(args: argparse.Namespace, directory: str, fast: bool) -> Dict[str, str]:
+    """Return the environment of a webhook bot talking to the fake API, in the given startup mode."""
+    env = dict(os.environ)
+    env.update({
+        "TELEGRAM_BOT_TOKEN": env.get("TELEGRAM_BOT_TOKEN", "123456:STARTUP"),
+        "TELEGRAM_BASE_URL": f"http://127.0.0.1:{args.api_port}/bot",
+        "BOT_MODE": "webhook",
+        "PORT": str(args.port),
+        "WEBHOOK_LISTEN": "127.0.0.1",
+        # Registered with the fake API at startup, like on Fly.io
+        "WEBHOOK_URL": f"http://127.0.0.1:{args.port}",
+        "WEBHOOK_SECRET": SECRET,
+        "PERSISTENCE_PATH": os.path.join(directory, "fretbuddy.sqlite3"),
+        "ANALYTICS_PATH": os.path.join(directory, "analytics"),
+        "FAST_START": "1" if fast else "0",
+        "RENDER_ARTIFACT": os.path.join(directory, "render_templates.bin" if fast else "missing.bin"),
+    })
+    env.pop("FLY_APP_NAME", None)
+    return env
+
+def import_seconds(env: Dict[str, str]) -> float:
+    """Return the time to import the bot in a fresh interpreter."""
+    result = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], env=env, capture_output=True, text=True, check=True)
+    return float(result.stdout)
+
+async def first_reply(env: Dict[str, str], args: argparse.Namespace) -> Tuple[float, float]:
+    """Start the bot and return the seconds until it accepted a /start update and until it replied."""
+    api = FakeBotAPI(latency=args.api_latency)
+    started = asyncio.Event()
+    serving = asyncio.create_task(api.serve(args.api_port, started=started))
+    await started.wait()
+
+    url = f"http://127.0.0.1:{args.port}/telegram"
+    headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+    update = message_update(CHAT_ID, "/start")
+    async with httpx.AsyncClient() as client:
+        start = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "bot.py", env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            while True:
+                with contextlib.suppress(httpx.TransportError):
+                    if (await client.post(url, json=update, headers=headers)).status_code == 200:
+                        break
+                await asyncio.sleep(0.005)
+            accepted = time.perf_counter() - start
+            await asyncio.wait_for(api.replies(CHAT_ID).get(), REPLY_TIMEOUT)
+            replied = time.perf_counter() - start
+        finally:
+            process.terminate()
+            await process.wait()
+
+    serving.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await serving
+    return accepted, replied
+
+def main() -> None:
+    """Print median import time, time until the webhook accepts an update and time to first reply per mode."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--api-latency", type=float, default=0.1, help="seconds the fake API takes per call")
+    parser.add_argument("--port", type=int, default=8080, help="port of the bot's webhook")
+    parser.add_argument("--api-port", type=int, default=8081, help="port of the fake Bot API")
+    args = parser.parse_args()
+
+    print(f"{'mode':<8}{'import ms':>11}{'accepted ms':>13}{'first reply ms':>16}")
+    for mode in ("default", "fast"):
+        with tempfile.TemporaryDirectory() as directory:
+            env = bot_environment(args, directory, fast=mode == "fast")
+            if mode == "fast":
+                render_artifact.build(env["RENDER_ARTIFACT"])
+            imports: List[float] = []
+            accepted: List[float] = []
+            replied: List[float] = []
+            for _ in range(args.runs):
+                imports.append(import_seconds(env))
+                accepted_seconds, replied_seconds = asyncio.run(first_reply(env, args))
+                accepted.append(accepted_seconds)
+                replied.append(replied_seconds)
+        print(f"{mode:<8}{statistics.median(imports) * 1000:>11.0f}"
+              f"{statistics.median(accepted) * 1000:>13.0f}{statistics.median(replied) * 1000:>16.0f}")
+
+if __name__ == "__main__":
+    main()
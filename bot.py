@@ -1,8 +1,24 @@
+import asyncio
 import logging
-from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters, ContextTypes, ConversationHandler
+import math
+import time
+from typing import Dict, Optional, Tuple, Union
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto, Message
+from telegram.error import BadRequest
+from telegram.ext import Application, CallbackContext, CommandHandler, MessageHandler, CallbackQueryHandler, InlineQueryHandler, filters, ContextTypes, ConversationHandler, ExtBot, TypeHandler
 import config
 import fretboard
+import fretboard_image
+import inline
+import metrics
+import render_artifact
+from drill import DrillClock, DrillTimeout
+from outbound import PRIORITY_ANSWER, PriorityRateLimiter
+from persistence import create_persistence
+from rng import SplitMix64
+from scheduler import PositionScheduler
+from session import Session, SessionEvictor
+from update_processor import PerChatUpdateProcessor
 
 # Enable logging
 logging.basicConfig(
@@ -16,7 +32,23 @@ MAIN_MENU = 0
 SELECTING_FRET = 1
 PLAYING_GAME = 2
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+# /profile defaults: stop after this many updates, or after this many seconds
+PROFILE_DEFAULT_UPDATES = 100
+PROFILE_DEFAULT_SECONDS = 60
+
+# Callback context whose user_data is a Session
+Context = CallbackContext[ExtBot, Session, Dict, Dict]
+
+def send_priority(context: Context, priority: int) -> Optional[int]:
+    """Return rate_limit_args for the outbound queue, or None when it is disabled."""
+    return priority if context.bot.rate_limiter is not None else None
+
+async def touch_session(update: Update, context: Context) -> None:
+    """Record when a user was last active, for idle session eviction."""
+    if context.user_data is not None:
+        context.user_data.last_seen = int(time.monotonic())
+
+async def start(update: Update, context: Context) -> int:
     """Start the conversation and ask user for input."""
     # Create vertical keyboard layout with inline buttons
     keyboard = [
@@ -42,40 +74,37 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         )
     return SELECTING_FRET 
 
-async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+@metrics.timed("button_handler")
+async def button_handler(update: Update, context: Context) -> int:
     """Handle button presses for fret selection."""
     query = update.callback_query
     await query.answer()
     
+    session = context.user_data
+    
     # Extract fret number from callback data
     selected_fret = int(query.data.split('_')[1])
     
-    # Generate first question
-    fretboard_visual, string_num, fret_num, correct_note = fretboard.create_question(
-        selected_fret,
-        orientation=context.user_data.get('orientation', 'vertical'),
-        mode=context.user_data.get('mode', 'show')
-    )
-    
-    # Store correct answer in context
-    context.user_data['max_fret'] = selected_fret
-    context.user_data['correct_note'] = correct_note
-    context.user_data['attempts'] = 0
-    context.user_data['string_num'] = string_num
-    context.user_data['fret_num'] = fret_num
+    # Generate first question and store the correct answer in context
+    session.max_fret = selected_fret
+    fretboard_visual = next_question(session, update.effective_user.id)
     
     # Initialize session statistics
-    context.user_data['stats'] = {
-        'correct_answers': 0,
-        'wrong_answers': 0,
-        'total_questions': 0,
-        'questions_with_hints': 0  # Questions where user needed a second attempt
-    }
+    session.reset_stats()
     
     # Create keyboard with End Session button
     keyboard = [[InlineKeyboardButton("End Session", callback_data="game_end")]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
+    if session.render == 'image':
+        # A text message can't be edited into a photo; send the question as a new message
+        await query.message.edit_text(f"Great! Let's practice with {selected_fret} frets.")
+        message = await send_question_photo(context, session, update.effective_chat.id, QUESTION_PROMPT, reply_markup)
+        session.question_message_id = message.message_id
+        prefetch_question(session, update.effective_user.id)
+        start_question_timer(context, session, update.effective_chat.id, update.effective_user.id)
+        return PLAYING_GAME
+    
     # Use edit_message_text to update the existing message
     await query.message.edit_text(
         f"Great! Let's practice with {selected_fret} frets.\n"
@@ -83,100 +112,384 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         f"```\n{fretboard_visual}\n```",
         reply_markup=reply_markup
     )
+    session.question_message_id = query.message.message_id
+    prefetch_question(session, update.effective_user.id)
+    start_question_timer(context, session, update.effective_chat.id, update.effective_user.id)
     
     return PLAYING_GAME
 
-async def handle_answer(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Handle user's answer and provide feedback."""
-    user_answer = fretboard.format_note_name(update.message.text)
-    correct_note = context.user_data['correct_note']
-    string_num = context.user_data['string_num']
-    fret_num = context.user_data['fret_num']
+QUESTION_PROMPT = "What note is marked with '?' on the fretboard?"
+
+def question_text(fretboard_visual: str) -> str:
+    """Format the prompt for a question diagram."""
+    return (
+        f"{QUESTION_PROMPT}\n\n"
+        f"```\n{fretboard_visual}\n```"
+    )
+
+def question_photo(session: Session) -> Tuple[fretboard_image.ImageKey, Union[str, bytes]]:
+    """Return the image of the session's current question: a cached file_id or a freshly drawn PNG."""
+    return fretboard_image.question_photo(
+        session.max_fret, session.string_num, session.fret_num, session.mode, session.tuning
+    )
+
+async def send_question_photo(context: Context, session: Session, chat_id: int, caption: str, reply_markup: InlineKeyboardMarkup, priority: Optional[int] = None) -> Message:
+    """Send the current question as a photo, remembering its file_id after the first upload."""
+    key, photo = question_photo(session)
+    message = await context.bot.send_photo(
+        chat_id, photo, caption=caption, reply_markup=reply_markup, rate_limit_args=priority
+    )
+    fretboard_image.remember_upload(key, message)
+    return message
+
+def question_scheduler(session: Session) -> PositionScheduler:
+    """Return the session's scheduler, sized for its current fret range."""
+    scheduler = session.scheduler
+    strings = len(config.TUNINGS[session.tuning])
+    if scheduler is None:
+        scheduler = session.scheduler = PositionScheduler(strings, session.max_fret)
+    elif scheduler.max_fret != session.max_fret or scheduler.strings != strings:
+        scheduler = session.scheduler = scheduler.resized(strings, session.max_fret)
+    return scheduler
+
+def record_answer(session: Session, user_id: int, correct: bool) -> None:
+    """Feed the outcome of the current question into the adaptive scheduler, then draw the next question."""
+    if config.ADAPTIVE_QUESTIONS:
+        seconds = time.monotonic() - session.asked_at if session.asked_at else None
+        question_scheduler(session).record(session.string_num, session.fret_num, correct, seconds)
+        # Only now, so the next position already reflects this answer
+        draw_next_question(session, user_id)
+
+def record_outcome(context: Context, session: Session, correct: bool, timed_out: bool = False) -> None:
+    """Record a finished question (solved, given up after the last attempt or timed out).
+
+    Answered questions add to the session's response times; all of them go into the
+    global analytics.
+    """
+    if not session.asked_at:
+        return
+    seconds = time.monotonic() - session.asked_at
+    if not timed_out:
+        session.response_seconds += seconds
+        session.responses += 1
+    analytics = context.bot_data.get('analytics')
+    if analytics is not None:
+        analytics.record(
+            session.tuning, session.string_num, session.fret_num, correct, session.attempts + correct, seconds
+        )
+
+def start_question_timer(context: Context, session: Session, chat_id: int, user_id: int, missed: int = 0) -> None:
+    """In a timed drill, start the deadline of the question just sent (replacing the previous one)."""
+    stop_question_timer(context, session)
+    if session.drill_seconds:
+        session.drill_timer = context.bot_data['drill_clock'].schedule(
+            session.drill_seconds, DrillTimeout(chat_id, user_id, missed)
+        )
+
+def stop_question_timer(context: Context, session: Session) -> None:
+    """Cancel the deadline of the current question, if any."""
+    if session.drill_timer is not None:
+        context.bot_data['drill_clock'].cancel(session.drill_timer)
+        session.drill_timer = None
+
+def question_rng(session: Session, user_id: int) -> SplitMix64:
+    """Return the user's random generator, seeding it on first use."""
+    if session.rng is None:
+        session.rng = SplitMix64.for_user(user_id, config.QUESTION_SEED)
+    return session.rng
+
+def generate_question(session: Session, user_id: int) -> Tuple[str, int, int, str]:
+    """Pick a position for the session's next question and render it."""
+    start = time.perf_counter()
+    rng = question_rng(session, user_id)
+    if config.ADAPTIVE_QUESTIONS:
+        # Favour positions the user keeps missing
+        position = question_scheduler(session).pick(rng)
+    else:
+        position = (rng.randrange(len(config.TUNINGS[session.tuning])) + 1, rng.randrange(session.max_fret + 1))
+    question = fretboard.create_question(
+        session.max_fret,
+        orientation=session.orientation,
+        mode=session.mode,
+        position=position,
+        tuning=session.tuning
+    )
+    metrics.QUESTION_SECONDS.observe(time.perf_counter() - start)
+    return question
+
+def draw_next_question(session: Session, user_id: int) -> None:
+    """Generate the session's next question and keep it until next_question() makes it current."""
+    key = (session.max_fret, session.orientation, session.mode, session.tuning)
+    session.prefetched = (key, generate_question(session, user_id))
+
+def prefetch_question(session: Session, user_id: int) -> None:
+    """Generate the session's next question ahead of time, once the current one has been sent.
+
+    With adaptive questions the next position depends on the answer to the current one,
+    so record_answer() draws it instead, right after updating the scheduler.
+    """
+    if not config.ADAPTIVE_QUESTIONS:
+        draw_next_question(session, user_id)
+
+def next_question(session: Session, user_id: int) -> str:
+    """Make the prefetched (or, if stale or missing, a new) question current and return its diagram."""
+    prefetched = session.prefetched
+    session.prefetched = None
+    # Settings may have changed since the question was generated
+    if prefetched is not None and prefetched[0] == (session.max_fret, session.orientation, session.mode, session.tuning):
+        question = prefetched[1]
+    else:
+        question = generate_question(session, user_id)
+    fretboard_visual, string_num, fret_num, correct_note = question
     
+    # Update context with new question
+    session.correct_note = correct_note
+    session.attempts = 0
+    session.string_num = string_num
+    session.fret_num = fret_num
+    session.asked_at = time.monotonic()
+    return fretboard_visual
+
+async def reply_to_answer(context: Context, session: Session, chat_id: int, feedback: str, fretboard_visual: str = None) -> None:
+    """Send answer feedback, and the next question if there is one, using the user's response mode."""
     # Create keyboard with End Session button - reused for all responses
     keyboard = [[InlineKeyboardButton("End Session", callback_data="game_end")]]
     reply_markup = InlineKeyboardMarkup(keyboard)
     
+    # Answer feedback goes ahead of menu redraws in the outbound queue
+    priority = send_priority(context, PRIORITY_ANSWER)
+    
+    if session.render == 'image':
+        await reply_with_photo(context, session, chat_id, feedback, fretboard_visual is not None, reply_markup, priority)
+        return
+    
+    if session.response_mode == 'separate' and fretboard_visual is not None:
+        # Two messages: feedback, then the question
+        await context.bot.send_message(chat_id, feedback, rate_limit_args=priority)
+        message = await context.bot.send_message(
+            chat_id, question_text(fretboard_visual), reply_markup=reply_markup, rate_limit_args=priority
+        )
+        session.question_message_id = message.message_id
+        return
+    
+    if session.response_mode == 'edit' and session.question_message_id is not None:
+        # Rewrite the previous question message; keep showing the current question on a retry
+        if fretboard_visual is None:
+            fretboard_visual = fretboard.question_diagram(
+                session.max_fret, session.string_num, session.fret_num, session.orientation, session.mode, session.tuning
+            )
+        try:
+            await context.bot.edit_message_text(
+                f"{feedback}\n\n{question_text(fretboard_visual)}",
+                chat_id=chat_id,
+                message_id=session.question_message_id,
+                reply_markup=reply_markup,
+                rate_limit_args=priority
+            )
+            return
+        except BadRequest as error:
+            # e.g. the message was deleted or is too old to edit; fall back to a new message
+            logger.debug("Could not edit question message: %s", error)
+    
+    # One message with the feedback and, if any, the next question
+    if fretboard_visual is None:
+        await context.bot.send_message(chat_id, feedback, reply_markup=reply_markup, rate_limit_args=priority)
+        return
+    message = await context.bot.send_message(
+        chat_id,
+        f"{feedback}\n\n{question_text(fretboard_visual)}",
+        reply_markup=reply_markup,
+        rate_limit_args=priority
+    )
+    session.question_message_id = message.message_id
+
+async def reply_with_photo(context: Context, session: Session, chat_id: int, feedback: str, new_question: bool, reply_markup: InlineKeyboardMarkup, priority: Optional[int]) -> None:
+    """reply_to_answer for image questions: the question is a photo with the prompt as its caption."""
+    if session.response_mode == 'separate' and new_question:
+        await context.bot.send_message(chat_id, feedback, rate_limit_args=priority)
+        message = await send_question_photo(context, session, chat_id, QUESTION_PROMPT, reply_markup, priority)
+        session.question_message_id = message.message_id
+        return
+    
+    if session.response_mode == 'edit' and session.question_message_id is not None:
+        # Swap the photo of the previous question message; on a retry it stays the same
+        key, photo = question_photo(session)
+        try:
+            message = await context.bot.edit_message_media(
+                InputMediaPhoto(photo, caption=f"{feedback}\n\n{QUESTION_PROMPT}"),
+                chat_id=chat_id,
+                message_id=session.question_message_id,
+                reply_markup=reply_markup,
+                rate_limit_args=priority
+            )
+            fretboard_image.remember_upload(key, message)
+            return
+        except BadRequest as error:
+            # e.g. the previous question was a text message, or was deleted
+            logger.debug("Could not edit question photo: %s", error)
+    
+    if not new_question:
+        await context.bot.send_message(chat_id, feedback, reply_markup=reply_markup, rate_limit_args=priority)
+        return
+    message = await send_question_photo(
+        context, session, chat_id, f"{feedback}\n\n{QUESTION_PROMPT}", reply_markup, priority
+    )
+    session.question_message_id = message.message_id
+
+@metrics.timed("handle_answer")
+async def handle_answer(update: Update, context: Context) -> int:
+    """Handle user's answer and provide feedback."""
+    session = context.user_data
+    if session.correct_note is None:
+        # The session was evicted without persistence while the conversation was still in a game
+        await update.message.reply_text("This game has expired. Send /start to begin a new one.")
+        return ConversationHandler.END
+    user_answer = fretboard.format_note_name(update.message.text)
+    correct_note = session.correct_note
+    string_num = session.string_num
+    fret_num = session.fret_num
+    
     # Update total questions count on first attempt
-    if context.user_data['attempts'] == 0:
-        context.user_data['stats']['total_questions'] += 1
+    if session.attempts == 0:
+        session.total_questions += 1
     
     if user_answer == correct_note:
         # Update statistics for correct answer
-        if context.user_data['attempts'] == 0:
-            context.user_data['stats']['correct_answers'] += 1
-        
-        await update.message.reply_text(
-            f"🎉 Correct! The note at fret {fret_num} on string {string_num} is {correct_note}.\n\n"
-            "Let's try another one!"
-        )
+        if session.attempts == 0:
+            session.correct_answers += 1
+            record_answer(session, update.effective_user.id, True)
+        record_outcome(context, session, True)
         
         # Generate new question
-        fretboard_visual, string_num, fret_num, correct_note = fretboard.create_question(
-            context.user_data['max_fret'],
-            orientation=context.user_data.get('orientation', 'vertical'),
-            mode=context.user_data.get('mode', 'show')
-        )
-        
-        # Update context with new question
-        context.user_data['correct_note'] = correct_note
-        context.user_data['attempts'] = 0
-        context.user_data['string_num'] = string_num
-        context.user_data['fret_num'] = fret_num
-        
-        await update.message.reply_text(
-            "What note is marked with '?' on the fretboard?\n\n"
-            f"```\n{fretboard_visual}\n```",
-            reply_markup=reply_markup
+        await reply_to_answer(
+            context,
+            session,
+            update.effective_chat.id,
+            f"🎉 Correct! The note at fret {fret_num} on string {string_num} is {correct_note}.\n\n"
+            "Let's try another one!",
+            next_question(session, update.effective_user.id)
         )
     else:
         # Wrong answer
-        context.user_data['attempts'] += 1
-        if context.user_data['attempts'] >= 2:
+        if session.attempts == 0:
+            record_answer(session, update.effective_user.id, False)
+        session.attempts += 1
+        if session.attempts >= 2:
             # Update statistics for wrong answer and hint usage
-            context.user_data['stats']['wrong_answers'] += 1
-            context.user_data['stats']['questions_with_hints'] += 1
-            
-            await update.message.reply_text(
-                f"The correct answer was {correct_note}. Let's try a new one!"
-            )
+            session.wrong_answers += 1
+            session.questions_with_hints += 1
+            record_outcome(context, session, False)
             
             # Generate new question after two failed attempts
-            fretboard_visual, string_num, fret_num, correct_note = fretboard.create_question(
-                context.user_data['max_fret'],
-                orientation=context.user_data.get('orientation', 'vertical'),
-                mode=context.user_data.get('mode', 'show')
-            )
-            
-            # Update context with new question
-            context.user_data['correct_note'] = correct_note
-            context.user_data['attempts'] = 0
-            context.user_data['string_num'] = string_num
-            context.user_data['fret_num'] = fret_num
-            
-            await update.message.reply_text(
-                "What note is marked with '?' on the fretboard?\n\n"
-                f"```\n{fretboard_visual}\n```",
-                reply_markup=reply_markup
+            await reply_to_answer(
+                context,
+                session,
+                update.effective_chat.id,
+                f"The correct answer was {correct_note}. Let's try a new one!",
+                next_question(session, update.effective_user.id)
             )
         else:
-            await update.message.reply_text(
-                "That's not correct. Try again! 🎸",
-                reply_markup=reply_markup
-            )
+            await reply_to_answer(context, session, update.effective_chat.id, "That's not correct. Try again! 🎸")
+            return PLAYING_GAME
     
+    # The reply is out; get the following question ready before the user answers
+    prefetch_question(session, update.effective_user.id)
+    start_question_timer(context, session, update.effective_chat.id, update.effective_user.id)
     return PLAYING_GAME
 
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+async def drill_timeout(update: DrillTimeout, context: Context) -> None:
+    """Handle an expired timed question: count it as missed and ask the next one."""
+    # A custom update has no user_data in its context
+    session = context.application.user_data.get(update.user_id)
+    if session is None or session.drill_timer is None or session.drill_timer.payload is not update:
+        # Answered in time, or the drill ended, while this timeout was queued
+        return
+    session.drill_timer = None
+    
+    if session.attempts == 0:
+        session.total_questions += 1
+        record_answer(session, update.user_id, False)
+    session.wrong_answers += 1
+    session.timed_out += 1
+    record_outcome(context, session, False, timed_out=True)
+    
+    missed = update.missed + 1
+    feedback = f"⏰ Time's up! The note at fret {session.fret_num} on string {session.string_num} is {session.correct_note}."
+    if missed >= config.DRILL_MAX_MISSED:
+        # Nobody seems to be answering; the clock restarts with the next answer
+        feedback += "\n\nThe timer is paused until you answer."
+    await reply_to_answer(context, session, update.chat_id, feedback, next_question(session, update.user_id))
+    prefetch_question(session, update.user_id)
+    if missed < config.DRILL_MAX_MISSED:
+        start_question_timer(context, session, update.chat_id, update.user_id, missed)
+    # Application only persists user data of Telegram updates by itself
+    context.application.mark_data_for_update_persistence(user_ids=[update.user_id])
+
+async def help_command(update: Update, context: Context) -> None:
     """Send a message when the command /help is issued."""
     await update.message.reply_text(
         "Guitar Fretboard Learning Bot Help:\n\n"
         "/start - Start learning\n"
         "/setfret - Change maximum fret number\n"
+        "/stats - Show statistics of all players\n"
         "/help - Show this help message"
+        + (f"\n\nIn any chat, type @{context.bot.username} 7 to share questions up to fret 7" if config.INLINE_ENABLED else "")
     )
 
-async def setfret(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def stats_command(update: Update, context: Context) -> None:
+    """Handle /stats: show accuracy and the hardest positions across all users."""
+    analytics = context.bot_data.get('analytics')
+    if analytics is None:
+        await update.message.reply_text("Statistics are not enabled.")
+        return
+    await update.message.reply_text(analytics.summary(context.user_data.tuning))
+
+@metrics.timed("inline_query")
+async def inline_query(update: Update, context: Context) -> None:
+    """Answer an inline query with the cached question set it names; Telegram caches the answer too."""
+    key = inline.parse_query(update.inline_query.query)
+    results = inline.result_set(*key) if key is not None else []
+    # The same query text gets the same results for everyone, so Telegram may share its cache
+    await update.inline_query.answer(results, cache_time=config.INLINE_CACHE_TIME, is_personal=False)
+
+def parse_profile_argument(argument: Optional[str]) -> Tuple[Optional[int], float]:
+    """Return the (updates, seconds) a /profile argument asks for; raises ValueError if it is invalid.
+
+    "200" profiles 200 updates (for at most PROFILE_DEFAULT_SECONDS), "30s" profiles 30
+    seconds; seconds are capped at config.PROFILE_MAX_SECONDS.
+    """
+    argument = (argument or str(PROFILE_DEFAULT_UPDATES)).lower()
+    if argument.endswith('s'):
+        updates, seconds = None, float(argument[:-1])
+        # float() also accepts "nan" and "inf", which would never end the profile
+        if not math.isfinite(seconds) or seconds <= 0:
+            raise ValueError(f"Invalid profile duration: {argument}")
+    else:
+        updates, seconds = int(argument), PROFILE_DEFAULT_SECONDS
+        if updates <= 0:
+            raise ValueError(f"Invalid number of updates to profile: {argument}")
+    return updates, min(max(seconds, 1), config.PROFILE_MAX_SECONDS)
+
+async def profile_command(update: Update, context: Context) -> None:
+    """Handle /profile [updates | <seconds>s] from the admin chat: profile the bot and report the top functions."""
+    profiler = context.bot_data['profiler']
+    if profiler.running:
+        await update.message.reply_text("A profile is already running.")
+        return
+    
+    try:
+        updates, seconds = parse_profile_argument(context.args[0] if context.args else None)
+    except ValueError:
+        await update.message.reply_text("Usage: /profile [updates | <seconds>s], e.g. /profile 200 or /profile 30s")
+        return
+    
+    profiler.start(context.application, update.effective_chat.id, updates, seconds)
+    if updates is None:
+        await update.message.reply_text(f"Profiling for {seconds:g}s.")
+    else:
+        await update.message.reply_text(f"Profiling the next {updates} updates (at most {seconds:g}s).")
+
+async def setfret(update: Update, context: Context) -> int:
     """Handle /setfret command to change the maximum fret."""
     # Create vertical keyboard layout with inline buttons
     keyboard = [
@@ -191,15 +504,31 @@ async def setfret(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     )
     return SELECTING_FRET
 
-async def settings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    """Display settings menu for orientation and mode selection."""
+async def settings(update: Update, context: Context) -> None:
+    """Display settings menu for orientation, mode, response mode, tuning, timer and diagram selection."""
+    # Two tunings per row
+    tunings = list(config.TUNING_NAMES.items())
+    tuning_rows = [
+        [InlineKeyboardButton(f"Tuning: {label}", callback_data=f"tuning_{name}") for name, label in tunings[i:i + 2]]
+        for i in range(0, len(tunings), 2)
+    ]
     keyboard = [
         [InlineKeyboardButton("Orientation: Vertical", callback_data="orientation_vertical"),
          InlineKeyboardButton("Orientation: Horizontal", callback_data="orientation_horizontal")],
         [InlineKeyboardButton("Mode: Show Notes", callback_data="mode_show"),
          InlineKeyboardButton("Mode: Hide Notes", callback_data="mode_hide")],
-        [InlineKeyboardButton("Back to Main Menu", callback_data="menu_main")]
+        [InlineKeyboardButton("Replies: One Message", callback_data="replies_combined"),
+         InlineKeyboardButton("Replies: Edit Question", callback_data="replies_edit"),
+         InlineKeyboardButton("Replies: Separate", callback_data="replies_separate")],
+        *tuning_rows,
     ]
+    keyboard.append([InlineKeyboardButton("Timer: Off", callback_data="timer_0")] + [
+        InlineKeyboardButton(f"Timer: {seconds}s", callback_data=f"timer_{seconds}") for seconds in config.DRILL_DEADLINES
+    ])
+    if fretboard_image.AVAILABLE:
+        keyboard.append([InlineKeyboardButton("Diagram: Text", callback_data="render_text"),
+                         InlineKeyboardButton("Diagram: Image", callback_data="render_image")])
+    keyboard.append([InlineKeyboardButton("Back to Main Menu", callback_data="menu_main")])
     reply_markup = InlineKeyboardMarkup(keyboard)
     
     # Check if the update is from a command or a callback query
@@ -214,24 +543,37 @@ async def settings(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             reply_markup=reply_markup
         )
 
-async def settings_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+@metrics.timed("settings_handler")
+async def settings_handler(update: Update, context: Context) -> int:
     """Handle settings selection."""
     query = update.callback_query
     await query.answer()
+    session = context.user_data
     
     # Update user settings based on selection
-    if query.data.startswith("orientation_"):
-        context.user_data['orientation'] = query.data.split('_')[1]
-        await query.message.edit_text(
-            f"Settings updated: Orientation - {context.user_data.get('orientation', 'vertical')}, "
-            f"Mode - {context.user_data.get('mode', 'show')}"
-        )
-        return MAIN_MENU
-    elif query.data.startswith("mode_"):
-        context.user_data['mode'] = query.data.split('_')[1]
+    if query.data.startswith(("orientation_", "mode_", "replies_", "tuning_", "timer_", "render_")):
+        if query.data.startswith("orientation_"):
+            session.orientation = query.data.split('_')[1]
+        elif query.data.startswith("mode_"):
+            session.mode = query.data.split('_')[1]
+        elif query.data.startswith("replies_"):
+            session.response_mode = query.data.split('_')[1]
+        elif query.data.startswith("timer_"):
+            seconds = int(query.data.split('_')[1])
+            if seconds == 0 or seconds in config.DRILL_DEADLINES:
+                session.drill_seconds = seconds
+        elif query.data.startswith("render_"):
+            if fretboard_image.AVAILABLE:
+                session.render = query.data.split('_')[1]
+        elif query.data.split('_')[1] in config.TUNINGS:
+            session.tuning = query.data.split('_')[1]
         await query.message.edit_text(
-            f"Settings updated: Orientation - {context.user_data.get('orientation', 'vertical')}, "
-            f"Mode - {context.user_data.get('mode', 'show')}"
+            f"Settings updated: Orientation - {session.orientation}, "
+            f"Mode - {session.mode}, "
+            f"Replies - {session.response_mode}, "
+            f"Tuning - {config.TUNING_NAMES[session.tuning]}, "
+            f"Timer - {f'{session.drill_seconds}s' if session.drill_seconds else 'off'}, "
+            f"Diagram - {session.render}"
         )
         return MAIN_MENU
     elif query.data == "menu_main":
@@ -249,8 +591,11 @@ async def settings_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -
         )
         return MAIN_MENU
 
-async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+async def main_menu(update: Update, context: Context) -> int:
     """Display the main menu with options to start, access settings, or quit."""
+    # /start may leave a timed drill
+    if context.user_data is not None:
+        stop_question_timer(context, context.user_data)
     keyboard = [
         [InlineKeyboardButton("Start", callback_data="menu_start")],
         [InlineKeyboardButton("Settings", callback_data="menu_settings")],
@@ -270,7 +615,8 @@ async def main_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         )
     return MAIN_MENU
 
-async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+@metrics.timed("menu_handler")
+async def menu_handler(update: Update, context: Context) -> int:
     """Handle main menu selection."""
     query = update.callback_query
     await query.answer()
@@ -295,23 +641,20 @@ async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         await query.message.edit_text("Goodbye! 👋")
         return ConversationHandler.END
 
-async def game_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+@metrics.timed("game_handler")
+async def game_handler(update: Update, context: Context) -> int:
     """Handle game-related callbacks."""
     query = update.callback_query
     await query.answer()
     
     if query.data == "game_end":
         # Get statistics
-        stats = context.user_data.get('stats', {
-            'correct_answers': 0,
-            'wrong_answers': 0,
-            'total_questions': 0,
-            'questions_with_hints': 0
-        })
+        session = context.user_data
+        stop_question_timer(context, session)
         
         # Calculate accuracy
-        total_questions = stats['total_questions']
-        correct_answers = stats['correct_answers']
+        total_questions = session.total_questions
+        correct_answers = session.correct_answers
         accuracy = (correct_answers / total_questions * 100) if total_questions > 0 else 0
         
         # Create statistics message
@@ -319,8 +662,14 @@ async def game_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
             "📊 Session Statistics:\n\n"
             f"Total Questions: {total_questions}\n"
             f"Correct Answers: {correct_answers}\n"
-            f"Wrong Answers: {stats['wrong_answers']}\n"
-            f"Questions with Hints: {stats['questions_with_hints']}\n"
+            f"Wrong Answers: {session.wrong_answers}\n"
+            f"Questions with Hints: {session.questions_with_hints}\n"
+        )
+        if session.timed_out:
+            stats_message += f"Timed Out: {session.timed_out}\n"
+        if session.responses:
+            stats_message += f"Average Answer Time: {session.response_seconds / session.responses:.1f}s\n"
+        stats_message += (
             f"Accuracy: {accuracy:.1f}%\n\n"
             "Training session ended. Back to main menu:"
         )
@@ -333,18 +682,101 @@ async def game_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
         
-        await query.message.edit_text(
-            stats_message,
-            reply_markup=reply_markup
-        )
+        if query.message.photo:
+            # An image question can't be edited into a text message
+            await query.message.reply_text(stats_message, reply_markup=reply_markup)
+        else:
+            await query.message.edit_text(
+                stats_message,
+                reply_markup=reply_markup
+            )
         return MAIN_MENU
     
     return PLAYING_GAME
 
-def main() -> None:
-    """Start the bot."""
-    # Create the Application
-    application = Application.builder().token(config.TELEGRAM_BOT_TOKEN).build()
+def build_application(worker: Optional[int] = None) -> Application:
+    """Create the Application and register all handlers.
+
+    worker is the index of this process when the bot runs as config.WORKERS sharded workers.
+    """
+    evictor = SessionEvictor(config.SESSION_IDLE_TTL, config.SESSION_MAX_ACTIVE, config.SESSION_SWEEP_INTERVAL)
+    # One clock for the deadlines of all timed drills
+    drill_clock = DrillClock(config.DRILL_TICK)
+    # Background services started once the Application is initialized, stopped in reverse order
+    services = [evictor, drill_clock]
+    analytics = None
+    if config.ANALYTICS_ENABLED:
+        from analytics import Analytics
+        # Sharded workers keep separate aggregates, each over its own chats, and read
+        # each other's snapshots for /stats
+        path = config.ANALYTICS_PATH if worker is None else f"{config.ANALYTICS_PATH}-{worker}"
+        peers = [] if worker is None else [
+            f"{config.ANALYTICS_PATH}-{other}" for other in range(config.WORKERS) if other != worker
+        ]
+        analytics = Analytics(path, config.ANALYTICS_FLUSH_INTERVAL, peers)
+        services.append(analytics)
+    if config.METRICS_ENABLED:
+        # Metrics and queue stats are served on an internal port, apart from the public
+        # webhook; sharded workers each serve their own
+        import webserver
+        port = config.METRICS_PORT if worker is None else config.WORKER_METRICS_PORT + worker
+        services.append(webserver.BackgroundWebServer(port))
+
+    async def post_init(application: Application) -> None:
+        """Start the background services."""
+        for service in services:
+            await service.start(application)
+
+    async def post_stop(application: Application) -> None:
+        """Stop the background services."""
+        for service in reversed(services):
+            await service.stop(application)
+
+    builder = (
+        Application.builder()
+        .token(config.TELEGRAM_BOT_TOKEN)
+        .context_types(ContextTypes(user_data=Session))
+        .post_init(post_init)
+        .post_stop(post_stop)
+    )
+    if config.TELEGRAM_BASE_URL:
+        builder = builder.base_url(config.TELEGRAM_BASE_URL)
+    if config.BOT_MODE == 'webhook':
+        # Updates arrive through our own HTTP server instead of the Updater, so
+        # getUpdates needs no HTTP client (each one loads the CA certificates)
+        import webserver
+        builder = builder.updater(None).get_updates_request(webserver.NoPollingRequest())
+    elif config.METRICS_ENABLED:
+        builder = builder.get_updates_request(metrics.InstrumentedRequest())
+    if config.METRICS_ENABLED:
+        # Count and time every Bot API call (same pool size as the builder's default)
+        builder = builder.request(metrics.InstrumentedRequest(connection_pool_size=256))
+    if config.CONCURRENT_UPDATES > 1:
+        builder = builder.concurrent_updates(PerChatUpdateProcessor(config.CONCURRENT_UPDATES))
+    if config.OUTBOUND_RATE_LIMIT:
+        # Workers split the bot's global rate; each chat is served by one worker only
+        workers = config.WORKERS if worker is not None else 1
+        builder = builder.rate_limiter(PriorityRateLimiter(
+            global_rate=config.OUTBOUND_GLOBAL_RATE / workers,
+            chat_rate=config.OUTBOUND_CHAT_RATE,
+            chat_burst=config.OUTBOUND_CHAT_BURST,
+            max_retries=config.OUTBOUND_MAX_RETRIES
+        ))
+    bot_persistence = create_persistence()
+    if bot_persistence is not None:
+        builder = builder.persistence(bot_persistence)
+    application = builder.build()
+
+    if config.METRICS_ENABLED:
+        metrics.REGISTRY.register(metrics.Gauge(
+            'fretbuddy_active_sessions', 'User sessions held in memory.', lambda: len(application.user_data)
+        ))
+        rate_limiter = application.bot.rate_limiter
+        if rate_limiter is not None:
+            metrics.REGISTRY.register(metrics.Gauge(
+                'fretbuddy_outbound_queue_depth', 'Bot API requests waiting in the outbound queue.',
+                lambda: rate_limiter.pending
+            ))
 
     # Add conversation handler
     conv_handler = ConversationHandler(
@@ -354,7 +786,7 @@ def main() -> None:
         states={
             MAIN_MENU: [
                 CallbackQueryHandler(menu_handler, pattern=r"^menu_"),
-                CallbackQueryHandler(settings_handler, pattern=r"^(orientation|mode)_")
+                CallbackQueryHandler(settings_handler, pattern=r"^(orientation|mode|replies|tuning|timer|render)_")
             ],
             SELECTING_FRET: [
                 CallbackQueryHandler(button_handler, pattern=r"^fret_\d+$")
@@ -369,14 +801,55 @@ def main() -> None:
         },
         fallbacks=[
             CommandHandler("start", main_menu)
-        ]
+        ],
+        name="fretbuddy",
+        persistent=bot_persistence is not None
     )
 
+    # Runs before all other handlers for every update
+    application.add_handler(TypeHandler(Update, touch_session), group=-1)
     application.add_handler(conv_handler)
+    application.add_handler(TypeHandler(DrillTimeout, drill_timeout))
+    application.bot_data['drill_clock'] = drill_clock
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    if config.INLINE_ENABLED:
+        application.add_handler(InlineQueryHandler(inline_query))
+    if analytics is not None:
+        application.bot_data['analytics'] = analytics
+    if config.ADMIN_CHAT_ID is not None:
+        # Imported lazily; without an admin chat nothing profiling-related is registered
+        from profiling import UpdateProfiler
+        application.bot_data['profiler'] = UpdateProfiler()
+        application.add_handler(CommandHandler(
+            "profile", profile_command, filters=filters.Chat(chat_id=config.ADMIN_CHAT_ID)
+        ))
+
+    # Map the question templates built with the image; without them, build them before
+    # the first user asks for one (or, with FAST_START, when they do)
+    if not render_artifact.install(config.RENDER_ARTIFACT) and not config.FAST_START:
+        fretboard.warm_render_cache()
+
+    return application
+
+def main() -> None:
+    """Start the bot."""
+    if config.BOT_MODE == 'webhook' and config.WORKERS > 1:
+        # The worker processes build their own Applications
+        import webserver
+        asyncio.run(webserver.serve_sharded(config.WORKERS))
+        return
+
+    # Create the Application
+    application = build_application()
 
     # Start the Bot
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if config.BOT_MODE == 'webhook':
+        # Imported lazily: a polling deployment only needs the web stack when it serves metrics
+        import webserver
+        asyncio.run(webserver.serve_webhook(application))
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
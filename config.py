@@ -6,6 +6,80 @@ load_dotenv()
 
 # Bot Configuration
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
+# Bot API endpoint, e.g. http://127.0.0.1:8081/bot for the fake API in loadtest/; defaults to Telegram
+TELEGRAM_BASE_URL = os.getenv('TELEGRAM_BASE_URL')
+
+# Serving Configuration
+BOT_MODE = os.getenv('BOT_MODE', 'polling')  # 'polling' or 'webhook'
+PORT = int(os.getenv('PORT', '8080'))  # Matches internal_port in fly.toml
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+# Public base URL registered with Telegram; defaults to the Fly.io app hostname
+WEBHOOK_URL = os.getenv('WEBHOOK_URL') or (
+    f"https://{os.getenv('FLY_APP_NAME')}.fly.dev" if os.getenv('FLY_APP_NAME') else None
+)
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')  # Generated at startup if unset and WEBHOOK_URL is set
+# Serve Prometheus metrics at /metrics, with /outbound and /healthz, on METRICS_PORT (in polling mode too)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+# Internal port, not published like PORT; fly.toml's [metrics] section scrapes it
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9091'))
+# Webhook mode only: bot processes behind the webhook front, each owning the users with
+# user_id % WORKERS == its index; they share the persistence store
+WORKERS = int(os.getenv('WORKERS', '1'))
+WORKER_METRICS_PORT = int(os.getenv('WORKER_METRICS_PORT', '9100'))  # Worker i serves /metrics on this port + i
+# Chat allowed to run admin commands such as /profile; they aren't registered if unset
+ADMIN_CHAT_ID = int(os.getenv('ADMIN_CHAT_ID')) if os.getenv('ADMIN_CHAT_ID') else None
+PROFILE_MAX_SECONDS = float(os.getenv('PROFILE_MAX_SECONDS', '300'))  # Longest /profile window
+# Updates processed in parallel across chats (each chat stays in order); 1 disables concurrency
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '64'))
+
+# Outbound Queue Configuration (rates in messages per second)
+OUTBOUND_RATE_LIMIT = os.getenv('OUTBOUND_RATE_LIMIT', '1') == '1'  # Throttle sends to stay under flood limits
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '30'))
+OUTBOUND_CHAT_RATE = float(os.getenv('OUTBOUND_CHAT_RATE', '1'))
+OUTBOUND_CHAT_BURST = float(os.getenv('OUTBOUND_CHAT_BURST', '3'))  # Messages a chat may receive back to back
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', '3'))  # Retries after a RetryAfter error
+
+# Persistence Configuration
+PERSISTENCE_BACKEND = os.getenv('PERSISTENCE_BACKEND', 'sqlite')  # 'sqlite' or 'none'
+PERSISTENCE_PATH = os.getenv('PERSISTENCE_PATH', 'fretbuddy.sqlite3')
+PERSISTENCE_FLUSH_INTERVAL = float(os.getenv('PERSISTENCE_FLUSH_INTERVAL', '30'))  # Seconds between batched writes
+
+# Analytics Configuration
+ANALYTICS_ENABLED = os.getenv('ANALYTICS_ENABLED', '1') == '1'  # Aggregate answers across users for /stats
+# Files ANALYTICS_PATH.log (append-only event log) and ANALYTICS_PATH.json (aggregates snapshot)
+ANALYTICS_PATH = os.getenv('ANALYTICS_PATH', 'analytics')
+ANALYTICS_FLUSH_INTERVAL = float(os.getenv('ANALYTICS_FLUSH_INTERVAL', '60'))  # Seconds between writes
+
+# Session Configuration
+SESSION_IDLE_TTL = float(os.getenv('SESSION_IDLE_TTL', '21600'))  # Seconds before an idle session is evicted
+SESSION_MAX_ACTIVE = int(os.getenv('SESSION_MAX_ACTIVE', '200000'))  # Least recently used sessions over this are evicted
+SESSION_SWEEP_INTERVAL = float(os.getenv('SESSION_SWEEP_INTERVAL', '60'))  # Seconds between eviction sweeps
+# How answer feedback and the next question are sent: 'combined' (one message),
+# 'edit' (edit the previous question in place) or 'separate' (two messages)
+DEFAULT_RESPONSE_MODE = os.getenv('DEFAULT_RESPONSE_MODE', 'combined')
+# How questions are drawn: 'text' (monospace diagram) or 'image' (PNG, requires Pillow)
+DEFAULT_RENDER = os.getenv('DEFAULT_RENDER', 'text')
+
+# Question Scheduling Configuration
+# Ask more often about positions a user misses or answers slowly; 0 picks positions uniformly
+ADAPTIVE_QUESTIONS = os.getenv('ADAPTIVE_QUESTIONS', '1') == '1'
+SCHEDULER_SLOW_ANSWER = float(os.getenv('SCHEDULER_SLOW_ANSWER', '8'))  # Seconds after which a correct answer counts as slow
+# Seed for the per-user question generators, for reproducible question sequences; random if unset
+QUESTION_SEED = int(os.getenv('QUESTION_SEED')) if os.getenv('QUESTION_SEED') else None
+
+# Timed Drill Configuration
+DRILL_DEADLINES = [5, 10, 20]  # Seconds per question users can choose in the settings
+DEFAULT_DRILL_SECONDS = int(os.getenv('DEFAULT_DRILL_SECONDS', '0'))  # 0 means no time limit
+DRILL_TICK = float(os.getenv('DRILL_TICK', '0.25'))  # Resolution of question deadlines in seconds
+DRILL_MAX_MISSED = int(os.getenv('DRILL_MAX_MISSED', '3'))  # Expired questions in a row before the clock pauses
+
+# Inline Mode Configuration (inline mode must also be enabled with @BotFather's /setinline)
+INLINE_ENABLED = os.getenv('INLINE_ENABLED', '1') == '1'
+INLINE_RESULTS = int(os.getenv('INLINE_RESULTS', '10'))  # Questions per result set (Telegram allows up to 50)
+INLINE_DEFAULT_FRET = int(os.getenv('INLINE_DEFAULT_FRET', '5'))  # Max fret when the query names none
+# Seconds Telegram caches the answer to a query and serves it to everyone sending the same text
+INLINE_CACHE_TIME = int(os.getenv('INLINE_CACHE_TIME', '3600'))
 
 # Guitar Configuration
 STRINGS = {
@@ -17,6 +91,28 @@ STRINGS = {
     6: "E"   # lowest string
 }
 
+# Tunings users can choose in the settings: open note of every string, from the
+# highest (1) to the lowest
+TUNINGS = {
+    'standard': STRINGS,
+    'dropd': {1: "E", 2: "B", 3: "G", 4: "D", 5: "A", 6: "D"},
+    'dadgad': {1: "D", 2: "A", 3: "G", 4: "D", 5: "A", 6: "D"},
+    'seven': {1: "E", 2: "B", 3: "G", 4: "D", 5: "A", 6: "E", 7: "B"},
+    'bass4': {1: "G", 2: "D", 3: "A", 4: "E"},
+    'bass5': {1: "G", 2: "D", 3: "A", 4: "E", 5: "B"},
+    'ukulele': {1: "A", 2: "E", 3: "C", 4: "G"},
+}
+TUNING_NAMES = {
+    'standard': "Standard (EADGBE)",
+    'dropd': "Drop D (DADGBE)",
+    'dadgad': "DADGAD",
+    'seven': "7-string (BEADGBE)",
+    'bass4': "Bass (EADG)",
+    'bass5': "5-string bass (BEADG)",
+    'ukulele': "Ukulele (GCEA)",
+}
+DEFAULT_TUNING = os.getenv('DEFAULT_TUNING', 'standard')
+
 NOTES = ["A", "A#", "B", "C", "C#", "D", "D#", "E", "F", "F#", "G", "G#"]
 FRET_OPTIONS = [3, 5, 7, 9, 12]
 
@@ -24,4 +120,12 @@ FRET_OPTIONS = [3, 5, 7, 9, 12]
 FRET_SYMBOL = "|"
 QUESTION_MARK = "❓"  # Using emoji for better visibility
 OPEN_STRING = " ◯ "    # Circle symbol for open string
-NOTE_SPACING = 2     # Number of spaces for note alignment 
\ No newline at end of file
+NOTE_SPACING = 2     # Number of spaces for note alignment 
+
+# Performance Configuration
+RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', '256'))  # Max cached question templates (LRU)
+# Question templates rendered at image build time (python -m render_artifact) and memory-mapped at startup
+RENDER_ARTIFACT = os.getenv('RENDER_ARTIFACT', 'render_templates.bin')
+# Cold start: in webhook mode, accept updates while still connecting to Telegram, and
+# without an artifact render question templates on first use instead of at startup
+FAST_START = os.getenv('FAST_START', '0') == '1'
@@ -0,0 +1,156 @@
+import asyncio
+import math
+from typing import Any, List, Optional
+
+from telegram.ext import Application
+
+# Every wheel level has 2**SLOT_BITS slots; level n slots span 2**(SLOT_BITS * n) ticks
+SLOT_BITS = 6
+SLOTS = 1 << SLOT_BITS
+SLOT_MASK = SLOTS - 1
+
+class Timer:
+    """A pending timeout in a TimerWheel; cancel() it to drop it."""
+
+    __slots__ = ('expires', 'payload', 'active')
+
+    def __init__(self, expires: int, payload: Any) -> None:
+        """Create a timer that fires at the given tick."""
+        self.expires = expires
+        self.payload = payload
+        self.active = True
+
+class TimerWheel:
+    """Hierarchical timing wheel: O(1) to schedule or cancel a timer, amortized O(1) per tick.
+
+    Level 0 has one slot per tick for the next SLOTS ticks; each further level has
+    slots SLOTS times as wide. When level 0 wraps around, the timers of the next
+    slot one level up are spread over the level below ("cascaded"), so every timer
+    moves down at most levels - 1 times before it fires. Cancelled timers are only
+    marked and are dropped when their slot is reached.
+    """
+
+    def __init__(self, levels: int = 4) -> None:
+        """Create an empty wheel covering SLOTS ** levels ticks ahead."""
+        self.levels = levels
+        self.ticks = 0  # The last tick that was processed
+        self.pending = 0  # Active timers
+        self._wheels: List[List[List[Timer]]] = [[[] for _ in range(SLOTS)] for _ in range(levels)]
+
+    def schedule(self, expires: int, payload: Any) -> Timer:
+        """Add a timer firing at tick expires (the next tick if that has passed)."""
+        # Timers further out than the wheel reaches fire at its horizon
+        expires = min(max(expires, self.ticks + 1), self.ticks + (1 << (SLOT_BITS * self.levels)) - 1)
+        timer = Timer(expires, payload)
+        self._place(timer)
+        self.pending += 1
+        return timer
+
+    def cancel(self, timer: Timer) -> None:
+        """Cancel a timer that has not fired yet."""
+        if timer.active:
+            timer.active = False
+            self.pending -= 1
+
+    def _place(self, timer: Timer) -> None:
+        """Put a timer in the slot covering its expiry at the lowest level that reaches it."""
+        delta = timer.expires - self.ticks
+        if delta < SLOTS:
+            # Most timers: no level to search for
+            self._wheels[0][timer.expires & SLOT_MASK].append(timer)
+            return
+        level = 1
+        while delta >= 1 << (SLOT_BITS * (level + 1)) and level < self.levels - 1:
+            level += 1
+        self._wheels[level][(timer.expires >> (SLOT_BITS * level)) & SLOT_MASK].append(timer)
+
+    def advance(self, to: int) -> List[Any]:
+        """Process every tick up to and including to; return the payloads of the timers that fired."""
+        fired = []
+        while self.ticks < to:
+            self.ticks += 1
+            tick = self.ticks
+            # On a level 0 wrap, cascade the next slot of level 1 (and of level 2 if
+            # level 1 wrapped as well, and so on)
+            for level in range(1, self.levels if not tick & SLOT_MASK else 1):
+                if tick & ((1 << (SLOT_BITS * level)) - 1):
+                    break
+                index = (tick >> (SLOT_BITS * level)) & SLOT_MASK
+                slot, self._wheels[level][index] = self._wheels[level][index], []
+                for timer in slot:
+                    if timer.active:
+                        self._place(timer)
+
+            slot = self._wheels[0][tick & SLOT_MASK]
+            if not slot:
+                continue
+            self._wheels[0][tick & SLOT_MASK] = []
+            for timer in slot:
+                if timer.active:
+                    timer.active = False
+                    self.pending -= 1
+                    fired.append(timer.payload)
+        return fired
+
+class DrillTimeout:
+    """Custom update queued when a timed question expires.
+
+    It carries chat_id, so PerChatUpdateProcessor processes it in order with the
+    chat's other updates.
+    """
+
+    __slots__ = ('chat_id', 'user_id', 'missed')
+
+    def __init__(self, chat_id: int, user_id: int, missed: int = 0) -> None:
+        """Describe the timeout; missed counts the expired questions just before this one."""
+        self.chat_id = chat_id
+        self.user_id = user_id
+        self.missed = missed
+
+class DrillClock:
+    """Drives the deadlines of all timed drills with one TimerWheel and one task.
+
+    Every tick seconds, expired timers are turned into their DrillTimeout updates on
+    the Application's update queue, so the cost per tick does not depend on the
+    number of running drills.
+    """
+
+    def __init__(self, tick: float) -> None:
+        """Create the clock; call start() once the Application is running."""
+        self.tick = tick
+        self.wheel = TimerWheel()
+        self._origin: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _now(self) -> int:
+        """Return the current tick."""
+        loop = asyncio.get_running_loop()
+        if self._origin is None:
+            self._origin = loop.time()
+        return int((loop.time() - self._origin) / self.tick)
+
+    def schedule(self, seconds: float, timeout: DrillTimeout) -> Timer:
+        """Queue timeout as an update after the given number of seconds."""
+        # _now() rounds down, hence the extra tick: a deadline never ends early
+        return self.wheel.schedule(self._now() + math.ceil(seconds / self.tick) + 1, timeout)
+
+    def cancel(self, timer: Timer) -> None:
+        """Cancel a deadline that has not expired yet."""
+        self.wheel.cancel(timer)
+
+    async def start(self, application: Application) -> None:
+        """Start ticking in the background (usable as a post_init hook)."""
+        self._task = asyncio.create_task(self._run(application))
+
+    async def stop(self, application: Application) -> None:
+        """Stop ticking (usable as a post_stop hook); pending deadlines are dropped."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self, application: Application) -> None:
+        """Fire expired deadlines every tick until cancelled."""
+        while True:
+            await asyncio.sleep(self.tick)
+            for timeout in self.wheel.advance(self._now()):
+                await application.update_queue.put(timeout)
@@ -1,153 +1,337 @@
-from typing import Dict, List, Tuple
+from array import array
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Callable, Dict, Iterator, List, Mapping, NamedTuple, Optional, Sequence, Tuple
 import random
 import config
 
-def calculate_note_at_fret(open_note: str, fret_number: int) -> str:
-    """Calculate the note at a specific fret given the open note."""
-    start_index = config.NOTES.index(open_note)
-    return config.NOTES[(start_index + fret_number) % len(config.NOTES)]
+# Read-only mapping of string number to the notes from fret 0 up to max_fret
+Fretboard = Mapping[int, Tuple[str, ...]]
 
-def create_fretboard(max_fret: int) -> Dict[int, List[str]]:
-    """Create a complete fretboard mapping of all notes."""
+class QuestionTemplate(NamedTuple):
+    """Pre-rendered fretboard grid with the character span of every cell."""
+    text: str
+    marker: str  # Cell text that replaces the target cell
+    cells: Dict[Tuple[int, int], Tuple[int, int, str]]  # (string, fret) -> (start, end, note)
+
+# Pitch class (index into config.NOTES) of every note name
+NOTE_INDEX = {note: index for index, note in enumerate(config.NOTES)}
+
+def build_note_table(strings: Mapping[int, str]) -> array:
+    """Build a strings x 12 matrix of pitch classes for a tuning, one octave per string.
+
+    Row ``string_num - 1`` holds the pitch classes of frets 0-11; any higher fret
+    repeats the octave, so the table covers every fret in a few dozen bytes.
+    """
+    octave = len(config.NOTES)
+    table = array('B', bytes(len(strings) * octave))
+    for string_num, open_note in strings.items():
+        start_index = NOTE_INDEX[open_note]
+        row = (string_num - 1) * octave
+        for fret in range(octave):
+            table[row + fret] = (start_index + fret) % octave
+    return table
+
+# Pitch classes of every tuning, built once at import and shared by all users
+NOTE_TABLES = {name: build_note_table(strings) for name, strings in config.TUNINGS.items()}
+
+def pitch_class_at(string_num: int, fret_number: int, tuning: str = 'standard') -> int:
+    """Look up the pitch class at a fret of a tuning."""
+    octave = len(config.NOTES)
+    return NOTE_TABLES[tuning][(string_num - 1) * octave + fret_number % octave]
+
+def create_fretboard(max_fret: int, tuning: str = 'standard') -> Fretboard:
+    """Create a complete fretboard mapping of all notes.
+
+    The result is cached and shared between callers (one object per fret range and
+    tuning), so it is returned as a read-only mapping of tuples.
+    """
+    # Always pass every argument positionally, so equivalent calls share one cache entry
+    return _build_fretboard(max_fret, tuning)
+
+@lru_cache(maxsize=config.RENDER_CACHE_SIZE)
+def _build_fretboard(max_fret: int, tuning: str) -> Fretboard:
+    """Build the fretboard of a fret range and tuning; use create_fretboard()."""
     fretboard = {}
-    for string_num, open_note in config.STRINGS.items():
-        string_notes = []
-        for fret in range(max_fret + 1):  # +1 to include open string (fret 0)
-            note = calculate_note_at_fret(open_note, fret)
-            string_notes.append(note)
-        fretboard[string_num] = string_notes
-    return fretboard
-
-def visualize_string_horizontal(string_num: int, notes: List[str], target_fret: int = None) -> str:
+    for string_num in config.TUNINGS[tuning]:
+        # +1 to include open string (fret 0)
+        fretboard[string_num] = tuple(
+            config.NOTES[pitch_class_at(string_num, fret, tuning)] for fret in range(max_fret + 1)
+        )
+    return MappingProxyType(fretboard)
+
+def _string_name(fretboard: Fretboard, string_num: int) -> str:
+    """Return the display name of a string (its open note), lowercase for a first string that shares its name."""
+    name = fretboard[string_num][0]
+    if string_num == 1 and any(fretboard[other][0] == name for other in fretboard if other != 1):
+        return name.lower()
+    return name
+
+def _horizontal_cell(note: str, fret: int, is_target: bool = False) -> str:
+    """Render one horizontal fret cell, including its trailing separator."""
+    if is_target:
+        # Add emphasis around the question mark
+        return f" {config.QUESTION_MARK} |"
+    elif fret == 0:
+        return "  0  |"
+    # For hidden notes (shown as "---"), don't add extra space
+    elif note == "---":
+        return " --- |"
+    # Align other notes, adding extra space for non-sharp notes
+    note = note + " " if len(note) == 1 else note
+    return f" {note} |"
+
+def _vertical_cell(note: str, fret: int, mode: str, is_target: bool = False) -> str:
+    """Render one vertical fret cell (always 5 chars wide), including its trailing separator."""
+    # Handle target note
+    if is_target:
+        return f"  {config.QUESTION_MARK}  |"
+    # Handle open strings
+    elif fret == 0:
+        return "  0  |"
+    # Handle hidden notes
+    elif mode == 'hide':
+        return " --- |"
+    # Adjust padding based on note length (1 or 2 characters)
+    elif len(note) == 1:
+        return f"  {note}  |"  # 2 spaces on each side for single char
+    return f" {note} |"   # 1 space before, 2 after for sharp notes
+
+def _vertical_header(fretboard: Fretboard) -> List[str]:
+    """Create the string-name header and separator of the vertical fretboard."""
+    # Create header with string names - each cell is exactly 5 chars wide
+    header = "    |"  # 4 spaces for fret numbers
+    for string_num in range(len(fretboard), 0, -1):  # Reverse order for strings
+        name = _string_name(fretboard, string_num)
+        # Single character notes get 2 spaces on each side
+        header += f"  {name}  |" if len(name) == 1 else f" {name} |"
+
+    # Create separator line matching header exactly
+    separator = "--+" + "---+" * len(fretboard)  # 4 dashes + 5 dashes per column
+    return [header, separator]
+
+def _vertical_row_prefix(fret: int) -> str:
+    """Create the fret number column of a vertical fretboard row."""
+    # Add padding for single-digit fret numbers to maintain 4 char width
+    fret_padding = " " if fret < 10 else ""
+    return f"{fret}{fret_padding} |"
+
+def _horizontal_header(max_fret: int) -> List[str]:
+    """Create the fret-number header and separator of the horizontal fretboard."""
+    # Add fret numbers at the top with separator
+    fret_numbers = "   "  # Space for string name
+    separator = "-+"
+    for fret in range(max_fret + 1):
+        fret_padding = "  " if fret < 10 else " "
+        fret_numbers += f"|{fret_padding}{fret}  "
+        separator += "---+"
+    fret_numbers += "|"
+    return [fret_numbers, separator]
+
+def visualize_string_horizontal(string_num: int, notes: Sequence[str], target_fret: int = None, name: str = None) -> str:
     """Visualize a single string horizontally with optional target fret marked with '?'."""
-    # Use lowercase 'e' for the first string
-    string_name = 'e' if string_num == 1 else config.STRINGS[string_num]
+    if name is None:
+        # Name the string as in standard tuning
+        name = _string_name(create_fretboard(0), string_num)
     # Start with string name and open string note, marked with circle symbol
-    result = f"{string_name} |"
-    
+    result = f"{name:<2}|"
+
     # Handle each fret, including open string (fret 0)
     for fret in range(len(notes)):
-        if fret == target_fret:
-            # Add emphasis around the question mark
-            result += f" {config.QUESTION_MARK} |"
-        elif fret == 0:
-            result += f"  0  |"
-        else:
-            # For hidden notes (shown as "---"), don't add extra space
-            if notes[fret] == "---":
-                result += f" --- |"
-            else:
-                # Align other notes, adding extra space for non-sharp notes
-                note = notes[fret] + " " if len(notes[fret]) == 1 else notes[fret]
-                result += f" {note} |"
+        result += _horizontal_cell(notes[fret], fret, fret == target_fret)
     return result
 
-def create_vertical_fretboard(fretboard: Dict[int, List[str]], max_fret: int, target_string: int = None, target_fret: int = None, mode: str = 'show') -> List[str]:
+def create_vertical_fretboard(fretboard: Fretboard, max_fret: int, target_string: int = None, target_fret: int = None, mode: str = 'show') -> List[str]:
     """Create a vertical representation of the fretboard."""
-    # Create header with string names - each cell is exactly 5 chars wide
-    header = "    |"  # 4 spaces for fret numbers
-    for string_num in range(6, 0, -1):  # Reverse order for strings
-        string_name = 'e' if string_num == 1 else config.STRINGS[string_num]
-        # Single character notes get 2 spaces on each side
-        header += f"  {string_name}  |"  # 2 spaces + note + 2 spaces = 5 chars
-    
-    # Create separator line matching header exactly
-    separator = "--+" + "---+" * 6  # 4 dashes + 5 dashes per column
-    
     # Create fret rows
     rows = []
     for fret in range(max_fret + 1):
-        # Add padding for single-digit fret numbers to maintain 4 char width
-        fret_padding = " " if fret < 10 else ""
-        row = f"{fret}{fret_padding} |"
-        
-        for string_num in range(6, 0, -1):  # Reverse order for strings
-            note = fretboard[string_num][fret]
-            
-            # Handle target note - maintain 5 char width
-            if fret == target_fret and string_num == target_string:
-                row += f"  {config.QUESTION_MARK}  |"
-            # Handle open strings - maintain 5 char width
-            elif fret == 0:
-                row += f"  0  |"
-            # Handle hidden notes - maintain 5 char width
-            elif mode == 'hide' and (fret != target_fret or string_num != target_string):
-                row += f" --- |"
-            # Handle regular notes - maintain 5 char width
-            else:
-                # Adjust padding based on note length (1 or 2 characters)
-                if len(note) == 1:
-                    row += f"  {note}  |"  # 2 spaces on each side for single char
-                else:
-                    row += f" {note} |"   # 1 space before, 2 after for sharp notes
+        row = _vertical_row_prefix(fret)
+        for string_num in range(len(fretboard), 0, -1):  # Reverse order for strings
+            is_target = fret == target_fret and string_num == target_string
+            row += _vertical_cell(fretboard[string_num][fret], fret, mode, is_target)
         rows.append(row)
-    
+
     # Combine all parts
-    return [header, separator] + rows
-
-def create_question(max_fret: int, orientation: str = 'vertical', mode: str = 'show') -> Tuple[str, int, int, str]:
-    """Create a random question for note guessing."""
-    # Generate complete fretboard
-    fretboard = create_fretboard(max_fret)
-    
-    # Select random string and fret
-    string_num = random.randint(1, 6)
-    fret_num = random.randint(0, max_fret)  # Now includes 0 for open strings
-    
-    # Get correct answer
-    correct_note = fretboard[string_num][fret_num]
-    
+    return _vertical_header(fretboard) + rows
+
+def create_horizontal_fretboard(fretboard: Fretboard, max_fret: int, target_string: int = None, target_fret: int = None, mode: str = 'show') -> List[str]:
+    """Create a horizontal representation of the fretboard."""
+    visual = _horizontal_header(max_fret)
+
+    # Add string rows
+    for string in range(1, len(fretboard) + 1):
+        string_notes = fretboard[string][:max_fret + 1]
+        target = target_fret if string == target_string else None
+
+        if mode == 'hide':
+            string_notes = [
+                note if i == target else "---"
+                for i, note in enumerate(string_notes)
+            ]
+
+        visual.append(visualize_string_horizontal(string, string_notes, target, _string_name(fretboard, string)))
+    return visual
+
+def render_question(fretboard: Fretboard, max_fret: int, string_num: int, fret_num: int, orientation: str = 'vertical', mode: str = 'show') -> str:
+    """Render a question diagram from scratch, without using the template cache."""
     if orientation == 'vertical':
-        # Use vertical visualization
-        visual = create_vertical_fretboard(
-            fretboard,
-            max_fret,
-            target_string=string_num,
-            target_fret=fret_num,
-            mode=mode
-        )
-        return ("\n".join(visual), string_num, fret_num, correct_note)
+        visual = create_vertical_fretboard(fretboard, max_fret, string_num, fret_num, mode)
     else:
-        # Create horizontal visualization
-        visual = []
-        
-        # Add fret numbers at the top with separator
-        fret_numbers = "   "  # Space for string name
-        separator = "-+"
+        visual = create_horizontal_fretboard(fretboard, max_fret, string_num, fret_num, mode)
+    return "\n".join(visual)
+
+# Key of a question template: (max_fret, orientation, mode, tuning)
+TemplateKey = Tuple[int, str, str, str]
+
+# Where templates come from before they are rendered, e.g. a precomputed artifact (see render_artifact.py)
+_template_source: Optional[Callable[[TemplateKey], Optional[QuestionTemplate]]] = None
+
+def use_template_source(source: Optional[Callable[[TemplateKey], Optional[QuestionTemplate]]]) -> None:
+    """Look templates up in source first; templates it doesn't have are still rendered."""
+    global _template_source
+    _template_source = source
+    _build_question_template.cache_clear()
+
+def get_question_template(max_fret: int, orientation: str = 'vertical', mode: str = 'show', tuning: str = 'standard') -> QuestionTemplate:
+    """Build (once) the unmarked fretboard grid and the offsets of all its cells."""
+    # Like create_fretboard, fill in the defaults so equivalent calls share one cache entry
+    return _build_question_template(max_fret, orientation, mode, tuning)
+
+@lru_cache(maxsize=config.RENDER_CACHE_SIZE)
+def _build_question_template(max_fret: int, orientation: str, mode: str, tuning: str) -> QuestionTemplate:
+    """Build the template of a key; use get_question_template()."""
+    if _template_source is not None:
+        template = _template_source((max_fret, orientation, mode, tuning))
+        if template is not None:
+            return template
+
+    fretboard = create_fretboard(max_fret, tuning)
+    cells = {}
+
+    if orientation == 'vertical':
+        lines = _vertical_header(fretboard)
+        # Cell offsets are absolute, so count the header and its newlines first
+        position = sum(len(line) + 1 for line in lines)
         for fret in range(max_fret + 1):
-            fret_padding = "  " if fret < 10 else " "
-            fret_numbers += f"|{fret_padding}{fret}  "
-            separator += "---+"
-        fret_numbers += "|"
-        
-        # Add fret numbers and separator to visual
-        visual.extend([fret_numbers, separator])
-        
-        # Add string rows
-        for string in range(1, 7):
-            string_notes = fretboard[string].copy()
-            target = fret_num if string == string_num else None
-            
-            if mode == 'hide':
-                for i in range(len(string_notes)):
-                    if target is None or i != target:
-                        string_notes[i] = "---"
-                        
-            visual.append(visualize_string_horizontal(string, string_notes, target))
-        
-        return ("\n".join(visual), string_num, fret_num, correct_note)
+            row = _vertical_row_prefix(fret)
+            for string_num in range(len(fretboard), 0, -1):
+                note = fretboard[string_num][fret]
+                cell = _vertical_cell(note, fret, mode)
+                start = position + len(row)
+                cells[(string_num, fret)] = (start, start + len(cell), note)
+                row += cell
+            lines.append(row)
+            position += len(row) + 1
+        marker = _vertical_cell("", 0, mode, is_target=True)
+    else:
+        lines = _horizontal_header(max_fret)
+        position = sum(len(line) + 1 for line in lines)
+        for string_num in range(1, len(fretboard) + 1):
+            row = f"{_string_name(fretboard, string_num):<2}|"
+            for fret in range(max_fret + 1):
+                note = fretboard[string_num][fret]
+                cell = _horizontal_cell("---" if mode == 'hide' else note, fret)
+                start = position + len(row)
+                cells[(string_num, fret)] = (start, start + len(cell), note)
+                row += cell
+            lines.append(row)
+            position += len(row) + 1
+        marker = _horizontal_cell("", 0, is_target=True)
+
+    return QuestionTemplate("\n".join(lines), marker, cells)
+
+def template_keys() -> Iterator[TemplateKey]:
+    """Yield the key of every template users can get: each fret option, orientation, mode and tuning."""
+    for tuning in config.TUNINGS:
+        for max_fret in config.FRET_OPTIONS:
+            for orientation in ('vertical', 'horizontal'):
+                for mode in ('show', 'hide'):
+                    yield (max_fret, orientation, mode, tuning)
+
+def warm_render_cache() -> None:
+    """Pre-build the templates for every fret option, orientation, mode and tuning."""
+    for key in template_keys():
+        get_question_template(*key)
+
+def question_diagram(max_fret: int, string_num: int, fret_num: int, orientation: str = 'vertical', mode: str = 'show', tuning: str = 'standard') -> str:
+    """Return the diagram with the question mark on the given string and fret."""
+    template = get_question_template(max_fret, orientation, mode, tuning)
+    # Splice the question mark into the cached grid
+    start, end, _ = template.cells[(string_num, fret_num)]
+    return "".join((template.text[:start], template.marker, template.text[end:]))
+
+def create_question(max_fret: int, orientation: str = 'vertical', mode: str = 'show', position: Tuple[int, int] = None, tuning: str = 'standard') -> Tuple[str, int, int, str]:
+    """Create a question for note guessing, at a random position unless one is given."""
+    template = get_question_template(max_fret, orientation, mode, tuning)
+
+    if position is not None:
+        string_num, fret_num = position
+    else:
+        # Select random string and fret
+        string_num = random.randint(1, len(config.TUNINGS[tuning]))
+        fret_num = random.randint(0, max_fret)  # Now includes 0 for open strings
+
+    # Splice the question mark into the cached grid and get correct answer
+    start, end, correct_note = template.cells[(string_num, fret_num)]
+    visual = "".join((template.text[:start], template.marker, template.text[end:]))
+    return (visual, string_num, fret_num, correct_note)
+
+# Solfège names of the natural notes (fixed do)
+NATURAL_NAMES = {
+    'c': ('do', 'ut'), 'd': ('re',), 'e': ('mi',), 'f': ('fa',),
+    'g': ('sol', 'so'), 'a': ('la',), 'b': ('si', 'ti'),
+}
+# Accidental spellings after normalization, with their offset in semitones
+ACCIDENTALS = {
+    '': 0,
+    '#': 1, 'sharp': 1,
+    'b': -1, 'flat': -1,
+    '##': 2, 'x': 2, 'doublesharp': 2,
+    'bb': -2, 'doubleflat': -2,
+}
+
+def build_note_aliases(notes: Sequence[str]) -> Dict[str, str]:
+    """Map every accepted spelling of a note to its name in notes.
+
+    Covers letter and solfège names with no, single and double sharps and flats, so
+    enharmonics such as Cb, Fb, E# and B## resolve to the same pitch class.
+    """
+    octave = len(notes)
+    aliases = {}
+    for letter, solfege in NATURAL_NAMES.items():
+        natural = notes.index(letter.upper())
+        for accidental, offset in ACCIDENTALS.items():
+            note = notes[(natural + offset) % octave]
+            for name in (letter, *solfege):
+                alias = name + accidental
+                # Also the common capitalizations, so typical answers need no normalization
+                for spelling in (alias, alias.capitalize(), alias.upper()):
+                    aliases.setdefault(spelling, note)
+    return aliases
+
+# Normalization: Unicode accidentals become ASCII; spaces, dashes and punctuation are dropped
+ANSWER_TRANSLATION = str.maketrans({
+    '♯': '#', '♭': 'b', '𝄪': 'x', '𝄫': 'bb', '♮': '',
+    **dict.fromkeys(' \t\n-_.,;:!?\'"()'),
+})
+MAX_ANSWER_LENGTH = 32  # Longer messages are not note names and skip the lookup
+
+# Spelling (normalized or commonly capitalized) -> note name in config.NOTES, built once at import
+NOTE_ALIASES = build_note_aliases(config.NOTES)
 
 def format_note_name(note: str) -> str:
-    """Format note name to handle both user inputs and internal representation."""
-    note = note.upper().strip()
-    # Handle alternative representations
-    replacements = {
-        'BB': 'A#',
-        'DB': 'C#',
-        'EB': 'D#',
-        'GB': 'F#',
-        'AB': 'G#',
-        'B#': 'C',
-        'E#': 'F'
-    }
-    return replacements.get(note, note) 
\ No newline at end of file
+    """Resolve a user's answer (any spelling, e.g. 'Db', 'c♯4', 'Sol', 'Fb!') to a name in config.NOTES.
+
+    Unrecognized input is returned stripped and upper-cased, so it simply fails the comparison.
+    """
+    resolved = NOTE_ALIASES.get(note)
+    if resolved is not None:
+        return resolved
+    if len(note) <= MAX_ANSWER_LENGTH:
+        # Octave digits (e.g. C#4) don't change the pitch class
+        key = note.lower().translate(ANSWER_TRANSLATION).rstrip('0123456789')
+        resolved = NOTE_ALIASES.get(key)
+        if resolved is not None:
+            return resolved
+    return note.upper().strip()
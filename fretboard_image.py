@@ -0,0 +1,143 @@
+import importlib.util
+from functools import lru_cache
+from io import BytesIO
+from typing import Any, Dict, Optional, Tuple, Union
+
+import config
+import fretboard
+
+# Pillow is optional and only imported when the first image is drawn
+AVAILABLE = importlib.util.find_spec('PIL') is not None
+
+# Layout in pixels: one cell per (string, fret), string 1 at the top, the open
+# strings left of the nut and fret numbers below the board
+CELL_WIDTH = 56
+CELL_HEIGHT = 40
+LEFT_MARGIN = 36  # String names
+TOP_MARGIN = 12
+BOTTOM_MARGIN = 30  # Fret numbers
+RIGHT_MARGIN = 12
+FONT_SIZE = 18
+MARKER_RADIUS = 15
+INLAY_FRETS = (3, 5, 7, 9, 15, 17, 19, 21)
+DOUBLE_INLAY_FRETS = (12, 24)
+
+BACKGROUND = (250, 246, 238)
+WOOD = (224, 196, 150)
+FRET_WIRE = (150, 150, 150)
+NUT = (60, 60, 60)
+STRING = (90, 90, 90)
+INLAY = (245, 235, 215)
+TEXT = (40, 40, 40)
+NOTE_BACKGROUND = (255, 255, 255)
+MARKER = (220, 50, 50)
+MARKER_TEXT = (255, 255, 255)
+
+# A question diagram: (tuning, max_fret, mode, string, fret)
+ImageKey = Tuple[str, int, str, int, int]
+
+# Telegram file_id of every diagram uploaded so far, so later sends reference the
+# stored photo instead of uploading it again. There are a few thousand possible
+# diagrams at most, so the cache is not bounded.
+_file_ids: Dict[ImageKey, str] = {}
+
+@lru_cache(maxsize=None)
+def _font(size: int = FONT_SIZE) -> Any:
+    """Return a font for labels, scalable where Pillow supports it."""
+    from PIL import ImageFont
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 only has a small fixed-size bitmap font
+        return ImageFont.load_default()
+
+def _cell_center(string_num: int, fret_num: int) -> Tuple[int, int]:
+    """Return the pixel center of a (string, fret) cell."""
+    return (
+        LEFT_MARGIN + fret_num * CELL_WIDTH + CELL_WIDTH // 2,
+        TOP_MARGIN + (string_num - 1) * CELL_HEIGHT + CELL_HEIGHT // 2,
+    )
+
+@lru_cache(maxsize=config.RENDER_CACHE_SIZE)
+def base_image(max_fret: int, mode: str = 'show', tuning: str = 'standard') -> Any:
+    """Draw the fretboard of a tuning without a marker, once per (max_fret, mode, tuning).
+
+    The result is shared: callers copy it before drawing on it.
+    """
+    from PIL import Image, ImageDraw
+    board = fretboard.create_fretboard(max_fret, tuning)
+    strings = len(board)
+    width = LEFT_MARGIN + (max_fret + 1) * CELL_WIDTH + RIGHT_MARGIN
+    height = TOP_MARGIN + strings * CELL_HEIGHT + BOTTOM_MARGIN
+    image = Image.new('RGB', (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    font = _font()
+    small_font = _font(FONT_SIZE - 4)
+
+    # Fingerboard from the nut to the last fret, with inlays between the middle strings
+    nut_x = LEFT_MARGIN + CELL_WIDTH
+    board_top = TOP_MARGIN + CELL_HEIGHT // 2
+    board_bottom = TOP_MARGIN + (strings - 1) * CELL_HEIGHT + CELL_HEIGHT // 2
+    draw.rectangle((nut_x, board_top, width - RIGHT_MARGIN, board_bottom), fill=WOOD)
+    middle_y = (board_top + board_bottom) // 2
+    if strings % 2:
+        # Between two strings rather than on the middle one
+        middle_y += CELL_HEIGHT // 2
+    for fret in range(1, max_fret + 1):
+        x, _ = _cell_center(1, fret)
+        if fret in INLAY_FRETS:
+            draw.ellipse((x - 6, middle_y - 6, x + 6, middle_y + 6), fill=INLAY)
+        elif fret in DOUBLE_INLAY_FRETS:
+            for y in (middle_y - CELL_HEIGHT, middle_y + CELL_HEIGHT):
+                draw.ellipse((x - 6, y - 6, x + 6, y + 6), fill=INLAY)
+
+    # Frets, then strings over them (lower strings drawn thicker)
+    for fret in range(1, max_fret + 1):
+        x = LEFT_MARGIN + (fret + 1) * CELL_WIDTH
+        draw.line((x, board_top, x, board_bottom), fill=FRET_WIRE, width=3)
+    draw.line((nut_x, board_top, nut_x, board_bottom), fill=NUT, width=6)
+    for string_num in range(1, strings + 1):
+        _, y = _cell_center(string_num, 0)
+        thickness = 1 + (string_num - 1) * 3 // strings
+        draw.line((LEFT_MARGIN + CELL_WIDTH // 2, y, width - RIGHT_MARGIN, y), fill=STRING, width=thickness)
+        draw.text((LEFT_MARGIN // 2, y), fretboard._string_name(board, string_num), fill=TEXT, font=font, anchor='mm')
+
+    for fret in range(max_fret + 1):
+        x, _ = _cell_center(1, fret)
+        draw.text((x, height - BOTTOM_MARGIN // 2), str(fret), fill=TEXT, font=small_font, anchor='mm')
+
+    if mode == 'show':
+        # Label every fretted note; open strings are named on the left
+        for string_num, notes in board.items():
+            for fret in range(1, max_fret + 1):
+                x, y = _cell_center(string_num, fret)
+                draw.rounded_rectangle((x - 16, y - 11, x + 16, y + 11), radius=8, fill=NOTE_BACKGROUND)
+                draw.text((x, y), notes[fret], fill=TEXT, font=small_font, anchor='mm')
+    return image
+
+def question_png(max_fret: int, string_num: int, fret_num: int, mode: str = 'show', tuning: str = 'standard') -> bytes:
+    """Return a PNG of the fretboard with the question marker on a copy of the cached base image."""
+    from PIL import ImageDraw
+    image = base_image(max_fret, mode, tuning).copy()
+    draw = ImageDraw.Draw(image)
+    x, y = _cell_center(string_num, fret_num)
+    draw.ellipse((x - MARKER_RADIUS, y - MARKER_RADIUS, x + MARKER_RADIUS, y + MARKER_RADIUS), fill=MARKER)
+    draw.text((x, y), "?", fill=MARKER_TEXT, font=_font(), anchor='mm')
+    output = BytesIO()
+    # Each diagram is uploaded once (see question_photo), so favour encoding speed over size
+    image.save(output, format='PNG', compress_level=3)
+    return output.getvalue()
+
+def question_photo(max_fret: int, string_num: int, fret_num: int, mode: str = 'show', tuning: str = 'standard') -> Tuple[ImageKey, Union[str, bytes]]:
+    """Return the diagram's key and what to send: its file_id if it was uploaded before, else the PNG."""
+    key = (tuning, max_fret, mode, string_num, fret_num)
+    file_id = _file_ids.get(key)
+    if file_id is not None:
+        return key, file_id
+    return key, question_png(max_fret, string_num, fret_num, mode, tuning)
+
+def remember_upload(key: ImageKey, message: Optional[Any]) -> None:
+    """Store the file_id Telegram assigned to a diagram sent in message."""
+    if key not in _file_ids and message is not None and getattr(message, 'photo', None):
+        # The largest size is the original upload
+        _file_ids[key] = message.photo[-1].file_id
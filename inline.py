@@ -0,0 +1,73 @@
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from telegram import InlineQueryResultArticle, InputTextMessageContent
+from telegram.constants import ParseMode
+from telegram.helpers import escape_markdown
+
+import config
+import fretboard
+from rng import SplitMix64
+
+# A result set: (max_fret, orientation, mode, tuning), like fretboard.TemplateKey
+ResultSetKey = Tuple[int, str, str, str]
+
+ORIENTATIONS = {'vertical': 'vertical', 'v': 'vertical', 'horizontal': 'horizontal', 'h': 'horizontal'}
+MODES = ('show', 'hide')
+QUESTION_PROMPT = "What note is marked with '?' on the fretboard? Tap the answer to reveal it."
+
+def parse_query(query: str) -> Optional[ResultSetKey]:
+    """Read the result set an inline query asks for, e.g. '7', '12 horizontal hide' or 'dadgad 5'.
+
+    Words may come in any order; missing ones take the defaults. Returns None if a word
+    isn't a fret option, orientation, mode or tuning.
+    """
+    max_fret, orientation, mode, tuning = config.INLINE_DEFAULT_FRET, 'vertical', 'show', config.DEFAULT_TUNING
+    for word in query.lower().split():
+        if word.isdigit() and int(word) in config.FRET_OPTIONS:
+            max_fret = int(word)
+        elif word in ORIENTATIONS:
+            orientation = ORIENTATIONS[word]
+        elif word in MODES:
+            mode = word
+        elif word in config.TUNINGS:
+            tuning = word
+        else:
+            return None
+    return (max_fret, orientation, mode, tuning)
+
+def _question_message(diagram: str, note: str) -> str:
+    """Format a question as MarkdownV2, with the answer in a spoiler."""
+    return (
+        f"{escape_markdown(QUESTION_PROMPT, version=2)}\n\n"
+        f"```\n{escape_markdown(diagram, version=2, entity_type='pre')}\n```\n"
+        f"Answer: ||{escape_markdown(note, version=2)}||"
+    )
+
+# There are only len(FRET_OPTIONS) * 2 * 2 * len(TUNINGS) result sets, so all of them can stay cached
+@lru_cache(maxsize=None)
+def result_set(max_fret: int, orientation: str, mode: str, tuning: str) -> List[InlineQueryResultArticle]:
+    """Build (once) the inline results for a key: INLINE_RESULTS questions at distinct positions."""
+    positions = [(string_num, fret_num) for string_num in config.TUNINGS[tuning] for fret_num in range(max_fret + 1)]
+    # Partial Fisher-Yates shuffle; reproducible with QUESTION_SEED, and different for every key
+    rng = SplitMix64.for_key((max_fret, orientation, mode, tuning), config.QUESTION_SEED)
+    count = min(config.INLINE_RESULTS, len(positions))
+    for index in range(count):
+        other = index + rng.randrange(len(positions) - index)
+        positions[index], positions[other] = positions[other], positions[index]
+
+    description = f"{config.TUNING_NAMES.get(tuning, tuning)}, frets 0-{max_fret}, {orientation}"
+    results = []
+    for number, position in enumerate(positions[:count], 1):
+        diagram, string_num, fret_num, note = fretboard.create_question(
+            max_fret, orientation=orientation, mode=mode, position=position, tuning=tuning
+        )
+        results.append(InlineQueryResultArticle(
+            id=f"{tuning}-{max_fret}-{orientation[0]}-{mode}-{number}",
+            title=f"Question {number}: string {string_num}",
+            description=description,
+            input_message_content=InputTextMessageContent(
+                _question_message(diagram, note), parse_mode=ParseMode.MARKDOWN_V2
+            ),
+        ))
+    return results
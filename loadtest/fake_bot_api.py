@@ -0,0 +1,129 @@
+"""A local stand-in for the Telegram Bot API, for load tests and end-to-end checks.
+
+Point the bot at it with ``TELEGRAM_BASE_URL=http://127.0.0.1:<port>/bot``. Every
+request is answered immediately with a plausible result, and every message the bot
+sends or edits is published to per-chat queues so simulated users can wait for replies.
+
+Run standalone (e.g. for a bot running in webhook mode in another process):
+
+    python -m loadtest.fake_bot_api --port 8081
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "FretBuddy", "username": "fretbuddy_test_bot"}
+
+# Methods whose result is the sent or edited Message
+MESSAGE_METHODS = {"sendMessage", "editMessageText", "sendPhoto", "editMessageMedia", "editMessageCaption"}
+
+class FakeBotAPI:
+    """Answers Bot API requests and records the messages sent to each chat."""
+
+    def __init__(self, latency: float = 0.0) -> None:
+        """Create an API with no recorded traffic that answers each request after latency seconds."""
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1000)
+        self._file_ids = itertools.count(1)
+        self._replies: Dict[int, asyncio.Queue] = {}
+        self.app = Starlette(routes=[Route("/bot{token}/{method}", self.handle, methods=["GET", "POST"])])
+
+    def replies(self, chat_id: int) -> asyncio.Queue:
+        """Return the queue of (method, message) the bot sent to a chat."""
+        queue = self._replies.get(chat_id)
+        if queue is None:
+            queue = self._replies[chat_id] = asyncio.Queue()
+        return queue
+
+    @staticmethod
+    async def parse(request: Request) -> Dict[str, Any]:
+        """Decode request parameters from JSON, form or multipart bodies."""
+        content_type = request.headers.get("content-type", "")
+        body = await request.body()
+        if content_type.startswith("application/json"):
+            return json.loads(body or b"{}")
+        if content_type.startswith("multipart/form-data"):
+            # Only the plain fields matter here; uploaded files are ignored
+            form = await request.form()
+            return {key: value for key, value in form.items() if isinstance(value, str)}
+        return {key: values[0] for key, values in parse_qs(body.decode()).items()}
+
+    def message(self, method: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the Message a send or edit request results in."""
+        chat_id = int(params.get("chat_id", 0))
+        message: Dict[str, Any] = {
+            "message_id": int(params.get("message_id") or next(self._message_ids)),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+        }
+        if "text" in params:
+            message["text"] = params["text"]
+        if method in ("sendPhoto", "editMessageMedia"):
+            file_id = f"photo-{next(self._file_ids)}"
+            message["photo"] = [{"file_id": file_id, "file_unique_id": file_id, "width": 640, "height": 640}]
+            if "caption" in params:
+                message["caption"] = params["caption"]
+        if "reply_markup" in params:
+            markup = params["reply_markup"]
+            message["reply_markup"] = json.loads(markup) if isinstance(markup, str) else markup
+        return message
+
+    async def handle(self, request: Request) -> JSONResponse:
+        """Answer one Bot API request."""
+        method = request.path_params["method"]
+        params = await self.parse(request)
+        self.calls[method] += 1
+        if self.latency:
+            # Round trip to Telegram's servers
+            await asyncio.sleep(self.latency)
+
+        result: Any = True
+        if method == "getMe":
+            result = BOT_USER
+        elif method == "getUpdates":
+            # Nothing to deliver; behave like an idle long poll
+            await asyncio.sleep(min(float(params.get("timeout", 0) or 0), 1.0))
+            result = []
+        elif method in MESSAGE_METHODS:
+            result = self.message(method, params)
+            self.replies(result["chat"]["id"]).put_nowait((method, result))
+        return JSONResponse({"ok": True, "result": result})
+
+    async def serve(self, port: int, host: str = "127.0.0.1", started: Optional[asyncio.Event] = None) -> None:
+        """Serve the API until cancelled."""
+        server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+        if started is not None:
+            started.set()
+        try:
+            await asyncio.shield(serving)
+        except asyncio.CancelledError:
+            # Let uvicorn shut down cleanly instead of tearing it down mid-request
+            server.should_exit = True
+            await serving
+            raise
+
+def main() -> None:
+    """Run the fake API standalone."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8081)
+    args = parser.parse_args()
+    asyncio.run(FakeBotAPI().serve(args.port))
+
+if __name__ == "__main__":
+    main()
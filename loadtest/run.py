@@ -0,0 +1,255 @@
+"""Simulate concurrent users walking the bot's main flow and report handler latency.
+
+Each user sends /start, opens the fret menu, picks a fret range, answers a number of
+questions and ends the session. Latency is measured from handing an update to the
+bot until the bot's reply reaches the fake Bot API.
+
+Run the bot in-process against the fake API:
+
+    python -m loadtest.run --users 200 --answers 20
+
+Or drive a bot running in webhook mode in another process. The harness serves the fake
+API itself and waits for the bot's /healthz, so start the harness first and then the bot
+with TELEGRAM_BASE_URL=http://127.0.0.1:8081/bot:
+
+    python -m loadtest.run --webhook-url http://127.0.0.1:8080/telegram --secret dev
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+import random
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urljoin
+
+from loadtest.fake_bot_api import BOT_USER, FakeBotAPI
+
+REPLY_TIMEOUT = 30.0
+STARTUP_TIMEOUT = 120.0  # How long to wait for an external bot to become healthy
+
+_update_ids = itertools.count(1)
+
+def message_update(user_id: int, text: str) -> Dict[str, Any]:
+    """Build an update for a private text message (or command) from a user."""
+    message: Dict[str, Any] = {
+        "message_id": next(_update_ids),
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text)}]
+    return {"update_id": next(_update_ids), "message": message}
+
+def callback_update(user_id: int, data: str, message_id: int) -> Dict[str, Any]:
+    """Build an update for an inline button press on one of the bot's messages."""
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "chat_instance": str(user_id),
+            "from": {"id": user_id, "is_bot": False, "first_name": f"User {user_id}"},
+            "data": data,
+            "message": {
+                "message_id": message_id,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": BOT_USER,
+                "text": "",
+            },
+        },
+    }
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """Return the given percentile of the samples (nearest rank)."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+class LoadTest:
+    """Runs simulated users against a bot and collects per-step latencies."""
+
+    def __init__(self, api: FakeBotAPI, send: Callable[[Dict[str, Any]], Awaitable[None]], answers: int, think: float) -> None:
+        """Create a load test that delivers updates through send."""
+        # Imported here rather than at the top: config reads the environment on import, and
+        # run_in_process sets the bot's environment first
+        import config
+        self.fret_options = config.FRET_OPTIONS
+        self.notes = config.NOTES
+        self.api = api
+        self.send = send
+        self.answers = answers
+        self.think = think
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.timeouts = 0
+
+    async def step(self, kind: str, user_id: int, update: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Deliver one update and wait for the bot's reply to that chat."""
+        replies = self.api.replies(user_id)
+        start = time.perf_counter()
+        await self.send(update)
+        try:
+            _, message = await asyncio.wait_for(replies.get(), REPLY_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return None
+        self.latencies[kind].append(time.perf_counter() - start)
+        if self.think:
+            await asyncio.sleep(random.uniform(0, 2 * self.think))
+        return message
+
+    async def user(self, user_id: int, delay: float) -> None:
+        """Walk one user through /start, fret selection, answers and game end."""
+        await asyncio.sleep(delay)
+        menu = await self.step("start", user_id, message_update(user_id, "/start"))
+        if menu is None:
+            return
+        if await self.step("menu_start", user_id, callback_update(user_id, "menu_start", menu["message_id"])) is None:
+            return
+        fret = random.choice(self.fret_options)
+        question = await self.step("fret", user_id, callback_update(user_id, f"fret_{fret}", menu["message_id"]))
+        if question is None:
+            return
+        for _ in range(self.answers):
+            reply = await self.step("answer", user_id, message_update(user_id, random.choice(self.notes)))
+            if reply is None:
+                return
+            question = reply
+        await self.step("game_end", user_id, callback_update(user_id, "game_end", question["message_id"]))
+
+    async def run(self, users: int, ramp: float) -> float:
+        """Run all users concurrently and return the wall time in seconds."""
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            self.user(100000 + index, random.uniform(0, ramp)) for index in range(users)
+        ))
+        return time.perf_counter() - start
+
+    def report(self, wall_time: float) -> Dict[str, Any]:
+        """Summarize throughput and latency percentiles."""
+        all_samples = [sample for samples in self.latencies.values() for sample in samples]
+        steps = {
+            kind: {
+                "count": len(samples),
+                "p50_ms": percentile(samples, 0.50) * 1000,
+                "p95_ms": percentile(samples, 0.95) * 1000,
+                "p99_ms": percentile(samples, 0.99) * 1000,
+            }
+            for kind, samples in [*self.latencies.items(), ("all", all_samples)]
+        }
+        return {
+            "updates": len(all_samples),
+            "timeouts": self.timeouts,
+            "wall_seconds": wall_time,
+            "updates_per_second": len(all_samples) / wall_time if wall_time else 0.0,
+            "steps": steps,
+            "api_calls": dict(self.api.calls),
+        }
+
+async def run_in_process(args: argparse.Namespace) -> Dict[str, Any]:
+    """Start the fake API and the bot in this process, then run the load test."""
+    # The bot reads its configuration at import time
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "123456:LOADTEST")
+    os.environ["TELEGRAM_BASE_URL"] = f"http://127.0.0.1:{args.api_port}/bot"
+    os.environ["BOT_MODE"] = "polling"
+    os.environ.setdefault("PERSISTENCE_BACKEND", "none")
+    os.environ.setdefault("OUTBOUND_RATE_LIMIT", "1" if args.rate_limit else "0")
+    os.environ.setdefault("DEFAULT_RESPONSE_MODE", "combined")
+    import bot
+    import webserver
+    from telegram import Update
+
+    # Per-update INFO logs would dominate both the output and the measurements
+    logging.getLogger().setLevel(logging.WARNING)
+
+    api = FakeBotAPI()
+    started = asyncio.Event()
+    serving = asyncio.create_task(api.serve(args.api_port, started=started))
+    await started.wait()
+
+    application = bot.build_application()
+    # With post_init/post_stop, so the eviction sweep, drill clock, analytics and metrics
+    # server run as they do in production
+    async with application, webserver.running(application):
+
+        async def send(data: Dict[str, Any]) -> None:
+            await application.update_queue.put(Update.de_json(data, application.bot))
+
+        test = LoadTest(api, send, args.answers, args.think)
+        wall_time = await test.run(args.users, args.ramp)
+    serving.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await serving
+    return test.report(wall_time)
+
+async def run_against_webhook(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the load test against a bot serving a webhook in another process."""
+    import httpx
+
+    api = FakeBotAPI()
+    started = asyncio.Event()
+    serving = asyncio.create_task(api.serve(args.api_port, started=started))
+    await started.wait()
+
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret} if args.secret else {}
+    async with httpx.AsyncClient(timeout=REPLY_TIMEOUT, limits=httpx.Limits(max_connections=256)) as client:
+        # The bot needs the fake API to start, so it may come up after the harness
+        print("Waiting for the bot to become healthy...")
+        health_url = urljoin(args.webhook_url, "/healthz")
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while True:
+            with contextlib.suppress(httpx.HTTPError):
+                if (await client.get(health_url)).status_code == 200:
+                    break
+            if time.monotonic() > deadline:
+                raise SystemExit(f"Bot at {health_url} did not become healthy")
+            await asyncio.sleep(0.5)
+
+        async def send(data: Dict[str, Any]) -> None:
+            response = await client.post(args.webhook_url, json=data, headers=headers)
+            response.raise_for_status()
+
+        test = LoadTest(api, send, args.answers, args.think)
+        wall_time = await test.run(args.users, args.ramp)
+    serving.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await serving
+    return test.report(wall_time)
+
+def main() -> None:
+    """Parse arguments, run the load test and print the report."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="number of concurrent simulated users")
+    parser.add_argument("--answers", type=int, default=10, help="answers each user sends")
+    parser.add_argument("--ramp", type=float, default=1.0, help="seconds over which users start")
+    parser.add_argument("--think", type=float, default=0.0, help="mean seconds a user waits between steps")
+    parser.add_argument("--api-port", type=int, default=8081, help="port of the fake Bot API")
+    parser.add_argument("--rate-limit", action="store_true", help="keep the outbound flood-control queue on")
+    parser.add_argument("--webhook-url", help="drive a bot running in webhook mode instead of an in-process one")
+    parser.add_argument("--secret", help="webhook secret token")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    runner = run_against_webhook if args.webhook_url else run_in_process
+    report = asyncio.run(runner(args))
+
+    print(f"{report['updates']} updates in {report['wall_seconds']:.2f}s "
+          f"({report['updates_per_second']:.0f}/s), {report['timeouts']} timeouts")
+    print(f"{'step':<12}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for kind, step in report["steps"].items():
+        print(f"{kind:<12}{step['count']:>8}{step['p50_ms']:>10.1f}{step['p95_ms']:>10.1f}{step['p99_ms']:>10.1f}")
+    print("Bot API calls:", ", ".join(f"{method}={count}" for method, count in sorted(report["api_calls"].items())))
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Measure how throughput scales with the number of sharded bot workers.
+
+For each worker count, starts the bot in webhook mode with WORKERS set (the front
+process plus that many workers, all talking to the fake Bot API), runs the load
+test against it and stops it again. The harness itself runs in one process, so
+give it a core of its own: scaling flattens once it is the bottleneck.
+
+Run from the repository root:
+
+    python -m loadtest.scaling --workers 1 2 4 --users 400 --answers 20
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+from loadtest import run
+
+def bot_environment(workers: int, args: argparse.Namespace, database: str) -> Dict[str, str]:
+    """Return the environment of a bot serving the load test with the given number of workers."""
+    env = dict(os.environ)
+    env.update({
+        "TELEGRAM_BOT_TOKEN": env.get("TELEGRAM_BOT_TOKEN", "123456:LOADTEST"),
+        "TELEGRAM_BASE_URL": f"http://127.0.0.1:{args.api_port}/bot",
+        "BOT_MODE": "webhook",
+        "WORKERS": str(workers),
+        "PORT": str(args.port),
+        "WEBHOOK_LISTEN": "127.0.0.1",
+        "WEBHOOK_SECRET": args.secret,
+        "OUTBOUND_RATE_LIMIT": "0",
+        "PERSISTENCE_PATH": database,
+    })
+    # Only set if the caller didn't choose a backend (e.g. PERSISTENCE_BACKEND=none)
+    env.setdefault("PERSISTENCE_BACKEND", "sqlite")
+    env.pop("WEBHOOK_URL", None)
+    env.pop("FLY_APP_NAME", None)
+    return env
+
+def measure(workers: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Run the load test against a bot with the given number of workers and return its report."""
+    with tempfile.TemporaryDirectory() as directory:
+        env = bot_environment(workers, args, os.path.join(directory, "fretbuddy.sqlite3"))
+        bot = subprocess.Popen([sys.executable, "bot.py"], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            return asyncio.run(run.run_against_webhook(args))
+        finally:
+            bot.terminate()
+            bot.wait()
+
+def main() -> None:
+    """Measure every worker count and print throughput relative to a single worker."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to measure")
+    parser.add_argument("--users", type=int, default=400, help="number of concurrent simulated users")
+    parser.add_argument("--answers", type=int, default=20, help="answers each user sends")
+    parser.add_argument("--ramp", type=float, default=1.0, help="seconds over which users start")
+    parser.add_argument("--port", type=int, default=8080, help="port of the bot's webhook front")
+    parser.add_argument("--api-port", type=int, default=8081, help="port of the fake Bot API")
+    args = parser.parse_args()
+    args.think = 0.0
+    args.secret = "loadtest"
+    args.webhook_url = f"http://127.0.0.1:{args.port}/telegram"
+
+    results: List[Dict[str, Any]] = []
+    for workers in args.workers:
+        report = measure(workers, args)
+        results.append(report)
+        print(f"{workers} workers: {report['updates_per_second']:.0f} updates/s, "
+              f"p95 {report['steps']['all']['p95_ms']:.1f} ms, {report['timeouts']} timeouts")
+
+    baseline = results[0]["updates_per_second"]
+    print(f"\n{'workers':>8}{'updates/s':>12}{'speedup':>10}")
+    for workers, report in zip(args.workers, results):
+        speedup = report["updates_per_second"] / baseline if baseline else 0.0
+        print(f"{workers:>8}{report['updates_per_second']:>12.0f}{speedup:>9.2f}x")
+
+if __name__ == "__main__":
+    main()
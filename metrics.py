@@ -0,0 +1,200 @@
+import functools
+import os
+import resource
+import sys
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from telegram.request import HTTPXRequest
+
+import config
+
+# Latency buckets in seconds, from a fast template splice to a slow Bot API call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+Handler = TypeVar('Handler', bound=Callable[..., Awaitable[Any]])
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = '') -> str:
+    """Render a label set such as {handler="handle_answer",le="0.5"}."""
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value: float) -> str:
+    """Render a sample value, using integers where possible."""
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    """Monotonically increasing count, one per label combination."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> None:
+        """Create a counter with the given label names."""
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        """Add amount to the count of a label combination."""
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def samples(self) -> List[str]:
+        """Return the exposition lines of all label combinations."""
+        return [
+            f"{self.name}{_format_labels(self.labels, values)} {_format_value(value)}"
+            for values, value in sorted(self._values.items())
+        ]
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, one per label combination."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """Create a histogram with the given label names and bucket upper bounds."""
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        # Per label combination: [count per bucket (last one is +Inf)], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        """Record one observation."""
+        entry = self._values.get(label_values)
+        if entry is None:
+            entry = self._values[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = entry
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def samples(self) -> List[str]:
+        """Return the exposition lines of all label combinations."""
+        lines = []
+        for values, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {cumulative}")
+        return lines
+
+class Gauge:
+    """Value read from a callback at scrape time."""
+
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Optional[float]]) -> None:
+        """Create a gauge reporting callback(); a None result omits the sample."""
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        """Return the exposition line of the current value."""
+        value = self.callback()
+        return [] if value is None else [f"{self.name} {_format_value(value)}"]
+
+class Registry:
+    """Collection of metrics rendered together in the Prometheus text format.
+
+    A dependency-free subset of a Prometheus client: labelled counters and histograms
+    updated in place, and gauges read from a callback when metrics are scraped.
+    """
+
+    def __init__(self) -> None:
+        """Create an empty registry."""
+        self._metrics: Dict[str, Any] = {}
+
+    def register(self, metric: Any) -> Any:
+        """Add a metric (replacing one with the same name) and return it."""
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+HANDLER_SECONDS = REGISTRY.register(Histogram(
+    'fretbuddy_handler_seconds', 'Time spent in update handlers, including their Bot API calls.', ('handler',)
+))
+HANDLER_ERRORS = REGISTRY.register(Counter(
+    'fretbuddy_handler_errors_total', 'Update handlers that raised an exception.', ('handler',)
+))
+QUESTION_SECONDS = REGISTRY.register(Histogram(
+    'fretbuddy_question_generation_seconds', 'Time to pick and render a question.'
+))
+API_REQUESTS = REGISTRY.register(Counter(
+    'fretbuddy_api_requests_total', 'Bot API requests by method and HTTP status ("error" for network errors).',
+    ('method', 'status'),
+))
+API_SECONDS = REGISTRY.register(Histogram(
+    'fretbuddy_api_request_seconds', 'Bot API request latency (getUpdates includes the long poll).', ('method',)
+))
+
+def timed(name: str) -> Callable[[Handler], Handler]:
+    """Decorate an async handler to record its latency and errors under the given name."""
+
+    def decorator(handler: Handler) -> Handler:
+        if not config.METRICS_ENABLED:
+            return handler
+
+        @functools.wraps(handler)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return await handler(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(name)
+                raise
+            finally:
+                HANDLER_SECONDS.observe(time.perf_counter() - start, name)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that counts and times every Bot API call."""
+
+    async def do_request(self, url: str, method: str, *args: Any, **kwargs: Any) -> Tuple[int, bytes]:
+        """Make the request and record its method, status and latency."""
+        api_method = url.rsplit('/', 1)[-1]
+        start = time.perf_counter()
+        try:
+            status, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception:
+            API_REQUESTS.inc(api_method, 'error')
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - start, api_method)
+        API_REQUESTS.inc(api_method, str(status))
+        return status, payload
+
+def resident_memory_bytes() -> float:
+    """Return the resident set size of this process."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        # Not Linux: fall back to the peak RSS, reported in KiB (bytes on macOS)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+REGISTRY.register(Gauge(
+    'fretbuddy_process_resident_memory_bytes', 'Resident memory of the bot process.', resident_memory_bytes
+))
@@ -0,0 +1,269 @@
+import asyncio
+import contextlib
+import heapq
+import itertools
+import logging
+from collections import deque
+from typing import Any, Callable, Coroutine, Deque, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Request priorities, passed as rate_limit_args: among chats with a request ready to
+# go, lower values are sent first. Within a chat, requests always keep their order.
+# They start at 1 because ExtBot ignores falsy rate_limit_args.
+PRIORITY_ANSWER = 1  # Feedback to a user's answer
+PRIORITY_DEFAULT = 2  # Everything else, e.g. menu redraws
+
+# (sequence number, priority, future granting the send); chat queues are ordered by sequence
+QueueEntry = Tuple[int, int, asyncio.Future]
+
+class TokenBucket:
+    """Classic token bucket: holds up to capacity tokens, refilled at rate tokens per second."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float, now: float) -> None:
+        """Create a full bucket."""
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Return how many seconds until a token is available (0 if one is available now)."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        """Consume one token; call only after delay() returned 0."""
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        """Return whether the bucket would be full at the given time."""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+class PriorityRateLimiter(BaseRateLimiter[int]):
+    """Throttle outgoing Bot API requests with per-chat and global token buckets.
+
+    Requests that target a chat wait in their chat's queue, in order, until both their
+    chat's bucket and the global bucket have a token; a chat that is out of tokens does
+    not hold up other chats. When several chats have a request ready, the one with the
+    best priority (see the PRIORITY_* constants, passed as ``rate_limit_args``) goes
+    first, so an answer never overtakes an earlier request to the same chat. A
+    RetryAfter from Telegram pauses all sending for the requested time before the
+    request is retried. Requests without a chat (e.g. answerCallbackQuery) are only
+    retried, never queued.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        chat_burst: float = 3,
+        group_rate: float = 20 / 60,
+        max_retries: int = 3,
+    ) -> None:
+        """Initialize the limiter with rates in messages per second."""
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+
+        self._global: Optional[TokenBucket] = None
+        self._chat_buckets: Dict[Union[int, str], TokenBucket] = {}
+        self._chat_queues: Dict[Union[int, str], List[QueueEntry]] = {}
+        # Chats whose next request can go out now, keyed by that request's priority and sequence
+        self._ready: List[Tuple[int, int, int, Union[int, str]]] = []
+        # Chats waiting for a token, keyed by the time it becomes available
+        self._sleeping: List[Tuple[float, int, Union[int, str]]] = []
+        # Latest (priority, sequence, ticket) each chat was scheduled with; heap entries
+        # with an older ticket have been superseded and are skipped
+        self._scheduled: Dict[Union[int, str], Tuple[int, int, int]] = {}
+        self._sequence = itertools.count()
+        self._tickets = itertools.count()
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+        # Statistics
+        self.pending = 0
+        self.sent = 0
+        self.retries = 0
+        self._waits: Deque[float] = deque(maxlen=1024)
+        self._max_wait = 0.0
+
+    async def initialize(self) -> None:
+        """Start the dispatcher task."""
+        # ExtBot initializes its rate limiter again when the Updater initializes the bot
+        if self._dispatcher is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._global = TokenBucket(self.global_rate, self.global_rate, loop.time())
+        self._dispatcher = asyncio.create_task(self._dispatch())
+
+    async def shutdown(self) -> None:
+        """Stop the dispatcher task."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._dispatcher
+            self._dispatcher = None
+
+    def stats(self) -> Dict[str, float]:
+        """Return queue depth, wait-time and retry statistics."""
+        waits = sorted(self._waits)
+
+        def percentile(fraction: float) -> float:
+            return waits[min(len(waits) - 1, int(len(waits) * fraction))] if waits else 0.0
+
+        return {
+            'queue_depth': self.pending,
+            'queued_chats': len(self._chat_queues),
+            'sent': self.sent,
+            'retries': self.retries,
+            'wait_p50_seconds': percentile(0.5),
+            'wait_p95_seconds': percentile(0.95),
+            'wait_max_seconds': self._max_wait,
+        }
+
+    def _chat_bucket(self, chat_id: Union[int, str], now: float) -> TokenBucket:
+        """Return the bucket of a chat, creating it on first use."""
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            # Negative ids (and @usernames) are groups and channels, which have a stricter limit
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = self._chat_buckets[chat_id] = TokenBucket(rate, 1 if is_group else self.chat_burst, now)
+        return bucket
+
+    def _schedule(self, chat_id: Union[int, str], now: float) -> None:
+        """Put a chat with queued requests into the ready or the sleeping heap."""
+        sequence, priority, _ = self._chat_queues[chat_id][0]
+        delay = self._chat_bucket(chat_id, now).delay(now)
+        ticket = next(self._tickets)
+        self._scheduled[chat_id] = (priority, sequence, ticket)
+        if delay <= 0:
+            heapq.heappush(self._ready, (priority, sequence, ticket, chat_id))
+        else:
+            heapq.heappush(self._sleeping, (now + delay, ticket, chat_id))
+
+    def _enqueue(self, chat_id: Union[int, str], entry: QueueEntry) -> None:
+        """Queue a request and wake the dispatcher."""
+        now = asyncio.get_running_loop().time()
+        queue = self._chat_queues.setdefault(chat_id, [])
+        heapq.heappush(queue, entry)
+        scheduled = self._scheduled.get(chat_id)
+        # Reschedule if the chat is idle or the request is a retry that goes back to the front
+        if scheduled is None or queue[0] is entry:
+            self._schedule(chat_id, now)
+        self._wakeup.set()
+
+    async def _dispatch(self) -> None:
+        """Grant queued requests as tokens become available, highest priority first."""
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            while self._sleeping and self._sleeping[0][0] <= now:
+                _, ticket, chat_id = heapq.heappop(self._sleeping)
+                scheduled = self._scheduled.get(chat_id)
+                if scheduled is not None and scheduled[2] == ticket:
+                    heapq.heappush(self._ready, (*scheduled, chat_id))
+
+            timeout: Optional[float] = None
+            if self._paused_until > now:
+                timeout = self._paused_until - now
+            elif self._ready:
+                timeout = self._global.delay(now)
+                if timeout <= 0:
+                    self._grant_next(now)
+                    continue
+            elif self._sleeping:
+                timeout = self._sleeping[0][0] - now
+            else:
+                self._purge_buckets(now)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _grant_next(self, now: float) -> None:
+        """Let the highest-priority ready request go out."""
+        priority, sequence, ticket, chat_id = heapq.heappop(self._ready)
+        if self._scheduled.get(chat_id) != (priority, sequence, ticket):
+            return  # Superseded entry
+
+        queue = self._chat_queues[chat_id]
+        _, _, future = heapq.heappop(queue)
+        # Requests cancelled while waiting don't use up a token
+        if not future.done():
+            self._chat_buckets[chat_id].take()
+            self._global.take()
+            future.set_result(None)
+
+        if queue:
+            self._schedule(chat_id, now)
+        else:
+            del self._chat_queues[chat_id]
+            del self._scheduled[chat_id]
+
+    def _purge_buckets(self, now: float) -> None:
+        """Forget the buckets of idle chats; a full bucket is the same as a new one."""
+        if len(self._chat_buckets) > 1024:
+            self._chat_buckets = {
+                chat_id: bucket for chat_id, bucket in self._chat_buckets.items()
+                if chat_id in self._chat_queues or not bucket.is_full(now)
+            }
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        """Wait for a send slot (for requests to a chat), then make the request."""
+        chat_id = data.get('chat_id')
+        priority = PRIORITY_DEFAULT if rate_limit_args is None else rate_limit_args
+        sequence = next(self._sequence)
+        loop = asyncio.get_running_loop()
+
+        attempt = 0
+        while True:
+            if chat_id is not None:
+                queued_at = loop.time()
+                future = loop.create_future()
+                self.pending += 1
+                try:
+                    # Retries keep their original sequence number, so they stay ahead of newer requests
+                    self._enqueue(chat_id, (sequence, priority, future))
+                    await future
+                finally:
+                    self.pending -= 1
+                wait = loop.time() - queued_at
+                self._waits.append(wait)
+                self._max_wait = max(self._max_wait, wait)
+            elif self._paused_until > loop.time():
+                await asyncio.sleep(self._paused_until - loop.time())
+
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as error:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retries += 1
+                logger.warning("Flood control on %s, pausing sends for %s seconds", endpoint, error.retry_after)
+                self._paused_until = max(self._paused_until, loop.time() + error.retry_after)
+                self._wakeup.set()
+                continue
+            self.sent += 1
+            return result
@@ -0,0 +1,241 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional, Set, Tuple, Union
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import config
+from session import Session
+
+logger = logging.getLogger(__name__)
+
+# ConversationHandler keys are tuples of chat/user ids
+ConversationKey = Tuple[Union[int, str], ...]
+ConversationDict = Dict[ConversationKey, object]
+# Pending conversation writes are keyed by handler name and conversation key
+ConversationRef = Tuple[str, ConversationKey]
+
+class PersistenceBackend(ABC):
+    """Storage used by WriteBehindPersistence. Methods are blocking and run in a worker thread."""
+
+    @abstractmethod
+    def load_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Return the stored user_data of one user, or None if there is none."""
+
+    @abstractmethod
+    def load_conversations(self, name: str) -> ConversationDict:
+        """Return all stored states of the named ConversationHandler."""
+
+    @abstractmethod
+    def write_batch(self, users: Dict[int, Dict[str, Any]], conversations: Dict[ConversationRef, Optional[object]]) -> None:
+        """Store a batch of user_data and conversation states in a single transaction.
+
+        A conversation state of None means the conversation has ended and is removed.
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """Release the underlying storage."""
+
+class SQLiteBackend(PersistenceBackend):
+    """Stores user_data and conversation states as JSON rows in a SQLite database."""
+
+    def __init__(self, path: str) -> None:
+        """Open (and if needed create) the database at path."""
+        # Calls arrive from asyncio.to_thread workers, so share one connection behind a lock
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS user_data (user_id INTEGER PRIMARY KEY, data TEXT NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "name TEXT NOT NULL, key TEXT NOT NULL, state TEXT NOT NULL, PRIMARY KEY (name, key))"
+            )
+
+    def load_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Return the stored user_data of one user, or None if there is none."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data FROM user_data WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_conversations(self, name: str) -> ConversationDict:
+        """Return all stored states of the named ConversationHandler."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT key, state FROM conversations WHERE name = ?", (name,)
+            ).fetchall()
+        return {tuple(json.loads(key)): json.loads(state) for key, state in rows}
+
+    def write_batch(self, users: Dict[int, Dict[str, Any]], conversations: Dict[ConversationRef, Optional[object]]) -> None:
+        """Store a batch of user_data and conversation states in a single transaction."""
+        ended = [(name, json.dumps(key)) for (name, key), state in conversations.items() if state is None]
+        states = [
+            (name, json.dumps(key), json.dumps(state))
+            for (name, key), state in conversations.items() if state is not None
+        ]
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO user_data (user_id, data) VALUES (?, ?)",
+                [(user_id, json.dumps(data)) for user_id, data in users.items()],
+            )
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO conversations (name, key, state) VALUES (?, ?, ?)", states
+            )
+            self._connection.executemany("DELETE FROM conversations WHERE name = ? AND key = ?", ended)
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._connection.close()
+
+class WriteBehindPersistence(BasePersistence[Session, Dict[Any, Any], Dict[Any, Any]]):
+    """Persist user sessions and conversation states with lazy loading and batched writes.
+
+    Nothing is read at startup except conversation states, which ConversationHandler
+    needs all at once (so startup is O(open conversations)); each user's data is loaded
+    the first time one of their updates is handled. The Application hands over changed
+    data every ``update_interval`` seconds and at shutdown; everything handed over in
+    one round is committed to the backend in a single transaction.
+    """
+
+    def __init__(self, backend: PersistenceBackend, update_interval: float = 60) -> None:
+        """Initialize the persistence on top of the given backend."""
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.backend = backend
+        self._loaded_users: Set[int] = set()
+        self._pending_users: Dict[int, Dict[str, Any]] = {}
+        self._pending_conversations: Dict[ConversationRef, Optional[object]] = {}
+        self._commit_task: Optional[asyncio.Task] = None
+
+    def _schedule_commit(self) -> None:
+        """Commit pending writes once the current round of updates has been buffered."""
+        if self._commit_task is None or self._commit_task.done():
+            # Application.update_persistence gathers all update_* calls at once, so this task
+            # starts after the rest of the round has been buffered
+            self._commit_task = asyncio.create_task(self._commit())
+
+    async def _commit(self) -> None:
+        """Write all pending data to the backend in one transaction."""
+        await asyncio.sleep(0)
+        users, self._pending_users = self._pending_users, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        if not users and not conversations:
+            return
+        try:
+            await asyncio.to_thread(self.backend.write_batch, users, conversations)
+        except Exception:
+            logger.exception("Failed to persist %d users, will retry with the next batch", len(users))
+            # Keep anything newer that was buffered while the write was running
+            for user_id, data in users.items():
+                self._pending_users.setdefault(user_id, data)
+            for ref, state in conversations.items():
+                self._pending_conversations.setdefault(ref, state)
+            return
+        logger.debug("Persisted %d users and %d conversation states", len(users), len(conversations))
+
+    async def get_user_data(self) -> Dict[int, Session]:
+        """Return no user data up front; users are loaded lazily in refresh_user_data."""
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: Session) -> None:
+        """Load the stored session of a user the first time one of their updates is handled."""
+        if user_id in self._loaded_users:
+            return
+        stored = await asyncio.to_thread(self.backend.load_user, user_id)
+        if stored:
+            user_data.restore(stored)
+        self._loaded_users.add(user_id)
+
+    async def commit(self) -> None:
+        """Write everything buffered so far and wait until the write has finished."""
+        if self._commit_task is not None and not self._commit_task.done():
+            await self._commit_task
+        # As a task of its own, so a commit scheduled meanwhile waits for it instead of racing it
+        self._commit_task = asyncio.create_task(self._commit())
+        await self._commit_task
+
+    def is_pending(self, user_id: int) -> bool:
+        """Return whether a user's data is buffered but not written yet (e.g. after a failed write)."""
+        return user_id in self._pending_users
+
+    def forget_user(self, user_id: int) -> None:
+        """Mark a user whose session was evicted from memory as not loaded."""
+        self._loaded_users.discard(user_id)
+
+    async def update_user_data(self, user_id: int, data: Session) -> None:
+        """Buffer the changed session of a user for the next batched commit."""
+        self._pending_users[user_id] = data.to_dict()
+        self._schedule_commit()
+
+    async def drop_user_data(self, user_id: int) -> None:
+        """Keep stored sessions; the bot only drops user data to evict it from memory."""
+
+    async def get_conversations(self, name: str) -> ConversationDict:
+        """Load all stored states of the named ConversationHandler."""
+        return await asyncio.to_thread(self.backend.load_conversations, name)
+
+    async def update_conversation(self, name: str, key: ConversationKey, new_state: Optional[object]) -> None:
+        """Buffer a conversation state change for the next batched commit."""
+        self._pending_conversations[(name, key)] = new_state
+        self._schedule_commit()
+
+    async def flush(self) -> None:
+        """Commit everything still pending and close the backend (called at shutdown)."""
+        await self.commit()
+        self.backend.close()
+
+    # Chat, bot and callback data are not used by this bot and are never stored
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        """Return no chat data."""
+        return {}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        """Return no bot data."""
+        return {}
+
+    async def get_callback_data(self) -> Optional[Any]:
+        """Return no callback data."""
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: Any) -> None:
+        """Ignore chat data."""
+
+    async def update_bot_data(self, data: Any) -> None:
+        """Ignore bot data."""
+
+    async def update_callback_data(self, data: Any) -> None:
+        """Ignore callback data."""
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        """Ignore chat data."""
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Any) -> None:
+        """Ignore chat data."""
+
+    async def refresh_bot_data(self, bot_data: Any) -> None:
+        """Ignore bot data."""
+
+def create_persistence() -> Optional[WriteBehindPersistence]:
+    """Create the persistence selected by config.PERSISTENCE_BACKEND, or None if disabled."""
+    if config.PERSISTENCE_BACKEND == 'none':
+        return None
+    if config.PERSISTENCE_BACKEND == 'sqlite':
+        return WriteBehindPersistence(
+            SQLiteBackend(config.PERSISTENCE_PATH),
+            update_interval=config.PERSISTENCE_FLUSH_INTERVAL,
+        )
+    raise ValueError(f"Unknown persistence backend: {config.PERSISTENCE_BACKEND}")
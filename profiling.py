@@ -0,0 +1,102 @@
+import asyncio
+import cProfile
+import io
+import logging
+import pstats
+import time
+from typing import Optional
+
+from telegram import Update
+from telegram.ext import Application, CallbackContext, TypeHandler
+
+logger = logging.getLogger(__name__)
+
+# Handler group of the update counter; runs after every other handler of an update
+PROFILE_GROUP = 100
+MAX_SUMMARY_LENGTH = 3900  # Keeps the summary (plus formatting) within one Telegram message
+
+class UpdateProfiler:
+    """Captures a cProfile of the bot for a number of updates or seconds, then reports the top functions.
+
+    Nothing is installed while no profile is running: the update counter is added
+    as a handler when a profile starts and removed when it ends, so an idle
+    profiler adds no work to any update.
+    """
+
+    def __init__(self, top: int = 25) -> None:
+        """Create an idle profiler reporting the given number of functions."""
+        self.top = top
+        self._profile: Optional[cProfile.Profile] = None
+        self._timer: Optional[asyncio.Task] = None
+        self._target: Optional[int] = None
+        self._updates = 0
+        self._started = 0.0
+        self._chat_id: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        """Return whether a profile is being captured."""
+        return self._profile is not None
+
+    def start(self, application: Application, chat_id: int, updates: Optional[int], seconds: float) -> None:
+        """Profile until `updates` more updates were handled (if given) or `seconds` passed, then report to chat_id."""
+        self._chat_id = chat_id
+        self._target = updates
+        self._updates = 0
+        # Swap in a new handler mapping instead of calling add_handler/remove_handler:
+        # those change the mapping in place, while updates being processed
+        # concurrently (including the /profile command itself) iterate over it
+        handlers = {**application.handlers, PROFILE_GROUP: [TypeHandler(Update, self._count)]}
+        application.handlers = dict(sorted(handlers.items()))
+        self._timer = asyncio.create_task(self._stop_after(application, seconds))
+        self._started = time.perf_counter()
+        # One profiler for the event loop thread: it sees every handler of every
+        # update processed concurrently, and the Bot API calls they make
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    async def _count(self, update: Update, context: CallbackContext) -> None:
+        """Count handled updates and finish once the requested number is reached."""
+        self._updates += 1
+        if self._target is not None and self._updates >= self._target:
+            await self.finish(context.application)
+
+    async def _stop_after(self, application: Application, seconds: float) -> None:
+        """Finish the profile when its time window ends."""
+        await asyncio.sleep(seconds)
+        self._timer = None
+        await self.finish(application)
+
+    async def finish(self, application: Application) -> None:
+        """Stop profiling, remove the update counter and send the report."""
+        if self._profile is None:
+            return
+        profile, self._profile = self._profile, None
+        profile.disable()
+        elapsed = time.perf_counter() - self._started
+        application.handlers = {
+            group: handlers for group, handlers in application.handlers.items() if group != PROFILE_GROUP
+        }
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        report = self.summary(profile)
+        logger.info("Profile of %d updates over %.1fs:\n%s", self._updates, elapsed, report)
+        await application.bot.send_message(
+            self._chat_id,
+            f"Profile of {self._updates} updates over {elapsed:.1f}s, top {self.top} functions by own time:\n"
+            f"```\n{report[:MAX_SUMMARY_LENGTH]}\n```",
+            parse_mode='Markdown'
+        )
+
+    def summary(self, profile: cProfile.Profile) -> str:
+        """Return the top functions by own time as a compact table."""
+        stats = pstats.Stats(profile, stream=io.StringIO())
+        stats.strip_dirs().sort_stats(pstats.SortKey.TIME)
+        lines = ["  own ms   cum ms   calls  function"]
+        for function in stats.fcn_list[:self.top]:
+            _, calls, own_time, cumulative_time, _ = stats.stats[function]
+            filename, line, name = function
+            lines.append(f"{own_time * 1000:8.1f} {cumulative_time * 1000:8.1f} {calls:>7}  {filename}:{line}({name})")
+        return '\n'.join(lines)
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, List, Optional
+
+import config
+import fretboard
+from fretboard import QuestionTemplate, TemplateKey
+
+logger = logging.getLogger(__name__)
+
+# File layout: MAGIC, the length of a JSON header, the header (fingerprint and
+# index), then per template its UTF-8 text followed by its cells as unsigned
+# shorts (string, fret, start, end, note index) in native byte order. It is built
+# on the machine (image) that reads it.
+MAGIC = b'FRETTPL1'
+PREAMBLE = struct.Struct('<8sI')
+CELL_FIELDS = 5
+
+def fingerprint() -> str:
+    """Hash what the templates are rendered from: fretboard.py and the configuration it reads."""
+    with open(fretboard.__file__, 'rb') as source:
+        digest = hashlib.sha256(source.read())
+    digest.update(json.dumps(
+        [config.NOTES, config.TUNINGS, config.FRET_OPTIONS, config.QUESTION_MARK], sort_keys=True
+    ).encode())
+    return digest.hexdigest()
+
+def _index_key(key: TemplateKey) -> str:
+    """Return the header index key of a template."""
+    return '|'.join(map(str, key))
+
+def build(path: str) -> int:
+    """Render every template in fretboard.template_keys() into an artifact at path; return its size."""
+    index: Dict[str, List] = {}
+    blobs = bytearray()
+    for key in fretboard.template_keys():
+        template = fretboard.get_question_template(*key)
+        text = template.text.encode()
+        cells = array('H')
+        for (string_num, fret_num), (start, end, note) in template.cells.items():
+            cells.extend((string_num, fret_num, start, end, fretboard.NOTE_INDEX[note]))
+        index[_index_key(key)] = [len(blobs), len(text), len(template.cells), template.marker]
+        blobs += text
+        blobs += cells.tobytes()
+
+    header = json.dumps({'fingerprint': fingerprint(), 'templates': index}, separators=(',', ':')).encode()
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as output:
+        output.write(PREAMBLE.pack(MAGIC, len(header)))
+        output.write(header)
+        output.write(blobs)
+    os.replace(temporary, path)
+    return PREAMBLE.size + len(header) + len(blobs)
+
+class TemplateArtifact:
+    """Question templates in a memory-mapped artifact, decoded one at a time when first used."""
+
+    def __init__(self, path: str) -> None:
+        """Map the artifact and read its index; raises ValueError if it isn't one."""
+        with open(path, 'rb') as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, length = PREAMBLE.unpack_from(self._map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a template artifact")
+        header = json.loads(self._map[PREAMBLE.size:PREAMBLE.size + length])
+        self.fingerprint: str = header['fingerprint']
+        self._index: Dict[str, List] = header['templates']
+        self._data_start = PREAMBLE.size + length
+
+    def __len__(self) -> int:
+        """Return the number of templates in the artifact."""
+        return len(self._index)
+
+    def get(self, key: TemplateKey) -> Optional[QuestionTemplate]:
+        """Decode the template with the given key, or return None if the artifact doesn't have it."""
+        entry = self._index.get(_index_key(key))
+        if entry is None:
+            return None
+        offset, text_length, cell_count, marker = entry
+        start = self._data_start + offset
+        text = self._map[start:start + text_length].decode()
+        fields = array('H')
+        fields.frombytes(self._map[start + text_length:start + text_length + cell_count * CELL_FIELDS * fields.itemsize])
+        # Column slices keep the per-cell work in C
+        cells = dict(zip(
+            zip(fields[0::CELL_FIELDS], fields[1::CELL_FIELDS]),
+            zip(fields[2::CELL_FIELDS], fields[3::CELL_FIELDS], map(config.NOTES.__getitem__, fields[4::CELL_FIELDS])),
+        ))
+        return QuestionTemplate(text, marker, cells)
+
+def install(path: str) -> bool:
+    """Serve question templates from the artifact at path, if it exists and matches this code and configuration."""
+    try:
+        artifact = TemplateArtifact(path)
+    except FileNotFoundError:
+        return False
+    except (ValueError, struct.error):
+        logger.warning("Ignoring unreadable template artifact %s", path)
+        return False
+    if artifact.fingerprint != fingerprint():
+        logger.warning("Ignoring template artifact %s built for other code or settings", path)
+        return False
+    fretboard.use_template_source(artifact.get)
+    logger.info("Question templates mapped from %s (%d templates)", path, len(artifact))
+    return True
+
+def main() -> None:
+    """Build the artifact at config.RENDER_ARTIFACT (or the path given as the first argument)."""
+    path = sys.argv[1] if len(sys.argv) > 1 else config.RENDER_ARTIFACT
+    size = build(path)
+    print(f"Wrote {path} ({size} bytes)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import hashlib
+import secrets
+from typing import Optional, Tuple, Union
+
+MASK64 = (1 << 64) - 1
+GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
+class SplitMix64:
+    """Small, fast PRNG (SplitMix64) whose whole state is one 64-bit integer.
+
+    Each user gets their own generator, so question sequences are reproducible from
+    a seed and the state is cheap to keep in memory and to persist.
+    """
+
+    __slots__ = ('state',)
+
+    def __init__(self, state: int) -> None:
+        """Create a generator from a 64-bit state."""
+        self.state = state & MASK64
+
+    @classmethod
+    def for_user(cls, user_id: int, seed: Optional[int] = None) -> 'SplitMix64':
+        """Create a user's generator: derived from seed and user_id if a seed is given, else random."""
+        if seed is None:
+            return cls(secrets.randbits(64))
+        # Mix the user id in, so users with the same seed get unrelated sequences
+        return cls(cls(seed ^ (user_id * GOLDEN_GAMMA)).next64())
+
+    @classmethod
+    def for_key(cls, key: Tuple[Union[int, str], ...], seed: Optional[int] = None) -> 'SplitMix64':
+        """Create the generator of a cache key (e.g. an inline result set), like for_user but from the whole key."""
+        # hash() of a str differs between processes, so derive a stable 64-bit id from the key's text
+        key_id = int.from_bytes(hashlib.blake2b(repr(key).encode(), digest_size=8).digest(), 'big')
+        return cls.for_user(key_id, seed)
+
+    def next64(self) -> int:
+        """Return the next 64-bit output."""
+        self.state = (self.state + GOLDEN_GAMMA) & MASK64
+        z = self.state
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+        return z ^ (z >> 31)
+
+    def randrange(self, n: int) -> int:
+        """Return a random integer in [0, n), like random.randrange(n)."""
+        # Multiply-shift maps 64 random bits onto [0, n) without a division
+        return (self.next64() * n) >> 64
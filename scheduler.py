@@ -0,0 +1,178 @@
+import base64
+import random
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Protocol, Tuple
+
+import config
+
+# Position weights: new positions start at BASE_WEIGHT, misses double the weight and
+# quick correct answers halve it, within [MIN_WEIGHT, MAX_WEIGHT]. A weak spot can
+# therefore come up up to MAX_WEIGHT / MIN_WEIGHT times as often as a mastered one.
+BASE_WEIGHT = 16
+MIN_WEIGHT = 2
+MAX_WEIGHT = 255  # Weights fit in one byte when persisted
+
+class RandomSource(Protocol):
+    """What sampling needs from a random generator: random.Random, the random module or rng.SplitMix64."""
+
+    def randrange(self, n: int) -> int:
+        """Return a random integer in [0, n)."""
+
+class FenwickTree(array):
+    """Binary indexed tree over non-negative integer weights.
+
+    Supports changing a weight and sampling an index proportionally to its weight in
+    O(log n). The tree is the array itself, with node i at index i, so each tree is a
+    single object.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, weights: Iterable[int], typecode: str = 'I') -> 'FenwickTree':
+        """Build the tree from the given weights in O(n)."""
+        # Index 0 is not a node, so parent/child links are simple bit operations
+        tree = super().__new__(cls, typecode, [0, *weights])
+        size = len(tree)
+        for index in range(1, size + 1):
+            parent = index + (index & -index)
+            if parent <= size:
+                tree[parent] += tree[index]
+        return tree
+
+    def __len__(self) -> int:
+        """Return the number of weights."""
+        return super().__len__() - 1
+
+    def weights(self) -> List[int]:
+        """Return all weights in O(n)."""
+        weights = self.tolist()
+        weights[0] = 0
+        # Undo the construction in reverse order
+        for index in range(len(weights) - 1, 0, -1):
+            parent = index + (index & -index)
+            if parent < len(weights):
+                weights[parent] -= weights[index]
+        return weights[1:]
+
+    def prefix_sum(self, end: int) -> int:
+        """Return the sum of the weights at indices below end."""
+        total = 0
+        while end > 0:
+            total += self[end]
+            end -= end & -end
+        return total
+
+    def total(self) -> int:
+        """Return the sum of all weights."""
+        return self.prefix_sum(len(self))
+
+    def weight(self, index: int) -> int:
+        """Return the weight at index."""
+        return self.prefix_sum(index + 1) - self.prefix_sum(index)
+
+    def add(self, index: int, delta: int) -> None:
+        """Add delta to the weight at index."""
+        index += 1
+        size = len(self)
+        while index <= size:
+            self[index] += delta
+            index += index & -index
+
+    def find(self, target: int) -> int:
+        """Return the index i with prefix_sum(i) <= target < prefix_sum(i + 1)."""
+        size = len(self)
+        position = 0
+        step = 1 << (size.bit_length() - 1) if size else 0
+        while step:
+            candidate = position + step
+            if candidate <= size and self[candidate] <= target:
+                position = candidate
+                target -= self[candidate]
+            step >>= 1
+        return position
+
+    def sample(self, rng: RandomSource) -> int:
+        """Return a random index, chosen proportionally to its weight."""
+        return self.find(rng.randrange(self.total()))
+
+class PositionScheduler(FenwickTree):
+    """Picks the next (string, fret) to ask about, favouring positions a user misses or answers slowly.
+
+    One weight per position, stored in the Fenwick tree itself to keep per-user state small:
+    the number of frets goes in the tree's unused index 0, so a scheduler is one array and
+    nothing else (about 240 bytes for 6 strings x 13 frets).
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, strings: int, max_fret: int, weights: Optional[Iterable[int]] = None) -> 'PositionScheduler':
+        """Create a scheduler for a board of strings x (max_fret + 1) positions."""
+        size = strings * (max_fret + 1)
+        if weights is None:
+            weights = [BASE_WEIGHT] * size
+        # 16-bit sums are enough for every board a guitar-like instrument can have
+        typecode = 'H' if size * MAX_WEIGHT <= 0xFFFF else 'I'
+        scheduler = super().__new__(cls, weights, typecode)
+        scheduler[0] = max_fret + 1
+        return scheduler
+
+    @property
+    def frets(self) -> int:
+        """Return the number of frets per string, open string included."""
+        return self[0]
+
+    @property
+    def strings(self) -> int:
+        """Return the number of strings covered."""
+        return len(self) // self[0]
+
+    @property
+    def max_fret(self) -> int:
+        """Return the highest fret covered."""
+        return self.frets - 1
+
+    def _index(self, string_num: int, fret_num: int) -> int:
+        """Return the position index of a string (1-based) and fret."""
+        return (string_num - 1) * self.frets + fret_num
+
+    def pick(self, rng: RandomSource = random) -> Tuple[int, int]:
+        """Return the (string, fret) of the next question."""
+        string_index, fret_num = divmod(self.sample(rng), self.frets)
+        return (string_index + 1, fret_num)
+
+    def record(self, string_num: int, fret_num: int, correct: bool, seconds: Optional[float] = None) -> None:
+        """Update the weight of a position after the user answered it."""
+        index = self._index(string_num, fret_num)
+        weight = self.weight(index)
+        if not correct:
+            new_weight = min(MAX_WEIGHT, weight * 2)
+        elif seconds is not None and seconds > config.SCHEDULER_SLOW_ANSWER:
+            # Right but slow: not yet learned, ask a bit more often
+            new_weight = min(MAX_WEIGHT, weight + BASE_WEIGHT // 4)
+        else:
+            new_weight = max(MIN_WEIGHT, weight // 2)
+        self.add(index, new_weight - weight)
+
+    def resized(self, strings: int, max_fret: int) -> 'PositionScheduler':
+        """Return a scheduler for another board size, keeping the weights of shared positions."""
+        old = self.weights()
+        weights = [
+            old[self._index(string_num, fret_num)]
+            if string_num <= self.strings and fret_num < self.frets else BASE_WEIGHT
+            for string_num in range(1, strings + 1)
+            for fret_num in range(max_fret + 1)
+        ]
+        return PositionScheduler(strings, max_fret, weights)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return a compact JSON-serializable form (one byte per position)."""
+        return {
+            'strings': self.strings,
+            'max_fret': self.max_fret,
+            'weights': base64.b64encode(bytes(self.weights())).decode('ascii'),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PositionScheduler':
+        """Recreate a scheduler stored with to_dict."""
+        return cls(data['strings'], data['max_fret'], base64.b64decode(data['weights']))
@@ -0,0 +1,183 @@
+import asyncio
+import heapq
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from telegram.ext import Application
+
+import config
+import fretboard_image
+from drill import Timer
+from rng import SplitMix64
+from scheduler import PositionScheduler
+
+
+logger = logging.getLogger(__name__)
+
+# A pre-generated question: (max_fret, orientation, mode, tuning) it was rendered for,
+# and (diagram, string, fret, correct note) as returned by fretboard.create_question
+PrefetchedQuestion = Tuple[Tuple[int, str, str, str], Tuple[str, int, int, str]]
+
+class Session:
+    """Per-user state: settings, the current question and session statistics.
+
+    Used as the Application's ``user_data`` type, so every known user costs one small
+    fixed-size object instead of a dict of dicts.
+    """
+
+    __slots__ = (
+        # Settings
+        'max_fret', 'orientation', 'mode', 'response_mode', 'tuning', 'render', 'drill_seconds',
+        # Current question
+        'correct_note', 'attempts', 'string_num', 'fret_num', 'question_message_id',
+        # Session statistics
+        'correct_answers', 'wrong_answers', 'total_questions', 'questions_with_hints',
+        'timed_out', 'response_seconds', 'responses',
+        # Adaptive question weights (see scheduler.py) and the user's random generator
+        'scheduler', 'rng',
+        # The next question, generated ahead of time, the monotonic times of the
+        # current question and the last update, and the deadline of a timed question;
+        # they only matter within one process and are not persisted
+        'prefetched', 'asked_at', 'last_seen', 'drill_timer',
+    )
+
+    # Fields that are persisted
+    PERSISTED_FIELDS = __slots__[:-4]
+
+    def __init__(self) -> None:
+        """Create a session with default settings and empty statistics."""
+        self.max_fret: Optional[int] = None
+        self.orientation = 'vertical'
+        self.mode = 'show'
+        self.response_mode = config.DEFAULT_RESPONSE_MODE  # 'combined', 'edit' or 'separate'
+        self.tuning = config.DEFAULT_TUNING  # Key of config.TUNINGS
+        self.render = config.DEFAULT_RENDER if fretboard_image.AVAILABLE else 'text'  # 'text' or 'image'
+        self.drill_seconds = config.DEFAULT_DRILL_SECONDS  # Time limit per question, 0 for none
+        self.correct_note: Optional[str] = None
+        self.attempts = 0
+        self.string_num: Optional[int] = None
+        self.fret_num: Optional[int] = None
+        self.question_message_id: Optional[int] = None  # Bot message showing the current question
+        self.reset_stats()
+        self.scheduler: Optional[PositionScheduler] = None  # Created with the first question
+        self.rng: Optional[SplitMix64] = None  # Seeded with the first question
+        self.prefetched: Optional[PrefetchedQuestion] = None
+        self.asked_at = 0.0
+        self.last_seen = int(time.monotonic())
+        self.drill_timer: Optional[Timer] = None  # Set while a timed question is waiting for its answer
+
+    def reset_stats(self) -> None:
+        """Clear the statistics of the current training session."""
+        self.correct_answers = 0
+        self.wrong_answers = 0
+        self.total_questions = 0
+        self.questions_with_hints = 0  # Questions where user needed a second attempt
+        self.timed_out = 0  # Timed questions left unanswered until their deadline
+        # Total seconds to answer, and number of questions answered (not timed out)
+        self.response_seconds = 0.0
+        self.responses = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the persisted fields as a JSON-serializable dict."""
+        data = {field: getattr(self, field) for field in self.PERSISTED_FIELDS}
+        if self.scheduler is not None:
+            data['scheduler'] = self.scheduler.to_dict()
+        if self.rng is not None:
+            data['rng'] = self.rng.state
+        return data
+
+    def restore(self, data: Dict[str, Any]) -> None:
+        """Load persisted fields, accepting the older layout with a nested 'stats' dict."""
+        data = {**data, **data.get('stats', {})}
+        for field in self.PERSISTED_FIELDS:
+            if field in data:
+                setattr(self, field, data[field])
+        if self.tuning not in config.TUNINGS:
+            # A tuning that has since been removed from the configuration
+            self.tuning = config.DEFAULT_TUNING
+        if self.render == 'image' and not fretboard_image.AVAILABLE:
+            # Stored by a deployment that had Pillow installed
+            self.render = 'text'
+        if self.scheduler is not None:
+            self.scheduler = PositionScheduler.from_dict(self.scheduler)
+        if self.rng is not None:
+            self.rng = SplitMix64(self.rng)
+
+class SessionEvictor:
+    """Periodically drop sessions that are idle or exceed the configured maximum.
+
+    Evicted users are written to the persistence first (if any), and are loaded again
+    lazily when they come back.
+    """
+
+    def __init__(self, idle_ttl: float, max_sessions: int, sweep_interval: float) -> None:
+        """Initialize the evictor; call start() once the Application is running."""
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, application: Application) -> None:
+        """Start sweeping in the background (usable as a post_init hook)."""
+        self._task = asyncio.create_task(self._run(application))
+
+    async def stop(self, application: Application) -> None:
+        """Stop sweeping (usable as a post_stop hook)."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self, application: Application) -> None:
+        """Sweep every sweep_interval seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                await self.sweep(application)
+            except Exception:
+                logger.exception("Session eviction failed")
+
+    def select_victims(self, sessions: Dict[int, Session], now: int) -> List[int]:
+        """Return the users whose sessions are idle too long or least recently used over the cap."""
+        victims = [user_id for user_id, session in sessions.items() if now - session.last_seen > self.idle_ttl]
+        overflow = len(sessions) - len(victims) - self.max_sessions
+        if overflow > 0:
+            idle = set(victims)
+            victims += heapq.nsmallest(
+                overflow,
+                (user_id for user_id in sessions if user_id not in idle),
+                key=lambda user_id: sessions[user_id].last_seen,
+            )
+        return victims
+
+    async def sweep(self, application: Application) -> int:
+        """Evict idle and excess sessions and return how many were evicted."""
+        started = int(time.monotonic())
+        victims = self.select_victims(application.user_data, started)
+        if not victims:
+            return 0
+
+        persistence = application.persistence
+        if persistence is not None:
+            # Write the latest state of every victim to the store before dropping it:
+            # update_persistence only buffers it, commit() waits for the write
+            application.mark_data_for_update_persistence(user_ids=victims)
+            await application.update_persistence()
+            await persistence.commit()
+
+        evicted = 0
+        for user_id in victims:
+            session = application.user_data.get(user_id)
+            # Skip users who came back while the persistence was updated
+            if session is None or session.last_seen >= started:
+                continue
+            if persistence is not None:
+                if persistence.is_pending(user_id):
+                    # The write failed; reloading now would bring back an older state
+                    continue
+                persistence.forget_user(user_id)
+            application.drop_user_data(user_id)
+            evicted += 1
+
+        logger.info("Evicted %d idle sessions, %d remain in memory", evicted, len(application.user_data))
+        return evicted
@@ -0,0 +1,202 @@
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import struct
+import tempfile
+from typing import Any, Dict, List, Optional
+
+from telegram import Update
+
+import webserver
+
+logger = logging.getLogger(__name__)
+
+# Updates travel from the front process to the workers as length-prefixed JSON
+FRAME_HEADER = struct.Struct('!I')
+CONNECT_TIMEOUT = 60.0  # Seconds a new worker may take to start listening
+RESTART_DELAY = 1.0  # Seconds between restarts of a crashed worker
+
+def update_user_id(data: Dict[str, Any]) -> Optional[int]:
+    """Return the id of the user who sent a raw update (the chat id if it has no sender)."""
+    chat_id = None
+    for key, value in data.items():
+        if key == 'update_id' or not isinstance(value, dict):
+            continue
+        # Sessions and conversation states are per user, so the sender decides the worker
+        user = value.get('from') or value.get('user')
+        if isinstance(user, dict) and isinstance(user.get('id'), int):
+            return user['id']
+        # Channel posts have no sender; callback queries carry the message they belong to
+        message = value.get('message')
+        chat = value.get('chat') or (message.get('chat') if isinstance(message, dict) else None)
+        if isinstance(chat, dict) and isinstance(chat.get('id'), int) and chat_id is None:
+            chat_id = chat['id']
+    return chat_id
+
+def shard_for(user_id: Optional[int], workers: int) -> int:
+    """Return the index of the worker that owns a user."""
+    # User ids are integers, so this is stable across processes (unlike hash() of a str)
+    return user_id % workers if user_id is not None else 0
+
+def worker_main(index: int, socket_path: str) -> None:
+    """Entry point of a worker process: run the bot on the updates the front sends to socket_path."""
+    # Ctrl+C reaches the whole process group; the front stops the workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Imported here: only the workers need a bot
+    import bot
+    application = bot.build_application(worker=index)
+    asyncio.run(serve_worker(application, socket_path))
+
+async def serve_worker(application: Any, socket_path: str) -> None:
+    """Process updates received on a Unix socket until SIGTERM."""
+    stopped = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+
+    receivers: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def receive(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Queue every update the front sends over one connection."""
+        receivers[asyncio.current_task()] = writer
+        try:
+            while True:
+                (length,) = FRAME_HEADER.unpack(await reader.readexactly(FRAME_HEADER.size))
+                data = json.loads(await reader.readexactly(length))
+                try:
+                    update = Update.de_json(data, application.bot)
+                except (AttributeError, KeyError, TypeError, ValueError):
+                    # The front only checks the update_id; skip updates with fields of the wrong type
+                    logger.warning("Skipped malformed update %s", data['update_id'])
+                    continue
+                await application.update_queue.put(update)
+        except asyncio.IncompleteReadError:
+            pass  # The connection was closed
+        finally:
+            writer.close()
+            del receivers[asyncio.current_task()]
+
+    async with application, webserver.running(application):
+        server = await asyncio.start_unix_server(receive, socket_path)
+        try:
+            await stopped.wait()
+        finally:
+            server.close()
+            # Closing a connection ends its receiver once it has queued what already arrived
+            for writer in list(receivers.values()):
+                writer.close()
+            await asyncio.gather(*receivers)
+
+class Worker:
+    """One bot process owning a shard of the chats, and the front's connection to it."""
+
+    def __init__(self, index: int, socket_path: str) -> None:
+        """Describe the worker; call start() to launch it."""
+        self.index = index
+        self.socket_path = socket_path
+        self.process: Optional[multiprocessing.Process] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    @property
+    def connected(self) -> bool:
+        """Return whether updates can be sent to the worker."""
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def start(self) -> None:
+        """Launch the worker process and connect to it once it listens."""
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(self.socket_path)
+        # Spawned, not forked: the front runs an event loop and threads that a fork would copy
+        context = multiprocessing.get_context('spawn')
+        self.process = context.Process(
+            target=worker_main, args=(self.index, self.socket_path), name=f"fretbuddy-worker-{self.index}"
+        )
+        self.process.start()
+        deadline = asyncio.get_running_loop().time() + CONNECT_TIMEOUT
+        while True:
+            try:
+                _, self._writer = await asyncio.open_unix_connection(self.socket_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if not self.process.is_alive() or asyncio.get_running_loop().time() > deadline:
+                    raise RuntimeError(f"Worker {self.index} failed to start")
+                await asyncio.sleep(0.1)
+        logger.info("Worker %d started (pid %d)", self.index, self.process.pid)
+
+    async def send(self, body: bytes) -> None:
+        """Send one raw update to the worker."""
+        self._writer.write(FRAME_HEADER.pack(len(body)) + body)
+        await self._writer.drain()
+
+    async def stop(self) -> None:
+        """Disconnect and let the worker finish its in-flight updates and flush persistence."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()  # SIGTERM: a clean shutdown, see serve_worker
+            await asyncio.to_thread(self.process.join)
+
+class ShardRouter:
+    """Runs config.WORKERS bot processes and routes every update to the one owning its chat.
+
+    All updates of a chat go to the same worker, so its ConversationHandler state,
+    session and update ordering live in one process. The workers share the SQLite
+    persistence, which lets a restarted worker pick its users up where they were.
+    """
+
+    def __init__(self, workers: int) -> None:
+        """Describe the workers; call start() to launch them."""
+        self._socket_dir = tempfile.mkdtemp(prefix='fretbuddy-')
+        self.workers: List[Worker] = [
+            Worker(index, os.path.join(self._socket_dir, f'worker-{index}.sock')) for index in range(workers)
+        ]
+        self._supervisor: Optional[asyncio.Task] = None
+
+    @property
+    def healthy(self) -> bool:
+        """Return whether every worker is up."""
+        return all(worker.connected for worker in self.workers)
+
+    async def start(self) -> None:
+        """Launch all workers and restart any that exits."""
+        await asyncio.gather(*(worker.start() for worker in self.workers))
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    async def _supervise(self) -> None:
+        """Restart crashed workers until cancelled."""
+        while True:
+            await asyncio.sleep(RESTART_DELAY)
+            for worker in self.workers:
+                if worker.process.is_alive():
+                    continue
+                logger.error("Worker %d exited with code %s, restarting", worker.index, worker.process.exitcode)
+                await worker.stop()
+                try:
+                    await worker.start()
+                except RuntimeError:
+                    logger.exception("Could not restart worker %d", worker.index)
+
+    async def route(self, body: bytes, data: Dict[str, Any]) -> bool:
+        """Send a raw update to the worker owning its sender; return False if that worker is down."""
+        worker = self.workers[shard_for(update_user_id(data), len(self.workers))]
+        if not worker.connected:
+            return False
+        try:
+            await worker.send(body)
+        except ConnectionError:
+            return False
+        return True
+
+    async def stop(self) -> None:
+        """Stop supervising and shut all workers down."""
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            self._supervisor = None
+        await asyncio.gather(*(worker.stop() for worker in self.workers))
+        with contextlib.suppress(OSError):
+            for worker in self.workers:
+                os.unlink(worker.socket_path)
+            os.rmdir(self._socket_dir)
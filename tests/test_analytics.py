@@ -0,0 +1,85 @@
+"""Tests for the cross-user answer analytics behind /stats."""
+import asyncio
+import os
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, List
+
+from analytics import EVENT, Analytics
+
+if TYPE_CHECKING:
+    from _pytest.capture import CaptureFixture
+    from _pytest.fixtures import FixtureRequest
+    from _pytest.logging import LogCaptureFixture
+    from _pytest.monkeypatch import MonkeyPatch
+    from pytest_mock.plugin import MockerFixture
+
+def record_answers(analytics: Analytics, correct: int, missed: int) -> None:
+    """Record answers on string 2, fret 3 in standard tuning: some solved at once, some missed."""
+    for _ in range(correct):
+        analytics.record('standard', 2, 3, True, 1, 2.0)
+    for _ in range(missed):
+        analytics.record('standard', 2, 3, False, 2, 4.0)
+
+def test_flush_writes_events_and_a_snapshot_that_is_loaded_again(tmp_path: Path) -> None:
+    """Events are appended to the log; a new instance starts from the snapshot."""
+    path = os.path.join(tmp_path, 'analytics')
+    analytics = Analytics(path, flush_interval=60)
+    record_answers(analytics, correct=4, missed=2)
+    asyncio.run(analytics.flush())
+
+    assert os.path.getsize(path + '.log') == 6 * EVENT.size
+    restored = Analytics(path, flush_interval=60)
+    assert restored.tunings == {'standard': [6, 4, 4, 16000]}
+    assert restored.positions == {('standard', 2, 3): [6, 2]}
+    assert "Questions Answered: 6" in restored.summary('standard')
+
+def test_summary_includes_the_peers_snapshots(tmp_path: Path) -> None:
+    """A worker's /stats adds the other workers' last snapshots to its own live counts."""
+    base = os.path.join(tmp_path, 'analytics')
+    other = Analytics(f"{base}-1", flush_interval=60)
+    record_answers(other, correct=3, missed=3)
+    asyncio.run(other.flush())
+
+    worker = Analytics(f"{base}-0", flush_interval=60, peers=[f"{base}-1"])
+    record_answers(worker, correct=1, missed=1)
+    summary = worker.summary('standard')
+    assert "Questions Answered: 8" in summary
+    assert "Solved: 50.0% (50.0% on the first try)" in summary
+    # Hardest positions are ranked over everyone's answers
+    assert "string 2 fret 3 (50% missed)" in summary
+    # The peers' counts are not added to this worker's own
+    assert worker.tunings == {'standard': [2, 1, 1, 6000]}
+
+def test_stop_waits_for_a_write_in_progress(tmp_path: Path, monkeypatch: 'MonkeyPatch') -> None:
+    """Stopping while a flush is writing lets it finish before the final flush writes, so writes never overlap."""
+    analytics = Analytics(os.path.join(tmp_path, 'analytics'), flush_interval=0.01)
+    write = analytics._write
+    writing = threading.Lock()
+    overlapped: List[bool] = []
+
+    def slow_write(events: bytes, snapshot: str) -> None:
+        """Write slowly, noting whether another write was running."""
+        if not writing.acquire(blocking=False):
+            overlapped.append(True)
+            return
+        try:
+            time.sleep(0.1)
+            write(events, snapshot)
+        finally:
+            writing.release()
+
+    monkeypatch.setattr(analytics, '_write', slow_write)
+
+    async def run() -> None:
+        """Record, let a flush start writing, record more and stop."""
+        await analytics.start(None)  # type: ignore[arg-type]
+        record_answers(analytics, correct=1, missed=0)
+        await asyncio.sleep(0.05)
+        record_answers(analytics, correct=0, missed=1)
+        await analytics.stop(None)  # type: ignore[arg-type]
+
+    asyncio.run(run())
+    assert overlapped == []
+    assert os.path.getsize(analytics.log_path) == 2 * EVENT.size
@@ -0,0 +1,110 @@
+"""Tests for the timer wheel and clock behind timed drills."""
+import asyncio
+import random
+import time
+from typing import TYPE_CHECKING, Dict
+
+import pytest
+
+from drill import SLOT_BITS, SLOTS, DrillClock, DrillTimeout, TimerWheel
+
+if TYPE_CHECKING:
+    from _pytest.capture import CaptureFixture
+    from _pytest.fixtures import FixtureRequest
+    from _pytest.logging import LogCaptureFixture
+    from _pytest.monkeypatch import MonkeyPatch
+    from pytest_mock.plugin import MockerFixture
+
+@pytest.mark.parametrize('expires', [1, SLOTS - 1, SLOTS, SLOTS + 1, SLOTS ** 2 - 1, SLOTS ** 2, SLOTS ** 2 + 1, SLOTS ** 3 + 5])
+def test_timer_fires_exactly_at_its_tick(expires: int) -> None:
+    """A timer fires on its expiry tick, not before, whichever level it starts on."""
+    wheel = TimerWheel()
+    wheel.schedule(expires, 'timeout')
+    assert wheel.advance(expires - 1) == []
+    assert wheel.pending == 1
+    assert wheel.advance(expires) == ['timeout']
+    assert wheel.pending == 0
+
+def test_timers_cascade_between_levels_one_tick_at_a_time() -> None:
+    """Timers scheduled at random times and distances fire on their tick when ticks are processed one by one."""
+    rng = random.Random(7)
+    wheel = TimerWheel(levels=3)
+    expected: Dict[int, int] = {}
+    fired: Dict[int, int] = {}
+    for tick in range(1, 3 * SLOTS ** 2):
+        if rng.random() < 0.3:
+            timer_id = len(expected)
+            expected[timer_id] = tick + rng.randrange(1, SLOTS ** 2 + SLOTS)
+            wheel.schedule(expected[timer_id], timer_id)
+        for timer_id in wheel.advance(tick):
+            fired[timer_id] = tick
+    due = {timer_id: tick for timer_id, tick in expected.items() if tick < 3 * SLOTS ** 2}
+    assert fired == due
+    assert wheel.pending == len(expected) - len(due)
+
+def test_advance_over_many_ticks_fires_in_expiry_order() -> None:
+    """One advance over many ticks returns every due timer, earliest first."""
+    wheel = TimerWheel()
+    for expires in (300, 5, SLOTS * 3, 70):
+        wheel.schedule(expires, expires)
+    wheel.schedule(500, 500)
+    assert wheel.advance(400) == [5, 70, SLOTS * 3, 300]
+    assert wheel.pending == 1
+
+def test_expiry_in_the_past_fires_on_the_next_tick() -> None:
+    """A timer whose tick has passed fires on the next one."""
+    wheel = TimerWheel()
+    wheel.advance(10)
+    wheel.schedule(3, 'late')
+    assert wheel.advance(11) == ['late']
+
+def test_expiry_beyond_the_horizon_is_clamped() -> None:
+    """A timer further out than the wheel reaches fires at its horizon."""
+    wheel = TimerWheel(levels=2)
+    horizon = 2 ** (SLOT_BITS * 2) - 1
+    wheel.schedule(10 * horizon, 'far')
+    assert wheel.advance(horizon - 1) == []
+    assert wheel.advance(horizon) == ['far']
+
+def test_cancelled_timers_do_not_fire() -> None:
+    """Cancelling drops a timer, including after it was cascaded; cancelling twice or after firing is harmless."""
+    wheel = TimerWheel()
+    near = wheel.schedule(3, 'near')
+    far = wheel.schedule(SLOTS * 2 + 1, 'far')
+    kept = wheel.schedule(SLOTS * 2 + 2, 'kept')
+    wheel.cancel(near)
+    wheel.cancel(near)
+    assert wheel.pending == 2
+    assert wheel.advance(SLOTS * 2) == []
+    wheel.cancel(far)
+    assert wheel.advance(SLOTS * 3) == ['kept']
+    wheel.cancel(kept)
+    assert wheel.pending == 0
+
+def test_drill_clock_never_fires_early() -> None:
+    """A deadline is queued as its DrillTimeout update no earlier than its seconds have passed."""
+
+    class StubApplication:
+        """The update queue DrillClock puts timeouts on."""
+
+        def __init__(self) -> None:
+            """Create an empty update queue."""
+            self.update_queue: asyncio.Queue = asyncio.Queue()
+
+    async def run() -> float:
+        """Schedule a deadline and a cancelled one; return how long the first took to arrive."""
+        application = StubApplication()
+        clock = DrillClock(tick=0.01)
+        await clock.start(application)  # type: ignore[arg-type]
+        start = time.monotonic()
+        clock.schedule(0.05, DrillTimeout(1, 1))
+        cancelled = clock.schedule(0.02, DrillTimeout(2, 2))
+        clock.cancel(cancelled)
+        timeout = await asyncio.wait_for(application.update_queue.get(), 1)
+        elapsed = time.monotonic() - start
+        await clock.stop(application)  # type: ignore[arg-type]
+        assert timeout.chat_id == 1
+        assert application.update_queue.empty()
+        return elapsed
+
+    assert asyncio.run(run()) >= 0.05
@@ -0,0 +1,85 @@
+"""Tests for the cached fretboards and question templates."""
+from typing import TYPE_CHECKING, List
+
+import pytest
+
+import config
+import fretboard
+
+if TYPE_CHECKING:
+    from _pytest.capture import CaptureFixture
+    from _pytest.fixtures import FixtureRequest
+    from _pytest.logging import LogCaptureFixture
+    from _pytest.monkeypatch import MonkeyPatch
+    from pytest_mock.plugin import MockerFixture
+
+def test_default_tuning_shares_one_fretboard() -> None:
+    """Calls with and without the default tuning return the same cached fretboard."""
+    fretboard._build_fretboard.cache_clear()
+    board = fretboard.create_fretboard(7)
+    assert fretboard.create_fretboard(7, 'standard') is board
+    assert fretboard.create_fretboard(7, tuning='standard') is board
+    assert fretboard._build_fretboard.cache_info().currsize == 1
+
+def test_default_arguments_share_one_template() -> None:
+    """Templates requested with and without their default arguments are built once."""
+    fretboard._build_question_template.cache_clear()
+    template = fretboard.get_question_template(5)
+    assert fretboard.get_question_template(5, 'vertical', 'show') is template
+    assert fretboard.get_question_template(5, mode='show', tuning='standard') is template
+    assert fretboard._build_question_template.cache_info().currsize == 1
+
+def test_fretboard_notes() -> None:
+    """Each string starts on its open note and repeats it at the 12th fret."""
+    board = fretboard.create_fretboard(12, 'dropd')
+    assert board[6][:3] == ("D", "D#", "E")
+    assert all(notes[0] == notes[12] for notes in board.values())
+
+@pytest.mark.parametrize('tuning', list(config.TUNINGS))
+def test_fretboard_of_every_tuning(tuning: str) -> None:
+    """Every tuning has one row per string, starting on its open note and counting up in semitones."""
+    strings = config.TUNINGS[tuning]
+    board = fretboard.create_fretboard(12, tuning)
+    assert sorted(board) == list(range(1, len(strings) + 1))
+    for string_num, open_note in strings.items():
+        start = config.NOTES.index(open_note)
+        assert board[string_num] == tuple(config.NOTES[(start + fret) % 12] for fret in range(13))
+
+@pytest.mark.parametrize('orientation', ['vertical', 'horizontal'])
+@pytest.mark.parametrize('tuning', list(config.TUNINGS))
+def test_questions_of_every_tuning(tuning: str, orientation: str) -> None:
+    """Every position of every tuning can be asked, with the right answer and exactly one marker."""
+    strings = config.TUNINGS[tuning]
+    for string_num, open_note in strings.items():
+        for fret_num in range(6):
+            diagram, asked_string, asked_fret, note = fretboard.create_question(
+                5, orientation=orientation, position=(string_num, fret_num), tuning=tuning
+            )
+            assert (asked_string, asked_fret) == (string_num, fret_num)
+            assert note == config.NOTES[(config.NOTES.index(open_note) + fret_num) % 12]
+            assert diagram.count(config.QUESTION_MARK) == 1
+            assert diagram == fretboard.question_diagram(5, string_num, fret_num, orientation, 'show', tuning)
+
+@pytest.mark.parametrize('tuning', list(config.TUNINGS))
+def test_diagram_has_a_line_or_column_per_string(tuning: str) -> None:
+    """Vertical diagrams have a column per string, horizontal ones a row per string."""
+    strings = len(config.TUNINGS[tuning])
+    vertical = fretboard.question_diagram(5, 1, 0, 'vertical', 'show', tuning).split("\n")
+    assert all(line.count("|") == strings + 1 for line in [vertical[0]] + vertical[2:])
+    horizontal = fretboard.question_diagram(5, 1, 0, 'horizontal', 'show', tuning).split("\n")
+    assert len(horizontal) == 2 + strings
+
+def test_seven_string_layout() -> None:
+    """The 7-string's vertical header runs from the low B to the high e."""
+    header = fretboard.question_diagram(3, 1, 2, 'vertical', 'show', 'seven').split("\n")[0]
+    assert header == "    |  B  |  E  |  A  |  D  |  G  |  B  |  e  |"
+
+@pytest.mark.parametrize(('tuning', 'names'), [
+    ('bass4', ["G", "D", "A", "E"]),
+    ('bass5', ["G", "D", "A", "E", "B"]),
+    ('ukulele', ["A", "E", "C", "G"]),
+])
+def test_four_and_five_string_layouts(tuning: str, names: List[str]) -> None:
+    """Bass and ukulele rows are named by their open notes, highest string first."""
+    rows = fretboard.question_diagram(3, 1, 2, 'horizontal', 'show', tuning).split("\n")[2:]
+    assert [row.split("|")[0].strip() for row in rows] == names
@@ -0,0 +1,90 @@
+"""Tests for parsing inline queries and building their result sets."""
+from typing import TYPE_CHECKING, Iterator, List, Tuple
+
+import pytest
+
+import config
+import inline
+from inline import ResultSetKey, parse_query, result_set
+from rng import SplitMix64
+
+if TYPE_CHECKING:
+    from _pytest.capture import CaptureFixture
+    from _pytest.fixtures import FixtureRequest
+    from _pytest.logging import LogCaptureFixture
+    from _pytest.monkeypatch import MonkeyPatch
+    from pytest_mock.plugin import MockerFixture
+
+@pytest.fixture(autouse=True)
+def seeded(monkeypatch: 'MonkeyPatch') -> Iterator[None]:
+    """Make result sets reproducible and build them afresh in every test."""
+    monkeypatch.setattr(config, 'QUESTION_SEED', 1234)
+    result_set.cache_clear()
+    yield
+    result_set.cache_clear()
+
+@pytest.mark.parametrize(('query', 'expected'), [
+    ('', (config.INLINE_DEFAULT_FRET, 'vertical', 'show', config.DEFAULT_TUNING)),
+    ('   ', (config.INLINE_DEFAULT_FRET, 'vertical', 'show', config.DEFAULT_TUNING)),
+    ('7', (7, 'vertical', 'show', config.DEFAULT_TUNING)),
+    ('12 horizontal hide', (12, 'horizontal', 'hide', config.DEFAULT_TUNING)),
+    ('hide h 12', (12, 'horizontal', 'hide', config.DEFAULT_TUNING)),
+    ('dadgad 5', (5, 'vertical', 'show', 'dadgad')),
+    ('V BASS4 3', (3, 'vertical', 'show', 'bass4')),
+])
+def test_parse_query(query: str, expected: ResultSetKey) -> None:
+    """Words may come in any order and case; missing ones take the defaults."""
+    assert parse_query(query) == expected
+
+@pytest.mark.parametrize('query', ['4', '13', 'diagonal', '7 sideways', 'drop-d', '-5'])
+def test_parse_query_rejects_unknown_words(query: str) -> None:
+    """A word that isn't a fret option, orientation, mode or tuning rejects the whole query."""
+    assert parse_query(query) is None
+
+def answers(key: ResultSetKey) -> List[Tuple[str, str]]:
+    """Return the (title, message text) of every result of a key."""
+    return [(result.title, result.input_message_content.message_text) for result in result_set(*key)]
+
+@pytest.mark.parametrize(('key', 'count'), [
+    ((5, 'vertical', 'show', 'standard'), config.INLINE_RESULTS),
+    ((12, 'horizontal', 'hide', 'seven'), config.INLINE_RESULTS),
+    ((3, 'vertical', 'show', 'ukulele'), config.INLINE_RESULTS),
+])
+def test_result_set_has_distinct_results(key: ResultSetKey, count: int) -> None:
+    """A result set has INLINE_RESULTS questions with unique ids, each a different position."""
+    results = result_set(*key)
+    assert len(results) == count
+    assert len({result.id for result in results}) == count
+    assert len(set(answers(key))) == count
+
+def test_result_set_is_capped_by_the_number_of_positions(monkeypatch: 'MonkeyPatch') -> None:
+    """With fewer positions than INLINE_RESULTS, every position is asked once."""
+    monkeypatch.setattr(config, 'INLINE_RESULTS', 50)
+    # 4 strings x frets 0-3
+    assert len(result_set(3, 'vertical', 'show', 'ukulele')) == 16
+
+def test_answer_is_an_escaped_spoiler() -> None:
+    """The answer is hidden in a MarkdownV2 spoiler, with '#' and the diagram escaped."""
+    for result in result_set(12, 'vertical', 'show', 'standard'):
+        text = result.input_message_content.message_text
+        assert result.input_message_content.parse_mode == 'MarkdownV2'
+        spoiler = text.rsplit("Answer: ", 1)[1]
+        assert spoiler.startswith("||") and spoiler.endswith("||")
+        note = spoiler[2:-2].replace("\\#", "#")
+        assert note in config.NOTES
+        # Reserved characters outside the code block are escaped
+        assert text.startswith(inline.QUESTION_PROMPT.replace(".", "\\."))
+
+def test_every_key_gets_its_own_sequence() -> None:
+    """Keys that only differ in orientation, mode or tuning don't share their positions."""
+    base = answers((5, 'vertical', 'show', 'standard'))
+    assert [title for title, _ in answers((5, 'horizontal', 'show', 'standard'))] != [title for title, _ in base]
+    assert answers((5, 'vertical', 'show', 'dropd')) != base
+    assert SplitMix64.for_key((5, 'vertical', 'show', 'standard'), 1).next64() != \
+        SplitMix64.for_key((5, 'vertical', 'hide', 'standard'), 1).next64()
+
+def test_result_sets_are_reproducible_with_a_seed() -> None:
+    """With QUESTION_SEED set, rebuilding a result set gives the same questions."""
+    first = answers((7, 'vertical', 'hide', 'dadgad'))
+    result_set.cache_clear()
+    assert answers((7, 'vertical', 'hide', 'dadgad')) == first
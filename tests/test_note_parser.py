@@ -0,0 +1,51 @@
+"""Tests for the answer parser, fretboard.format_note_name."""
+from typing import TYPE_CHECKING
+
+import pytest
+
+import config
+from benchmarks.bench_note_parser import CORPUS
+from fretboard import MAX_ANSWER_LENGTH, format_note_name
+
+if TYPE_CHECKING:
+    from _pytest.capture import CaptureFixture
+    from _pytest.fixtures import FixtureRequest
+    from _pytest.logging import LogCaptureFixture
+    from _pytest.monkeypatch import MonkeyPatch
+    from pytest_mock.plugin import MockerFixture
+
+@pytest.mark.parametrize(('answer', 'expected'), [(answer, note) for answer, note in CORPUS if note is not None])
+def test_corpus_answers_resolve(answer: str, expected: str) -> None:
+    """Every answer of the benchmark corpus resolves to the note it means."""
+    assert format_note_name(answer) == expected
+
+def test_corpus_has_all_answers() -> None:
+    """The corpus the parametrized test runs over is the complete one."""
+    assert sum(note is not None for _, note in CORPUS) == 55
+
+@pytest.mark.parametrize(('answer', 'expected'), [
+    ('Cb', 'B'), ('Fb', 'E'), ('E#', 'F'), ('B#', 'C'), ('B♭', 'A#'), ('Sol#', 'G#'), ('solb', 'F#'),
+    ('Dbb', 'C'), ('C##', 'D'), ('Fx', 'G'), ('A𝄫', 'G'), ('Do♯', 'C#'), ('E♮', 'E'),
+])
+def test_enharmonics(answer: str, expected: str) -> None:
+    """Enharmonic spellings resolve to the pitch class's name in config.NOTES."""
+    assert format_note_name(answer) == expected
+
+@pytest.mark.parametrize(('answer', 'expected'), [('C4', 'C'), ('c#4', 'C#'), ('Bb10', 'A#'), ('sol3', 'G'), ('E♭ 2', 'D#')])
+def test_octave_digits_are_ignored(answer: str, expected: str) -> None:
+    """Trailing octave numbers don't change the note."""
+    assert format_note_name(answer) == expected
+
+def test_answers_over_the_length_limit_are_not_normalized() -> None:
+    """Normalization stops at MAX_ANSWER_LENGTH characters; longer messages are not looked up."""
+    assert format_note_name('C' + ' ' * (MAX_ANSWER_LENGTH - 1)) == 'C'
+    assert format_note_name('C' + '!' * MAX_ANSWER_LENGTH) not in config.NOTES
+
+@pytest.mark.parametrize('answer', ['', 'H', 'hello', 'I think G', 'do re', 'Cbbb', 'x', '#', '4', '🎸'])
+def test_junk_is_rejected(answer: str) -> None:
+    """Input that isn't a note name resolves to no note."""
+    assert format_note_name(answer) not in config.NOTES
+
+def test_unrecognized_input_is_upper_cased_and_stripped() -> None:
+    """Unrecognized input comes back stripped and upper-cased, so it fails the comparison."""
+    assert format_note_name('  hello ') == 'HELLO'
@@ -0,0 +1,141 @@
+"""Tests for the flood-control send queue, PriorityRateLimiter."""
+import asyncio
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from telegram.error import RetryAfter
+
+from outbound import PRIORITY_ANSWER, PRIORITY_DEFAULT, PriorityRateLimiter
+
+if TYPE_CHECKING:
+    from _pytest.capture import CaptureFixture
+    from _pytest.fixtures import FixtureRequest
+    from _pytest.logging import LogCaptureFixture
+    from _pytest.monkeypatch import MonkeyPatch
+    from pytest_mock.plugin import MockerFixture
+
+T = TypeVar('T')
+
+class SendLog:
+    """Bot API stand-in that records which requests were sent, and when."""
+
+    def __init__(self) -> None:
+        """Start with an empty log."""
+        self.sent: List[Tuple[str, float]] = []
+        self.failures: List[str] = []
+
+    async def call(self, name: str, retry_after: Optional[float] = None) -> bool:
+        """Send a request, or fail it once with a RetryAfter of retry_after seconds."""
+        if retry_after is not None and name not in self.failures:
+            self.failures.append(name)
+            raise RetryAfter(retry_after)  # type: ignore[arg-type]
+        self.sent.append((name, asyncio.get_running_loop().time()))
+        return True
+
+    def names(self) -> List[str]:
+        """Return the names of the sent requests in order."""
+        return [name for name, _ in self.sent]
+
+def send(limiter: PriorityRateLimiter, log: SendLog, name: str, chat_id: int, priority: int = PRIORITY_DEFAULT, retry_after: Optional[float] = None) -> Awaitable[Any]:
+    """Queue a request to a chat through the limiter, as ExtBot does."""
+    return asyncio.ensure_future(limiter.process_request(
+        log.call, (name, retry_after), {}, 'sendMessage', {'chat_id': chat_id}, priority
+    ))
+
+def with_limiter(limiter: PriorityRateLimiter, scenario: Callable[[], Awaitable[T]]) -> T:
+    """Run a scenario with the limiter's dispatcher running."""
+
+    async def run() -> T:
+        """Start the limiter, run the scenario and stop the limiter."""
+        await limiter.initialize()
+        try:
+            return await scenario()
+        finally:
+            await limiter.shutdown()
+
+    return asyncio.run(run())
+
+def test_answers_go_ahead_of_other_chats_requests() -> None:
+    """Among chats with a request ready, answer feedback is sent first."""
+    limiter = PriorityRateLimiter(global_rate=10)
+    log = SendLog()
+
+    async def scenario() -> None:
+        """Queue menu redraws in three chats, then an answer in a fourth."""
+        requests = [send(limiter, log, f"menu {chat}", chat) for chat in (1, 2, 3)]
+        requests.append(send(limiter, log, "answer", 4, PRIORITY_ANSWER))
+        await asyncio.gather(*requests)
+
+    with_limiter(limiter, scenario)
+    assert log.names() == ["answer", "menu 1", "menu 2", "menu 3"]
+
+def test_requests_to_one_chat_keep_their_order() -> None:
+    """An answer doesn't overtake an earlier request to the same chat."""
+    limiter = PriorityRateLimiter(global_rate=10)
+    log = SendLog()
+
+    async def scenario() -> None:
+        """Queue a menu redraw and then an answer to the same chat."""
+        await asyncio.gather(send(limiter, log, "menu", 1), send(limiter, log, "answer", 1, PRIORITY_ANSWER))
+
+    with_limiter(limiter, scenario)
+    assert log.names() == ["menu", "answer"]
+
+def test_a_throttled_chat_does_not_delay_others() -> None:
+    """While one chat waits for tokens, another chat's request goes out right away."""
+    limiter = PriorityRateLimiter(global_rate=100, chat_rate=10, chat_burst=1)
+    log = SendLog()
+
+    async def scenario() -> float:
+        """Queue three requests to chat 1 and then one to chat 2; return when sending started."""
+        start = asyncio.get_running_loop().time()
+        requests = [send(limiter, log, f"chat 1 #{number}", 1) for number in range(3)]
+        requests.append(send(limiter, log, "chat 2", 2))
+        await asyncio.gather(*requests)
+        return start
+
+    start = with_limiter(limiter, scenario)
+    sent = dict(log.sent)
+    assert log.names()[:2] == ["chat 1 #0", "chat 2"]
+    assert sent["chat 2"] - start < 0.05
+    # Chat 1 gets one message per 0.1 seconds after its burst of one
+    assert sent["chat 1 #2"] - start >= 0.19
+
+def test_retry_after_pauses_and_retries_in_the_original_order() -> None:
+    """A request that hit flood control is retried after the pause, still ahead of later requests to its chat."""
+    limiter = PriorityRateLimiter(global_rate=100, chat_rate=20, chat_burst=1)
+    log = SendLog()
+
+    async def scenario() -> float:
+        """Queue three requests to one chat, the first failing once with RetryAfter; return when they were queued."""
+        start = asyncio.get_running_loop().time()
+        await asyncio.gather(
+            send(limiter, log, "first", 1, retry_after=0.1),
+            send(limiter, log, "second", 1),
+            send(limiter, log, "third", 1),
+        )
+        return start
+
+    start = with_limiter(limiter, scenario)
+    assert log.failures == ["first"]
+    assert log.names() == ["first", "second", "third"]
+    assert log.sent[0][1] - start >= 0.1
+    assert limiter.retries == 1
+
+def test_groups_have_a_stricter_limit() -> None:
+    """Groups get no burst: their second message waits for the group rate, a private chat's doesn't."""
+    limiter = PriorityRateLimiter(global_rate=100, chat_rate=10, chat_burst=3, group_rate=5)
+    log = SendLog()
+
+    async def scenario() -> float:
+        """Send two messages to a group and two to a private chat; return when they were queued."""
+        start = asyncio.get_running_loop().time()
+        await asyncio.gather(
+            send(limiter, log, "group 1", -100), send(limiter, log, "group 2", -100),
+            send(limiter, log, "private 1", 7), send(limiter, log, "private 2", 7),
+        )
+        return start
+
+    start = with_limiter(limiter, scenario)
+    sent = dict(log.sent)
+    assert sent["private 2"] - start < 0.05
+    assert sent["group 2"] - start >= 0.19
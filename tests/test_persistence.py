@@ -0,0 +1,117 @@
+"""Tests for the write-behind persistence and session eviction."""
+import asyncio
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional, Set
+
+from persistence import ConversationDict, ConversationRef, PersistenceBackend, WriteBehindPersistence
+from session import Session, SessionEvictor
+
+if TYPE_CHECKING:
+    from _pytest.capture import CaptureFixture
+    from _pytest.fixtures import FixtureRequest
+    from _pytest.logging import LogCaptureFixture
+    from _pytest.monkeypatch import MonkeyPatch
+    from pytest_mock.plugin import MockerFixture
+
+class MemoryBackend(PersistenceBackend):
+    """Backend that keeps written users in a dict and can be made to fail."""
+
+    def __init__(self) -> None:
+        """Create an empty backend."""
+        self.users: Dict[int, Dict[str, Any]] = {}
+        self.failing = False
+
+    def load_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Return a written user."""
+        return self.users.get(user_id)
+
+    def load_conversations(self, name: str) -> ConversationDict:
+        """Return no conversations."""
+        return {}
+
+    def write_batch(self, users: Dict[int, Dict[str, Any]], conversations: Dict[ConversationRef, Optional[object]]) -> None:
+        """Store users, or raise while failing is set."""
+        if self.failing:
+            raise OSError("disk full")
+        self.users.update(users)
+
+    def close(self) -> None:
+        """Nothing to release."""
+
+class StubApplication:
+    """The parts of telegram.ext.Application that SessionEvictor uses."""
+
+    def __init__(self, persistence: WriteBehindPersistence) -> None:
+        """Create an application without users."""
+        self.persistence = persistence
+        self.user_data: Dict[int, Session] = {}
+        self._marked: Set[int] = set()
+
+    def mark_data_for_update_persistence(self, user_ids: Iterable[int]) -> None:
+        """Mark users to be handed to the persistence."""
+        self._marked.update(user_ids)
+
+    async def update_persistence(self) -> None:
+        """Hand marked users to the persistence, like Application.update_persistence."""
+        marked, self._marked = self._marked, set()
+        await asyncio.gather(*(self.persistence.update_user_data(user_id, self.user_data[user_id]) for user_id in marked))
+
+    def drop_user_data(self, user_id: int) -> None:
+        """Remove a user's data from memory."""
+        del self.user_data[user_id]
+
+def idle_session(max_fret: int) -> Session:
+    """Return a session that has been idle since the start of the clock."""
+    session = Session()
+    session.max_fret = max_fret
+    session.last_seen = 0
+    return session
+
+def sweep(application: StubApplication) -> int:
+    """Run one eviction sweep with every session counting as idle."""
+    evictor = SessionEvictor(idle_ttl=0, max_sessions=100, sweep_interval=60)
+    return asyncio.run(evictor.sweep(application))  # type: ignore[arg-type]
+
+def test_commit_waits_for_the_write() -> None:
+    """commit() returns once buffered data is in the backend."""
+    backend = MemoryBackend()
+    persistence = WriteBehindPersistence(backend)
+
+    async def run() -> None:
+        """Buffer a user and commit."""
+        await persistence.update_user_data(1, idle_session(7))
+        await persistence.commit()
+
+    asyncio.run(run())
+    assert backend.users[1]['max_fret'] == 7
+    assert not persistence.is_pending(1)
+
+def test_sweep_writes_sessions_before_evicting_them() -> None:
+    """Evicted sessions are in the store and reloaded when their users return."""
+    backend = MemoryBackend()
+    persistence = WriteBehindPersistence(backend)
+    application = StubApplication(persistence)
+    application.user_data = {1: idle_session(5), 2: idle_session(9)}
+
+    assert sweep(application) == 2
+    assert application.user_data == {}
+    assert backend.users[1]['max_fret'] == 5
+
+    returning = Session()
+    asyncio.run(persistence.refresh_user_data(2, returning))
+    assert returning.max_fret == 9
+
+def test_sweep_keeps_sessions_whose_write_failed() -> None:
+    """A session whose write failed stays in memory and is evicted once a later write succeeds."""
+    backend = MemoryBackend()
+    backend.failing = True
+    persistence = WriteBehindPersistence(backend)
+    application = StubApplication(persistence)
+    application.user_data = {1: idle_session(5)}
+
+    assert sweep(application) == 0
+    assert list(application.user_data) == [1]
+    assert persistence.is_pending(1)
+
+    backend.failing = False
+    assert sweep(application) == 1
+    assert backend.users[1]['max_fret'] == 5
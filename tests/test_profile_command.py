@@ -0,0 +1,32 @@
+"""Tests for parsing the argument of the admin /profile command."""
+from typing import TYPE_CHECKING, Optional, Tuple
+
+import pytest
+
+import config
+from bot import PROFILE_DEFAULT_SECONDS, PROFILE_DEFAULT_UPDATES, parse_profile_argument
+
+if TYPE_CHECKING:
+    from _pytest.capture import CaptureFixture
+    from _pytest.fixtures import FixtureRequest
+    from _pytest.logging import LogCaptureFixture
+    from _pytest.monkeypatch import MonkeyPatch
+    from pytest_mock.plugin import MockerFixture
+
+@pytest.mark.parametrize(('argument', 'expected'), [
+    (None, (PROFILE_DEFAULT_UPDATES, PROFILE_DEFAULT_SECONDS)),
+    ('200', (200, PROFILE_DEFAULT_SECONDS)),
+    ('30s', (None, 30.0)),
+    ('30S', (None, 30.0)),
+    ('0.2s', (None, 1.0)),
+    ('100000s', (None, config.PROFILE_MAX_SECONDS)),
+])
+def test_valid_arguments(argument: Optional[str], expected: Tuple[Optional[int], float]) -> None:
+    """Update counts and durations are accepted, durations clamped to [1, PROFILE_MAX_SECONDS]."""
+    assert parse_profile_argument(argument) == expected
+
+@pytest.mark.parametrize('argument', ['0', '-5', '0s', '-3s', 'nans', 'infs', '-infs', 'abc', 's', '1.5'])
+def test_invalid_arguments_are_rejected(argument: str) -> None:
+    """Non-positive counts and non-finite or non-positive durations raise ValueError."""
+    with pytest.raises(ValueError):
+        parse_profile_argument(argument)
@@ -0,0 +1,245 @@
+"""Tests for the game flow: answering, drawing the next question and sending replies."""
+import asyncio
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+from telegram.ext import ConversationHandler
+
+import bot
+import config
+from session import Session, SessionEvictor
+
+if TYPE_CHECKING:
+    from _pytest.capture import CaptureFixture
+    from _pytest.fixtures import FixtureRequest
+    from _pytest.logging import LogCaptureFixture
+    from _pytest.monkeypatch import MonkeyPatch
+    from pytest_mock.plugin import MockerFixture
+
+USER_ID = 42
+
+class StubMessage:
+    """A sent or received message; replies are recorded on the bot that made it."""
+
+    def __init__(self, bot: 'StubBot', message_id: int, text: str = "") -> None:
+        """Create a message in the user's chat."""
+        self.bot = bot
+        self.message_id = message_id
+        self.text = text
+
+    async def reply_text(self, text: str, **kwargs: Any) -> 'StubMessage':
+        """Reply in the same chat."""
+        return await self.bot.send_message(USER_ID, text, **kwargs)
+
+class StubBot:
+    """Records the Bot API calls the handlers make."""
+
+    def __init__(self) -> None:
+        """Start without calls and without a rate limiter."""
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+        self.rate_limiter = None
+        self.fail_edits = False
+
+    async def send_message(self, chat_id: int, text: str, **kwargs: Any) -> StubMessage:
+        """Record a sent message and return it."""
+        self.calls.append(('send_message', dict(kwargs, chat_id=chat_id, text=text)))
+        return StubMessage(self, 100 + len(self.calls), text)
+
+    async def edit_message_text(self, text: str, **kwargs: Any) -> StubMessage:
+        """Record an edit, or fail like Telegram does for a deleted message."""
+        self.calls.append(('edit_message_text', dict(kwargs, text=text)))
+        if self.fail_edits:
+            raise bot.BadRequest("Message to edit not found")
+        return StubMessage(self, kwargs['message_id'], text)
+
+    def methods(self) -> List[str]:
+        """Return the names of the calls made so far."""
+        return [method for method, _ in self.calls]
+
+class StubId:
+    """A chat or user, of which the handlers only read the id."""
+
+    def __init__(self, id: int) -> None:
+        """Remember the id."""
+        self.id = id
+
+class StubUpdate:
+    """A text message from the user in their private chat."""
+
+    def __init__(self, stub_bot: StubBot, text: str) -> None:
+        """Create the update of a message with the given text."""
+        self.message = StubMessage(stub_bot, 1, text)
+        self.effective_chat = self.effective_user = StubId(USER_ID)
+
+class StubContext:
+    """The parts of CallbackContext the game handlers use."""
+
+    def __init__(self, stub_bot: StubBot, user_data: Session) -> None:
+        """Create a context for one user's session."""
+        self.bot = stub_bot
+        self.user_data = user_data
+        self.bot_data: Dict[str, Any] = {}
+
+class StubApplication:
+    """An application without persistence, for SessionEvictor."""
+
+    def __init__(self) -> None:
+        """Create an application without users."""
+        self.persistence = None
+        self.user_data: Dict[int, Session] = {}
+
+    def drop_user_data(self, user_id: int) -> None:
+        """Remove a user's data from memory."""
+        del self.user_data[user_id]
+
+def answer(stub_bot: StubBot, session: Session, text: str) -> Optional[int]:
+    """Run handle_answer for a message from the user and return the next conversation state."""
+    return asyncio.run(bot.handle_answer(StubUpdate(stub_bot, text), StubContext(stub_bot, session)))  # type: ignore[arg-type]
+
+def new_session() -> Session:
+    """Return a session with a current question on 5 frets."""
+    session = Session()
+    session.max_fret = 5
+    session.tuning = 'standard'
+    bot.next_question(session, USER_ID)
+    return session
+
+def test_adaptive_next_question_is_drawn_after_the_answer_is_recorded(monkeypatch: 'MonkeyPatch') -> None:
+    """The next position is drawn from the weights that already include the current answer."""
+    monkeypatch.setattr(config, 'ADAPTIVE_QUESTIONS', True)
+    session = new_session()
+    # Sending the question draws nothing yet
+    bot.prefetch_question(session, USER_ID)
+    assert session.prefetched is None
+
+    scheduler = bot.question_scheduler(session)
+    total_before = scheduler.total()
+    totals_at_draw: List[int] = []
+    generate_question = bot.generate_question
+
+    def spy(session: Session, user_id: int) -> Tuple[str, int, int, str]:
+        """Note the scheduler's total weight when the next question is drawn."""
+        totals_at_draw.append(bot.question_scheduler(session).total())
+        return generate_question(session, user_id)
+
+    monkeypatch.setattr(bot, 'generate_question', spy)
+    bot.record_answer(session, USER_ID, False)
+    assert totals_at_draw == [scheduler.total()]
+    assert scheduler.total() > total_before
+    assert session.prefetched is not None
+
+def test_uniform_next_question_is_prefetched_when_sent(monkeypatch: 'MonkeyPatch') -> None:
+    """Without adaptive questions the next question is drawn as soon as the current one is sent."""
+    monkeypatch.setattr(config, 'ADAPTIVE_QUESTIONS', False)
+    session = new_session()
+    bot.prefetch_question(session, USER_ID)
+    prefetched = session.prefetched
+    assert prefetched is not None
+    bot.record_answer(session, USER_ID, True)
+    assert session.prefetched is prefetched
+    bot.next_question(session, USER_ID)
+    assert (session.string_num, session.fret_num) == prefetched[1][1:3]
+
+def test_answer_after_eviction_without_persistence_ends_the_game() -> None:
+    """An answer to an evicted game asks the user to start again instead of crashing."""
+    application = StubApplication()
+    session = new_session()
+    session.last_seen = 0
+    application.user_data[USER_ID] = session
+    evictor = SessionEvictor(idle_ttl=0, max_sessions=100, sweep_interval=60)
+    assert asyncio.run(evictor.sweep(application)) == 1  # type: ignore[arg-type]
+    assert USER_ID not in application.user_data
+
+    # The conversation is still in PLAYING_GAME, but the user's data starts over
+    stub_bot = StubBot()
+    assert answer(stub_bot, Session(), "C") == ConversationHandler.END
+    assert stub_bot.methods() == ['send_message']
+    assert "/start" in stub_bot.calls[0][1]['text']
+
+def answer_logging_renders(monkeypatch: 'MonkeyPatch', session: Session) -> List[str]:
+    """Answer the current question correctly and return the Bot API calls and question renders in order."""
+    stub_bot = StubBot()
+    create_question = bot.fretboard.create_question
+
+    def spy(*args: Any, **kwargs: Any) -> Tuple[str, int, int, str]:
+        """Log a render among the Bot API calls."""
+        stub_bot.calls.append(('render', {}))
+        return create_question(*args, **kwargs)
+
+    monkeypatch.setattr(bot.fretboard, 'create_question', spy)
+    assert answer(stub_bot, session, session.correct_note) == bot.PLAYING_GAME
+    return stub_bot.methods()
+
+def test_prefetched_answer_path_sends_before_rendering(monkeypatch: 'MonkeyPatch') -> None:
+    """With a prefetched question the reply goes out before any rendering, which prepares the next one."""
+    monkeypatch.setattr(config, 'ADAPTIVE_QUESTIONS', False)
+    session = new_session()
+    bot.prefetch_question(session, USER_ID)
+    assert answer_logging_renders(monkeypatch, session) == ['send_message', 'render']
+
+def test_adaptive_answer_path_renders_before_sending(monkeypatch: 'MonkeyPatch') -> None:
+    """Adaptive questions can't be prefetched: the next one is rendered after recording the answer."""
+    monkeypatch.setattr(config, 'ADAPTIVE_QUESTIONS', True)
+    session = new_session()
+    bot.prefetch_question(session, USER_ID)
+    assert answer_logging_renders(monkeypatch, session) == ['render', 'send_message']
+
+def reply(session: Session, response_mode: str, new_question: bool = True, fail_edits: bool = False) -> StubBot:
+    """Send feedback (and a new question, if new_question) in a response mode and return the bot."""
+    stub_bot = StubBot()
+    stub_bot.fail_edits = fail_edits
+    session.response_mode = response_mode
+    fretboard_visual = bot.next_question(session, USER_ID) if new_question else None
+    asyncio.run(bot.reply_to_answer(StubContext(stub_bot, session), session, USER_ID, "Correct!", fretboard_visual))  # type: ignore[arg-type]
+    return stub_bot
+
+def test_combined_mode_sends_one_message() -> None:
+    """'combined' sends the feedback and the next question in one new message."""
+    session = new_session()
+    stub_bot = reply(session, 'combined')
+    assert stub_bot.methods() == ['send_message']
+    text = stub_bot.calls[0][1]['text']
+    assert text.startswith("Correct!") and bot.QUESTION_PROMPT in text
+    assert session.question_message_id == 101
+
+def test_separate_mode_sends_feedback_then_question() -> None:
+    """'separate' sends the feedback and the question as two messages, and tracks the question."""
+    session = new_session()
+    stub_bot = reply(session, 'separate')
+    assert stub_bot.methods() == ['send_message', 'send_message']
+    assert stub_bot.calls[0][1]['text'] == "Correct!"
+    assert bot.QUESTION_PROMPT in stub_bot.calls[1][1]['text']
+    assert session.question_message_id == 102
+
+def test_edit_mode_edits_the_previous_question() -> None:
+    """'edit' rewrites the previous question message in place and sends nothing new."""
+    session = new_session()
+    session.question_message_id = 7
+    stub_bot = reply(session, 'edit')
+    assert stub_bot.methods() == ['edit_message_text']
+    assert stub_bot.calls[0][1]['message_id'] == 7
+    assert session.question_message_id == 7
+
+def test_edit_mode_keeps_the_question_on_a_retry() -> None:
+    """On a wrong first attempt 'edit' shows the feedback above the same question."""
+    session = new_session()
+    session.question_message_id = 7
+    diagram = bot.fretboard.question_diagram(
+        session.max_fret, session.string_num, session.fret_num, session.orientation, session.mode, session.tuning
+    )
+    stub_bot = reply(session, 'edit', new_question=False)
+    assert stub_bot.methods() == ['edit_message_text']
+    assert diagram in stub_bot.calls[0][1]['text']
+
+def test_edit_mode_falls_back_to_a_new_message_when_the_edit_fails() -> None:
+    """If the previous question can't be edited (e.g. it was deleted), the reply is sent as a new message."""
+    session = new_session()
+    session.question_message_id = 7
+    stub_bot = reply(session, 'edit', fail_edits=True)
+    assert stub_bot.methods() == ['edit_message_text', 'send_message']
+    assert session.question_message_id == 102
+
+def test_edit_mode_without_a_previous_question_sends_a_message() -> None:
+    """With no question message to edit yet, 'edit' sends a new message like 'combined'."""
+    session = new_session()
+    stub_bot = reply(session, 'edit')
+    assert stub_bot.methods() == ['send_message']
@@ -0,0 +1,71 @@
+"""Tests for the pre-rendered question template artifact."""
+import logging
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
+
+import pytest
+
+import config
+import fretboard
+import render_artifact
+from render_artifact import TemplateArtifact
+
+if TYPE_CHECKING:
+    from _pytest.capture import CaptureFixture
+    from _pytest.fixtures import FixtureRequest
+    from _pytest.logging import LogCaptureFixture
+    from _pytest.monkeypatch import MonkeyPatch
+    from pytest_mock.plugin import MockerFixture
+
+@pytest.fixture(autouse=True)
+def rendered_templates() -> Iterator[None]:
+    """Render templates from scratch during a test, and stop using any artifact after it."""
+    fretboard.use_template_source(None)
+    yield
+    fretboard.use_template_source(None)
+
+@pytest.fixture
+def artifact_path(tmp_path: Path) -> str:
+    """Build an artifact of every template and return its path."""
+    path = str(tmp_path / 'render_templates.bin')
+    assert render_artifact.build(path) == Path(path).stat().st_size
+    return path
+
+def test_artifact_holds_exactly_what_fretboard_renders(artifact_path: str) -> None:
+    """Every template mapped from the artifact equals the one fretboard renders."""
+    artifact = TemplateArtifact(artifact_path)
+    keys = list(fretboard.template_keys())
+    assert len(artifact) == len(keys)
+    for key in keys:
+        assert artifact.get(key) == fretboard.get_question_template(*key), key
+    assert artifact.get((4, 'vertical', 'show', 'standard')) is None
+
+def test_installed_artifact_serves_the_same_diagrams(artifact_path: str) -> None:
+    """Questions spliced into mapped templates are identical to rendered ones."""
+    expected = {
+        key: fretboard.question_diagram(key[0], 1, key[0], key[1], key[2], key[3])
+        for key in fretboard.template_keys()
+    }
+    assert render_artifact.install(artifact_path)
+    assert fretboard._template_source is not None
+    for key, diagram in expected.items():
+        assert fretboard.question_diagram(key[0], 1, key[0], key[1], key[2], key[3]) == diagram, key
+
+def test_artifact_built_for_other_settings_is_ignored(artifact_path: str, monkeypatch: 'MonkeyPatch', caplog: 'LogCaptureFixture') -> None:
+    """An artifact whose fingerprint doesn't match the code and configuration is not used."""
+    monkeypatch.setattr(config, 'QUESTION_MARK', "?")
+    with caplog.at_level(logging.WARNING, logger='render_artifact'):
+        assert not render_artifact.install(artifact_path)
+    assert fretboard._template_source is None
+    assert "built for other code or settings" in caplog.text
+    # Rendering (from scratch, as after a restart) uses the current settings instead
+    fretboard.use_template_source(None)
+    assert "?" in fretboard.question_diagram(5, 1, 3)
+
+def test_unreadable_or_missing_artifact_is_ignored(tmp_path: Path) -> None:
+    """A file that isn't an artifact, or no file, leaves templates to be rendered."""
+    path = tmp_path / 'render_templates.bin'
+    assert not render_artifact.install(str(path))
+    path.write_bytes(b'not an artifact at all')
+    assert not render_artifact.install(str(path))
+    assert fretboard._template_source is None
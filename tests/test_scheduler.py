@@ -0,0 +1,103 @@
+"""Tests for the adaptive question scheduler and its Fenwick tree."""
+import json
+import random
+import sys
+from array import array
+from collections import Counter
+from typing import TYPE_CHECKING
+
+import pytest
+
+from rng import SplitMix64
+from scheduler import BASE_WEIGHT, MAX_WEIGHT, MIN_WEIGHT, FenwickTree, PositionScheduler, RandomSource
+
+if TYPE_CHECKING:
+    from _pytest.capture import CaptureFixture
+    from _pytest.fixtures import FixtureRequest
+    from _pytest.logging import LogCaptureFixture
+    from _pytest.monkeypatch import MonkeyPatch
+    from pytest_mock.plugin import MockerFixture
+
+WEIGHTS = [3, 0, 1, 7, 2, 0, 0, 5, 1, 4, 9]
+
+def test_fenwick_tree_sums_and_updates() -> None:
+    """Prefix sums, single weights and the weight list follow add()."""
+    tree = FenwickTree(WEIGHTS)
+    assert len(tree) == len(WEIGHTS)
+    assert tree.weights() == WEIGHTS
+    assert [tree.prefix_sum(end) for end in range(len(WEIGHTS) + 1)] == [sum(WEIGHTS[:end]) for end in range(len(WEIGHTS) + 1)]
+    tree.add(1, 6)
+    tree.add(10, -9)
+    assert tree.weight(1) == 6
+    assert tree.total() == sum(WEIGHTS) - 3
+    assert tree.weights() == [3, 6, 1, 7, 2, 0, 0, 5, 1, 4, 0]
+
+def test_every_target_maps_to_an_index_in_proportion_to_its_weight() -> None:
+    """Over all targets find() hits each index exactly weight times, so sampling is proportional to weight."""
+    tree = FenwickTree(WEIGHTS)
+    hits = Counter(tree.find(target) for target in range(tree.total()))
+    assert [hits[index] for index in range(len(WEIGHTS))] == WEIGHTS
+
+@pytest.mark.parametrize('rng', [random.Random(3), SplitMix64(3)], ids=['random', 'splitmix64'])
+def test_sampling_frequencies_follow_the_weights(rng: RandomSource) -> None:
+    """Sampled frequencies are close to weight / total, and zero-weight indices are never drawn."""
+    tree = FenwickTree(WEIGHTS)
+    draws = 60000
+    counts = Counter(tree.sample(rng) for _ in range(draws))
+    total = sum(WEIGHTS)
+    for index, weight in enumerate(WEIGHTS):
+        assert counts[index] / draws == pytest.approx(weight / total, abs=0.01)
+
+def test_record_adjusts_weights_within_bounds() -> None:
+    """Misses double a weight up to MAX_WEIGHT, quick correct answers halve it down to MIN_WEIGHT, slow ones raise it."""
+    scheduler = PositionScheduler(6, 5)
+    for _ in range(10):
+        scheduler.record(2, 3, correct=False)
+        scheduler.record(4, 0, correct=True, seconds=1)
+    scheduler.record(1, 1, correct=True, seconds=60)
+    assert scheduler.weight(scheduler._index(2, 3)) == MAX_WEIGHT
+    assert scheduler.weight(scheduler._index(4, 0)) == MIN_WEIGHT
+    assert scheduler.weight(scheduler._index(1, 1)) > BASE_WEIGHT
+
+def test_pick_returns_positions_on_the_board() -> None:
+    """Picked positions are valid strings and frets, and only weighted positions come up."""
+    scheduler = PositionScheduler(4, 3, [0] * 5 + [1] + [0] * 10)
+    rng = SplitMix64(1)
+    assert {scheduler.pick(rng) for _ in range(20)} == {(2, 1)}
+
+def test_to_dict_round_trip() -> None:
+    """A scheduler stored with to_dict (as JSON) comes back with the same board and weights."""
+    scheduler = PositionScheduler(7, 12)
+    scheduler.record(7, 12, correct=False)
+    scheduler.record(1, 0, correct=True)
+    restored = PositionScheduler.from_dict(json.loads(json.dumps(scheduler.to_dict())))
+    assert (restored.strings, restored.max_fret) == (7, 12)
+    assert restored.weights() == scheduler.weights()
+
+def test_resize_keeps_the_weights_of_shared_positions() -> None:
+    """Changing the fret range or string count keeps weights of positions on both boards; new ones start at BASE_WEIGHT."""
+    scheduler = PositionScheduler(6, 5)
+    scheduler.record(2, 3, correct=False)
+    scheduler.record(6, 5, correct=False)
+    missed = scheduler.weight(scheduler._index(2, 3))
+
+    larger = scheduler.resized(7, 12)
+    assert (larger.strings, larger.max_fret) == (7, 12)
+    assert larger.weight(larger._index(2, 3)) == missed
+    assert larger.weight(larger._index(6, 5)) == missed
+    assert larger.weight(larger._index(2, 9)) == BASE_WEIGHT
+    assert larger.weight(larger._index(7, 0)) == BASE_WEIGHT
+
+    smaller = larger.resized(4, 3)
+    assert smaller.weight(smaller._index(2, 3)) == missed
+    assert smaller.total() == 4 * 4 * BASE_WEIGHT + missed - BASE_WEIGHT
+
+def test_scheduler_is_a_single_array() -> None:
+    """A scheduler keeps its board size in the tree itself, so it costs one 16-bit array and nothing else."""
+    scheduler = PositionScheduler(6, 12)
+    assert not hasattr(scheduler, '__dict__')
+    assert (scheduler.typecode, scheduler.strings, scheduler.frets) == ('H', 6, 13)
+    assert sys.getsizeof(scheduler) < sys.getsizeof(array('H', range(len(scheduler) + 1))) + 32
+    # The board size in index 0 is not a weight
+    assert scheduler.weights() == [BASE_WEIGHT] * 78
+    assert scheduler.total() == 78 * BASE_WEIGHT
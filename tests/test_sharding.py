@@ -0,0 +1,45 @@
+"""Tests for routing raw updates to worker processes."""
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+import pytest
+
+from sharding import shard_for, update_user_id
+
+if TYPE_CHECKING:
+    from _pytest.capture import CaptureFixture
+    from _pytest.fixtures import FixtureRequest
+    from _pytest.logging import LogCaptureFixture
+    from _pytest.monkeypatch import MonkeyPatch
+    from pytest_mock.plugin import MockerFixture
+
+USER_ID = 1001
+GROUP_ID = -100200
+PRIVATE_MESSAGE = {'update_id': 1, 'message': {'chat': {'id': USER_ID}, 'from': {'id': USER_ID}, 'text': 'C'}}
+GROUP_MESSAGE = {'update_id': 2, 'message': {'chat': {'id': GROUP_ID}, 'from': {'id': USER_ID}, 'text': 'C'}}
+GROUP_CALLBACK = {'update_id': 3, 'callback_query': {
+    'id': '7', 'from': {'id': USER_ID}, 'message': {'chat': {'id': GROUP_ID}}, 'data': 'menu',
+}}
+INLINE_QUERY = {'update_id': 4, 'inline_query': {'id': '8', 'from': {'id': USER_ID}, 'query': '5'}}
+CHANNEL_POST = {'update_id': 5, 'channel_post': {'chat': {'id': GROUP_ID}, 'text': 'C'}}
+
+@pytest.mark.parametrize(('data', 'expected'), [
+    (PRIVATE_MESSAGE, USER_ID),
+    (GROUP_MESSAGE, USER_ID),
+    (GROUP_CALLBACK, USER_ID),
+    (INLINE_QUERY, USER_ID),
+    (CHANNEL_POST, GROUP_ID),
+    ({'update_id': 6}, None),
+    ({'update_id': 7, 'message': {'chat': 1, 'from': 'x'}}, None),
+])
+def test_update_user_id(data: Dict[str, Any], expected: Optional[int]) -> None:
+    """Updates are keyed by their sender, falling back to the chat when there is none."""
+    assert update_user_id(data) == expected
+
+def test_user_lands_on_one_worker_in_group_and_private_chat() -> None:
+    """A user's private and group updates go to the same worker, so one process owns their session."""
+    shards = {shard_for(update_user_id(data), 4) for data in (PRIVATE_MESSAGE, GROUP_MESSAGE, GROUP_CALLBACK)}
+    assert shards == {USER_ID % 4}
+
+def test_update_without_id_goes_to_first_worker() -> None:
+    """Updates with neither a sender nor a chat are routed to worker 0."""
+    assert shard_for(None, 4) == 0
@@ -0,0 +1,111 @@
+"""Tests for PerChatUpdateProcessor: in order within a chat, concurrent across chats."""
+import asyncio
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from telegram import Update
+
+from update_processor import PerChatUpdateProcessor, chat_key
+
+if TYPE_CHECKING:
+    from _pytest.capture import CaptureFixture
+    from _pytest.fixtures import FixtureRequest
+    from _pytest.logging import LogCaptureFixture
+    from _pytest.monkeypatch import MonkeyPatch
+    from pytest_mock.plugin import MockerFixture
+
+class ChatUpdate:
+    """Custom update that opts into per-chat ordering with a chat_id."""
+
+    def __init__(self, chat_id: int, number: int) -> None:
+        """Create the number-th update of a chat."""
+        self.chat_id = chat_id
+        self.number = number
+
+class Recorder:
+    """Handler stand-in that logs when updates start and finish and can hold chats back."""
+
+    def __init__(self) -> None:
+        """Start with an empty log and no chat held back."""
+        self.events: List[Tuple[str, int, int]] = []
+        self.active = 0
+        self.most_active = 0
+        self.gates: Dict[int, asyncio.Event] = {}
+
+    async def handle(self, update: ChatUpdate) -> None:
+        """Process an update: wait while its chat is held back, then yield once."""
+        self.events.append(('start', update.chat_id, update.number))
+        self.active += 1
+        self.most_active = max(self.most_active, self.active)
+        gate = self.gates.get(update.chat_id)
+        if gate is not None:
+            await gate.wait()
+        await asyncio.sleep(0.001)
+        self.active -= 1
+        self.events.append(('end', update.chat_id, update.number))
+
+def submit(processor: PerChatUpdateProcessor, recorder: Recorder, updates: List[ChatUpdate]) -> List[asyncio.Task]:
+    """Hand updates to the processor like Application does, one task per update."""
+    return [asyncio.create_task(processor.process_update(update, recorder.handle(update))) for update in updates]
+
+def test_updates_of_one_chat_run_in_order_and_one_at_a_time() -> None:
+    """Every update of a chat starts only after the previous one has finished."""
+    recorder = Recorder()
+
+    async def run() -> None:
+        """Submit five updates of one chat and wait for them."""
+        await asyncio.gather(*submit(PerChatUpdateProcessor(8), recorder, [ChatUpdate(1, n) for n in range(5)]))
+
+    asyncio.run(run())
+    assert recorder.events == [(event, 1, n) for n in range(5) for event in ('start', 'end')]
+    assert recorder.most_active == 1
+
+def test_updates_of_different_chats_overlap() -> None:
+    """Updates of different chats are processed at the same time."""
+    recorder = Recorder()
+
+    async def run() -> None:
+        """Submit one update per chat and wait for them."""
+        await asyncio.gather(*submit(PerChatUpdateProcessor(8), recorder, [ChatUpdate(chat, 0) for chat in range(4)]))
+
+    asyncio.run(run())
+    assert recorder.most_active == 4
+    assert [event for event, _, _ in recorder.events[:4]] == ['start'] * 4
+
+def test_a_busy_chat_holds_one_concurrency_slot() -> None:
+    """With two slots, a chat with a backlog of blocked updates leaves the other slot to other chats."""
+    recorder = Recorder()
+
+    async def run() -> Optional[int]:
+        """Block chat 1 with a backlog, see chat 2 finish meanwhile, then release chat 1."""
+        processor = PerChatUpdateProcessor(2)
+        recorder.gates[1] = asyncio.Event()
+        busy = submit(processor, recorder, [ChatUpdate(1, n) for n in range(5)])
+        other = submit(processor, recorder, [ChatUpdate(2, 0), ChatUpdate(3, 0)])
+        await asyncio.wait_for(asyncio.gather(*other), 1)
+        finished_of_chat_1 = sum(1 for event, chat, _ in recorder.events if event == 'end' and chat == 1)
+        recorder.gates[1].set()
+        await asyncio.gather(*busy)
+        return finished_of_chat_1
+
+    assert asyncio.run(run()) == 0
+    chat_1 = [(event, number) for event, chat, number in recorder.events if chat == 1]
+    assert chat_1 == [(event, n) for n in range(5) for event in ('start', 'end')]
+
+def test_chat_key() -> None:
+    """Telegram updates are keyed by their chat, or their user if they have none; custom ones by chat_id."""
+    message = Update.de_json({
+        'update_id': 1,
+        'message': {
+            'message_id': 1, 'date': 0, 'text': 'C',
+            'chat': {'id': -100, 'type': 'group', 'title': 'Band'},
+            'from': {'id': 7, 'is_bot': False, 'first_name': 'A'},
+        },
+    }, None)
+    inline_query = Update.de_json({
+        'update_id': 2,
+        'inline_query': {'id': 'q', 'query': '7', 'offset': '', 'from': {'id': 7, 'is_bot': False, 'first_name': 'A'}},
+    }, None)
+    assert chat_key(message) == -100
+    assert chat_key(inline_query) == 7
+    assert chat_key(ChatUpdate(5, 0)) == 5
+    assert chat_key(object()) is None
@@ -0,0 +1,167 @@
+"""Tests for the public webhook app, the sharded front and the internal ops app."""
+import asyncio
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional
+
+import pytest
+from starlette.testclient import TestClient
+from telegram import Update
+
+import config
+from webserver import SECRET_TOKEN_HEADER, create_front_app, create_ops_app, create_web_app, running
+
+if TYPE_CHECKING:
+    from _pytest.capture import CaptureFixture
+    from _pytest.fixtures import FixtureRequest
+    from _pytest.logging import LogCaptureFixture
+    from _pytest.monkeypatch import MonkeyPatch
+    from pytest_mock.plugin import MockerFixture
+
+class StubRateLimiter:
+    """Stands in for the outbound queue, reporting fixed stats."""
+
+    def stats(self) -> Dict[str, Any]:
+        """Return fixed queue stats."""
+        return {'queued': 0}
+
+class StubBot:
+    """Stands in for the Bot, holding only the rate limiter."""
+
+    def __init__(self) -> None:
+        """Attach a stub rate limiter."""
+        self.rate_limiter: Optional[StubRateLimiter] = StubRateLimiter()
+
+class StubQueue:
+    """Stands in for the update queue, keeping what was put into it."""
+
+    def __init__(self) -> None:
+        """Start empty."""
+        self.items: List[Any] = []
+
+    async def put(self, item: Any) -> None:
+        """Keep an item."""
+        self.items.append(item)
+
+class StubApplication:
+    """Stands in for the Application, with only what the web apps read."""
+
+    def __init__(self) -> None:
+        """Start out running, with a stub bot and an empty update queue."""
+        self.running = True
+        self.bot = StubBot()
+        self.update_queue = StubQueue()
+
+class StubRouter:
+    """Stands in for the ShardRouter, keeping the updates it was asked to route."""
+
+    def __init__(self) -> None:
+        """Start healthy, without routed updates."""
+        self.healthy = True
+        self.routed: List[Dict[str, Any]] = []
+
+    async def route(self, body: bytes, data: Dict[str, Any]) -> bool:
+        """Keep a routed update and report it delivered."""
+        self.routed.append(data)
+        return True
+
+SECRET = 'secret'
+HEADERS = {SECRET_TOKEN_HEADER: SECRET}
+MESSAGE_UPDATE = {'update_id': 7, 'message': {
+    'message_id': 1, 'date': 1700000000, 'text': 'C#',
+    'chat': {'id': 42, 'type': 'private'}, 'from': {'id': 42, 'is_bot': False, 'first_name': 'Ana'},
+}}
+# Bodies that aren't an object with an integer update_id, valid JSON or not
+INVALID_BODIES = ['"x"', '{}', '[]', 'null', '{"update_id": "7"}', '{"update_id": true}', 'not json']
+
+@pytest.mark.parametrize('path', ['/metrics', '/outbound'])
+def test_public_app_does_not_serve_ops_routes(path: str) -> None:
+    """The app on the public PORT exposes neither metrics nor the outbound queue."""
+    client = TestClient(create_web_app(StubApplication(), secret_token='secret'))
+    assert client.get(path).status_code == 404
+
+def test_public_app_serves_health_and_verifies_webhook() -> None:
+    """The public app reports health and rejects webhook posts without the secret."""
+    client = TestClient(create_web_app(StubApplication(), secret_token='secret'))
+    assert client.get('/healthz').text == 'ok'
+    assert client.post(config.WEBHOOK_PATH, json={}).status_code == 403
+
+def test_ops_app_serves_metrics_outbound_and_health() -> None:
+    """The internal app serves metrics, the outbound queue stats and health, but no webhook."""
+    client = TestClient(create_ops_app(StubApplication()))
+    assert client.get('/metrics').status_code == 200
+    assert client.get('/outbound').json() == {'queued': 0}
+    assert client.get('/healthz').text == 'ok'
+    assert client.post(config.WEBHOOK_PATH, json={}).status_code == 404
+
+def test_public_app_queues_a_posted_update() -> None:
+    """An update posted with the right secret is decoded and queued for the bot."""
+    application = StubApplication()
+    client = TestClient(create_web_app(application, secret_token=SECRET))
+    assert client.post(config.WEBHOOK_PATH, json=MESSAGE_UPDATE, headers=HEADERS).status_code == 200
+    [update] = application.update_queue.items
+    assert isinstance(update, Update)
+    assert update.update_id == 7
+    assert update.message.text == 'C#'
+    assert update.effective_user.id == 42
+
+@pytest.mark.parametrize('body', INVALID_BODIES + ['{"update_id": 7, "message": "x"}'])
+def test_public_app_rejects_bodies_that_are_not_updates(body: str) -> None:
+    """Bodies that aren't an update object with an integer update_id get a 400 and queue nothing."""
+    application = StubApplication()
+    client = TestClient(create_web_app(application, secret_token=SECRET))
+    response = client.post(config.WEBHOOK_PATH, content=body, headers=dict(HEADERS, **{'Content-Type': 'application/json'}))
+    assert response.status_code == 400
+    assert application.update_queue.items == []
+
+def test_front_routes_a_posted_update() -> None:
+    """The sharded front forwards an update posted with the right secret to the router."""
+    router = StubRouter()
+    client = TestClient(create_front_app(router, secret_token=SECRET))  # type: ignore[arg-type]
+    assert client.post(config.WEBHOOK_PATH, json=MESSAGE_UPDATE, headers=HEADERS).status_code == 200
+    assert router.routed == [MESSAGE_UPDATE]
+
+@pytest.mark.parametrize('body', INVALID_BODIES)
+def test_front_rejects_bodies_that_are_not_updates(body: str) -> None:
+    """The sharded front answers 400 to bodies that aren't an update and routes nothing."""
+    router = StubRouter()
+    client = TestClient(create_front_app(router, secret_token=SECRET))  # type: ignore[arg-type]
+    response = client.post(config.WEBHOOK_PATH, content=body, headers=dict(HEADERS, **{'Content-Type': 'application/json'}))
+    assert response.status_code == 400
+    assert router.routed == []
+
+class LifecycleApplication:
+    """Stands in for the Application, logging its lifecycle calls."""
+
+    def __init__(self) -> None:
+        """Start without calls."""
+        self.calls: List[str] = []
+        self.post_init: Optional[Callable[['LifecycleApplication'], Awaitable[None]]] = None
+        self.post_stop: Optional[Callable[['LifecycleApplication'], Awaitable[None]]] = None
+
+    async def start(self) -> None:
+        """Log the start."""
+        self.calls.append('start')
+
+    async def stop(self) -> None:
+        """Log the stop."""
+        self.calls.append('stop')
+
+def test_running_calls_the_hooks_around_start_and_stop() -> None:
+    """running() runs post_init before start and post_stop after stop, even when the body fails."""
+    application = LifecycleApplication()
+
+    async def hook(name: str, app: LifecycleApplication) -> None:
+        """Log a hook call."""
+        app.calls.append(name)
+
+    application.post_init = lambda app: hook('post_init', app)
+    application.post_stop = lambda app: hook('post_stop', app)
+
+    async def run() -> None:
+        """Fail inside the running application."""
+        async with running(application):  # type: ignore[arg-type]
+            application.calls.append('body')
+            raise RuntimeError("load test failed")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
+    assert application.calls == ['post_init', 'start', 'body', 'stop', 'post_stop']
@@ -0,0 +1,73 @@
+import logging
+from collections import deque
+from typing import Any, Awaitable, Deque, Dict, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+def chat_key(update: object) -> Optional[int]:
+    """Return the id whose updates must be processed in order, if any."""
+    if isinstance(update, Update):
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return update.effective_user.id
+        return None
+    # Custom updates (e.g. ones the bot queues for itself) can opt in via a chat_id attribute
+    return getattr(update, 'chat_id', None)
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Process updates from different chats concurrently, but strictly in order within a chat.
+
+    While a chat has an update in flight, later updates from the same chat are queued
+    behind it and run by the same task. That keeps per-user state such as ``attempts``
+    race-free, and a single busy chat never holds more than one of the
+    ``max_concurrent_updates`` slots.
+    """
+
+    __slots__ = ('_backlogs',)
+
+    def __init__(self, max_concurrent_updates: int) -> None:
+        """Initialize the processor with the given concurrency cap."""
+        super().__init__(max_concurrent_updates)
+        # Chats with an update in flight, mapped to the updates waiting behind it
+        self._backlogs: Dict[int, Deque[Awaitable[Any]]] = {}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """Run the update now, or queue it behind the update its chat is already processing."""
+        key = chat_key(update)
+        if key is None:
+            await coroutine
+            return
+
+        backlog = self._backlogs.get(key)
+        if backlog is not None:
+            backlog.append(coroutine)
+            return
+
+        backlog = self._backlogs[key] = deque()
+        try:
+            while True:
+                try:
+                    await coroutine
+                except Exception:
+                    # Application.process_update already reports handler errors; this is a last resort
+                    logger.exception("Unhandled error while processing update for chat %s", key)
+                if not backlog:
+                    break
+                coroutine = backlog.popleft()
+        finally:
+            del self._backlogs[key]
+            # Only reached with leftovers when cancelled during shutdown
+            for pending in backlog:
+                close = getattr(pending, 'close', None)
+                if close is not None:
+                    close()
+
+    async def initialize(self) -> None:
+        """Nothing to set up; per-chat queues are created on demand."""
+
+    async def shutdown(self) -> None:
+        """Nothing to tear down; queues are drained by the tasks processing them."""
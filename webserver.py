@@ -0,0 +1,288 @@
+import asyncio
+import contextlib
+import hmac
+import json
+import logging
+import secrets
+import signal
+from typing import TYPE_CHECKING, AsyncIterator, Iterator, Optional, Tuple
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+from telegram import Bot, Update
+from telegram.ext import Application
+from telegram.request import BaseRequest, RequestData
+
+import config
+import metrics
+
+if TYPE_CHECKING:
+    # Only the sharded front needs it, and it is imported there
+    from sharding import ShardRouter
+
+logger = logging.getLogger(__name__)
+
+# Header Telegram uses to echo the secret_token passed to setWebhook
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+def _has_secret_token(request: Request, secret_token: Optional[str]) -> bool:
+    """Return whether a webhook request carries the expected secret token (if one is set)."""
+    if secret_token is None:
+        return True
+    received = request.headers.get(SECRET_TOKEN_HEADER, "")
+    if not hmac.compare_digest(received, secret_token):
+        logger.warning("Rejected webhook request with invalid secret token")
+        return False
+    return True
+
+def _is_update(data: object) -> bool:
+    """Return whether a decoded webhook body looks like an update: an object with an integer update_id."""
+    if not isinstance(data, dict):
+        return False
+    update_id = data.get('update_id')
+    return isinstance(update_id, int) and not isinstance(update_id, bool)
+
+def _health_route(application: Application) -> Route:
+    """Return the /healthz route, reporting whether the bot is up and processing updates."""
+
+    async def health(request: Request) -> Response:
+        """Report whether the bot is up and processing updates."""
+        if application.running:
+            return PlainTextResponse("ok")
+        return PlainTextResponse("starting", status_code=503)
+
+    return Route("/healthz", health, methods=["GET"])
+
+def create_web_app(application: Application, secret_token: Optional[str] = None) -> Starlette:
+    """Create the public HTTP app that feeds webhook updates into the bot and reports health."""
+
+    async def telegram_webhook(request: Request) -> Response:
+        """Verify the secret token and queue the posted update for processing."""
+        if not _has_secret_token(request, secret_token):
+            return Response(status_code=403)
+
+        try:
+            data = await request.json()
+        except ValueError:
+            return Response(status_code=400)
+        if not _is_update(data):
+            return Response(status_code=400)
+
+        try:
+            update = Update.de_json(data, application.bot)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            # Fields of the wrong type, e.g. a message that isn't an object
+            logger.warning("Rejected malformed update %s", data['update_id'])
+            return Response(status_code=400)
+        await application.update_queue.put(update)
+        return Response()
+
+    return Starlette(routes=[
+        _health_route(application),
+        Route(config.WEBHOOK_PATH, telegram_webhook, methods=["POST"]),
+    ])
+
+def create_ops_app(application: Application) -> Starlette:
+    """Create the internal HTTP app that reports health, the outbound queue and metrics.
+
+    It exposes process and traffic details, so it is served on its own port
+    (METRICS_PORT), which is not published like the webhook's.
+    """
+
+    async def outbound_stats(request: Request) -> Response:
+        """Report the outbound queue depth and wait times."""
+        rate_limiter = application.bot.rate_limiter
+        return JSONResponse(rate_limiter.stats() if rate_limiter is not None else {})
+
+    async def prometheus_metrics(request: Request) -> Response:
+        """Report handler, question and Bot API metrics in the Prometheus text format."""
+        return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+    return Starlette(routes=[
+        _health_route(application),
+        Route("/outbound", outbound_stats, methods=["GET"]),
+        Route("/metrics", prometheus_metrics, methods=["GET"]),
+    ])
+
+class NoPollingRequest(BaseRequest):
+    """getUpdates request of a webhook bot, which never polls: it holds no HTTP client."""
+
+    async def initialize(self) -> None:
+        """Nothing to set up."""
+
+    async def shutdown(self) -> None:
+        """Nothing to tear down."""
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None, *args: object, **kwargs: object) -> Tuple[int, bytes]:
+        """Refuse to poll; updates arrive at the webhook."""
+        raise RuntimeError("getUpdates is not available in webhook mode")
+
+class _EmbeddedServer(uvicorn.Server):
+    """uvicorn server that leaves signal handling to the code running it."""
+
+    @contextlib.contextmanager
+    def capture_signals(self) -> Iterator[None]:
+        """Don't take over SIGINT/SIGTERM, and don't re-raise them after shutting down."""
+        yield
+
+    def install_signal_handlers(self) -> None:
+        """Same as capture_signals, for older uvicorn versions."""
+
+async def _serve_until_signal(server: _EmbeddedServer) -> None:
+    """Serve until SIGINT or SIGTERM, then return so the caller can shut the bot down cleanly."""
+    # uvicorn's own handling re-raises the signal once it has stopped, which would
+    # kill the process (SIGTERM) or cancel the caller's cleanup (SIGINT)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, setattr, server, 'should_exit', True)
+    try:
+        await server.serve()
+    finally:
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.remove_signal_handler(signum)
+
+class BackgroundWebServer:
+    """Serves the internal ops app (health, outbound queue and metrics) while the bot runs."""
+
+    def __init__(self, port: int = config.METRICS_PORT) -> None:
+        """Initialize the server; call start() once the Application is initialized."""
+        self.port = port
+        self._server: Optional[_EmbeddedServer] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, application: Application) -> None:
+        """Start serving in the background (usable as a post_init hook)."""
+        self._server = _EmbeddedServer(uvicorn.Config(
+            create_ops_app(application),
+            host=config.WEBHOOK_LISTEN,
+            port=self.port,
+            use_colors=False,
+        ))
+        self._task = asyncio.create_task(self._server.serve())
+
+    async def stop(self, application: Application) -> None:
+        """Shut the server down (usable as a post_stop hook)."""
+        if self._server is not None:
+            self._server.should_exit = True
+            await self._task
+            self._server = self._task = None
+
+def _webhook_secret() -> Optional[str]:
+    """Return the configured webhook secret, or a random one if a public webhook is registered without it."""
+    if config.WEBHOOK_SECRET is None and config.WEBHOOK_URL:
+        # Never register a public webhook without verification
+        return secrets.token_urlsafe(32)
+    return config.WEBHOOK_SECRET
+
+async def _register_webhook(bot: Bot, secret_token: Optional[str]) -> None:
+    """Point Telegram at our webhook, if a public URL is configured."""
+    if config.WEBHOOK_URL:
+        await bot.set_webhook(
+            url=config.WEBHOOK_URL + config.WEBHOOK_PATH,
+            secret_token=secret_token,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        logger.info("Webhook registered at %s%s", config.WEBHOOK_URL, config.WEBHOOK_PATH)
+
+@contextlib.asynccontextmanager
+async def running(application: Application) -> AsyncIterator[None]:
+    """Start an initialized application with its post_init hook, and stop it with post_stop on exit.
+
+    run_polling/run_webhook do this themselves; the webhook server, the sharded workers and
+    the in-process load test use this instead, so all of them run the same services.
+    """
+    if application.post_init is not None:
+        await application.post_init(application)
+    await application.start()
+    try:
+        yield
+    finally:
+        await application.stop()
+        if application.post_stop is not None:
+            await application.post_stop(application)
+
+async def serve_webhook(application: Application) -> None:
+    """Run the bot behind a local HTTP server until it is interrupted."""
+    secret_token = _webhook_secret()
+    server = _EmbeddedServer(uvicorn.Config(
+        create_web_app(application, secret_token),
+        host=config.WEBHOOK_LISTEN,
+        port=config.PORT,
+        use_colors=False,
+    ))
+
+    serving: Optional[asyncio.Task] = None
+    if config.FAST_START:
+        # Listen right away: updates that arrive while the bot still connects to
+        # Telegram wait in the update queue until it has started
+        serving = asyncio.create_task(_serve_until_signal(server))
+
+    try:
+        # getMe (in initialize) and setWebhook are independent round trips to Telegram
+        await asyncio.gather(application.initialize(), _register_webhook(application.bot, secret_token))
+        async with running(application):
+            await (serving if serving is not None else _serve_until_signal(server))
+    finally:
+        if serving is not None and not serving.done():
+            # Starting the bot failed
+            server.should_exit = True
+            await serving
+        await application.shutdown()
+
+def create_front_app(router: 'ShardRouter', secret_token: Optional[str] = None) -> Starlette:
+    """Create the HTTP app of the sharded front: it forwards webhook updates to the workers."""
+
+    async def telegram_webhook(request: Request) -> Response:
+        """Verify the secret token and forward the posted update to the worker owning its chat."""
+        if not _has_secret_token(request, secret_token):
+            return Response(status_code=403)
+
+        body = await request.body()
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return Response(status_code=400)
+        if not _is_update(data):
+            return Response(status_code=400)
+
+        # Telegram redelivers updates that were not acknowledged, e.g. while a worker restarts
+        if not await router.route(body, data):
+            return Response(status_code=503)
+        return Response()
+
+    async def health(request: Request) -> Response:
+        """Report whether all workers are up."""
+        if router.healthy:
+            return PlainTextResponse("ok")
+        return PlainTextResponse("starting", status_code=503)
+
+    return Starlette(routes=[
+        Route("/healthz", health, methods=["GET"]),
+        Route(config.WEBHOOK_PATH, telegram_webhook, methods=["POST"]),
+    ])
+
+async def serve_sharded(workers: int) -> None:
+    """Run the webhook front and the given number of bot worker processes until interrupted."""
+    from sharding import ShardRouter
+    secret_token = _webhook_secret()
+    router = ShardRouter(workers)
+    server = _EmbeddedServer(uvicorn.Config(
+        create_front_app(router, secret_token),
+        host=config.WEBHOOK_LISTEN,
+        port=config.PORT,
+        use_colors=False,
+    ))
+
+    await router.start()
+    try:
+        if config.WEBHOOK_URL:
+            # The workers never talk to Telegram about the webhook; the front registers it
+            base_url = config.TELEGRAM_BASE_URL or 'https://api.telegram.org/bot'
+            async with Bot(config.TELEGRAM_BOT_TOKEN, base_url=base_url) as bot:
+                await _register_webhook(bot, secret_token)
+        await _serve_until_signal(server)
+    finally:
+        await router.stop()